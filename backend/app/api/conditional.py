@@ -0,0 +1,58 @@
+"""
+GET condicional (ETag + If-None-Match) compartilhado pelas rotas.
+
+A rota recebe `ConditionalGet` como dependência. Com a versão em memória, chama
+`not_modified(...)` antes de ler o Firestore: se o cliente já tem essa versão, a rota
+termina com 304 sem corpo. Depois de carregar o recurso, `check(...)` grava o ETag
+da versão lida (e também responde 304 se ela bater).
+
+    @router.get("/recurso")
+    async def recurso(conditional: ConditionalGet = Depends()):
+        if versao_em_memoria:
+            conditional.not_modified("recurso", versao_em_memoria)
+        dados, versao = await carregar()
+        conditional.check("recurso", versao)
+        return dados
+
+As versões precisam ser iguais em todos os workers para o mesmo conteúdo (hash do
+conteúdo, update_time do documento, contador gravado no Firestore), nunca um
+contador local do processo.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi import HTTPException, Request, Response
+
+# o cliente sempre revalida; conteúdo autenticado não vai para caches compartilhados
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts: Any) -> str:
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:20]
+    # fraco: o corpo pode ser recomprimido por proxies sem mudar o conteúdo
+    return f'W/"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparação fraca (RFC 9110): ignora o prefixo W/ e aceita lista ou '*'."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+class ConditionalGet:
+    def __init__(self, request: Request, response: Response):
+        self._if_none_match = request.headers.get("if-none-match")
+        self._response = response
+
+    def not_modified(self, *version: Any) -> None:
+        """Responde 304 (HTTPException) se o cliente já tem esta versão; senão não faz nada."""
+        etag = make_etag(*version)
+        if etag_matches(self._if_none_match, etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+    def check(self, *version: Any) -> None:
+        """Grava o ETag da versão na resposta; 304 se o cliente já a tem."""
+        self.not_modified(*version)
+        self._response.headers["ETag"] = make_etag(*version)
+        self._response.headers["Cache-Control"] = CACHE_CONTROL
@@ -3,6 +3,9 @@ from app.routes.course_routes import router as course_router
 from app.routes.discipline_routes import router as discipline_router
 from app.routes.user_routes import router as user_router, helpers_router, public_router
 from app.routes.chat_routes import router as chat_router
+from app.routes.metrics_routes import router as metrics_router
+from app.routes.health_routes import router as health_router
+from app.routes.debug_routes import router as debug_router
 
 api_router = APIRouter()
 
@@ -11,4 +14,7 @@ api_router.include_router(course_router)
 api_router.include_router(discipline_router)
 api_router.include_router(chat_router, prefix="")
 api_router.include_router(helpers_router)
-api_router.include_router(public_router)
\ No newline at end of file
+api_router.include_router(public_router)
+api_router.include_router(metrics_router)
+api_router.include_router(health_router)
+api_router.include_router(debug_router)
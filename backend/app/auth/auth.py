@@ -1,16 +1,71 @@
+import os
+import time
+import hashlib
+from typing import Any, Dict
+
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from firebase_admin import auth
+from app.cache.shared_cache import shared_cache
+from app.firebase.firestore_client import get_firebase_app
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+TOKEN_CACHE_MAXSIZE = int(os.getenv("TOKEN_CACHE_MAXSIZE", "10000"))
+# uids com acesso às rotas administrativas, além de quem tem o custom claim `admin: true`
+ADMIN_UIDS = {uid.strip() for uid in os.getenv("ADMIN_UIDS", "").split(",") if uid.strip()}
+
+def _token_expiration(_key: str, decoded: Dict[str, Any], _now: float) -> float:
+    """O token sai do cache exatamente no seu claim `exp` (epoch em segundos)."""
+    return float(decoded.get("exp") or 0)
+
+# LRU com expiração por item: chave = sha256 do token (não guardamos o token em si).
+# Tokens não mudam, então nada publica invalidações para este cache.
+_token_cache = shared_cache("auth_tokens", maxsize=TOKEN_CACHE_MAXSIZE, ttu=_token_expiration)
+
+def _verify_with_firebase(token: str) -> Dict[str, Any]:
+    # o app do Firebase só é inicializado aqui se o warm-up ainda não o criou
+    return auth.verify_id_token(token, app=get_firebase_app())
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def get_token_cache_stats() -> Dict[str, int]:
+    """Contadores do cache de tokens verificados (hits, misses e tamanho atual)."""
+    stats = _token_cache.stats()
+    return {k: stats[k] for k in ("hits", "misses", "size", "maxsize")}
+
+def clear_token_cache() -> None:
+    _token_cache.clear()
+
+async def verify_token(token: str) -> Dict[str, Any]:
+    """
+    Verifica um ID token do Firebase usando o cache quando possível.
+    Tokens ainda não vistos são verificados numa thread, fora do event loop.
+    """
+    key = _token_key(token)
+    decoded = _token_cache.get(key)
+    if decoded is not None:
+        return decoded
+
+    decoded = await run_in_threadpool(_verify_with_firebase, token)
+    if float(decoded.get("exp") or 0) > time.time():
+        _token_cache.set(key, decoded)
+    return decoded
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
-        decoded_token = auth.verify_id_token(token)
-        return decoded_token
+        return await verify_token(token)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token inválido ou expirado",
             headers={"WWW-Authenticate": "Bearer"},
-        )
\ No newline at end of file
+        )
+
+async def require_admin(user=Depends(get_current_user)):
+    """Dependência das rotas administrativas: 403 para quem não é administrador."""
+    if user.get("admin") is True or user.get("uid") in ADMIN_UIDS:
+        return user
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Acesso restrito a administradores")
@@ -0,0 +1,124 @@
+"""
+Massa de dados sintética e determinística para os benchmarks (backend em memória).
+Os documentos têm o mesmo formato dos gravados pelo app.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from app.repository.chat_repository import chat_id_for
+
+def _profile(user: Dict[str, Any]) -> Dict[str, Any]:
+    return {"name": user["name"], "avatarUrl": user.get("avatarUrl"), "avatar_thumbs": {}}
+
+class _Writer:
+    """Agrupa as escritas em WriteBatch de até 500 operações."""
+
+    def __init__(self, db, batch_size: int = 500):
+        self._db = db
+        self._batch_size = batch_size
+        self._batch = db.batch()
+        self._pending = 0
+
+    def set(self, ref, data: Dict[str, Any]) -> None:
+        self._batch.set(ref, data)
+        self._pending += 1
+        if self._pending >= self._batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._pending:
+            self._batch.commit()
+            self._batch = self._db.batch()
+            self._pending = 0
+
+def seed_dataset(db, users: int = 500, courses: int = 8, disciplines_per_course: int = 12,
+                 main_chats: int = 60, other_chats: int = 200, messages_per_chat: int = 200,
+                 seed: int = 42) -> Dict[str, Any]:
+    """
+    Popula o Firestore (cliente síncrono) com catálogo, usuários, chats e mensagens.
+    O usuário principal (`main_uid`) tem `main_chats` conversas; a primeira delas
+    (`main_chat_id`) tem `messages_per_chat` mensagens. Retorna os ids usados pelos cenários.
+    """
+    rng = random.Random(seed)
+    writer = _Writer(db)
+
+    subjects: List[str] = []
+    for c in range(courses):
+        course_id = f"curso-{c:02d}"
+        writer.set(db.collection("courses").document(course_id), {"id": course_id, "name": f"Curso {c}"})
+        for d in range(disciplines_per_course):
+            discipline_id = f"{course_id}-disc-{d:02d}"
+            name = f"Disciplina {c}.{d}"
+            subjects.append(name)
+            writer.set(db.collection("courses").document(course_id).collection("disciplines").document(discipline_id),
+                       {"id": discipline_id, "name": name})
+
+    now = datetime.now(timezone.utc)
+    people = []
+    for u in range(users):
+        uid = f"user-{u:05d}"
+        helping = rng.sample(subjects, k=min(3, len(subjects)))
+        if u % 10 == 0:
+            helping[0] = subjects[0]  # ~10% dos usuários ajudam na disciplina dos cenários
+        person = {
+            "uid": uid,
+            "email": f"{uid}@bench.edu.br",
+            "name": f"Usuário {u}",
+            "helping_subjects": helping,
+            "avatar": "U",
+            "avatarUrl": f"https://example.invalid/avatars/{uid}.webp",
+            "created_at": now - timedelta(days=30),
+        }
+        people.append(person)
+        writer.set(db.collection("users").document(uid), person)
+
+    main = people[0]
+    # a primeira conversa do usuário principal (com people[1]) é o chat dos cenários
+    pairs = [(main, people[1 + i % (users - 1)]) for i in range(main_chats)]
+    pairs += [tuple(rng.sample(people[1:], 2)) for _ in range(other_chats)]
+
+    seen = set()
+    main_chat_id = None
+    for index, (a, b) in enumerate(pairs):
+        chat_id = chat_id_for(a["uid"], b["uid"])
+        if chat_id in seen:
+            continue
+        seen.add(chat_id)
+        main_chat_id = main_chat_id or chat_id
+        count = messages_per_chat if chat_id == main_chat_id else 5
+        chat_ref = db.collection("chats").document(chat_id)
+        started = now - timedelta(hours=len(pairs) - index, minutes=count)
+        last = None
+        for m in range(count):
+            sender, receiver = (a, b) if m % 2 == 0 else (b, a)
+            last = {
+                "sender_id": sender["uid"],
+                "receiver_id": receiver["uid"],
+                "message": f"mensagem {m} do chat {index}",
+                "file_url": None,
+                "file_type": None,
+                "file_name": None,
+                "timestamp": started + timedelta(seconds=m * 30),
+            }
+            writer.set(chat_ref.collection("messages").document(f"m{m:05d}"), last)
+        writer.set(chat_ref, {
+            "id": chat_id,
+            "participants": [a["uid"], b["uid"]],
+            "last_message": last["message"] if last else None,
+            "last_sender": last["sender_id"] if last else None,
+            "updated_at": last["timestamp"] if last else started,
+            "unread": {b["uid"]: rng.randint(0, 5)},
+            "participant_profiles": {a["uid"]: _profile(a), b["uid"]: _profile(b)},
+        })
+    writer.flush()
+
+    return {
+        "main_uid": main["uid"],
+        "main_chat_id": main_chat_id,
+        "main_peer_uid": people[1]["uid"],
+        "subject": subjects[0],
+        "public_uids": [p["uid"] for p in people[1:21]],
+        "counts": {"users": users, "courses": courses, "disciplines": len(subjects),
+                   "chats": len(seen), "messages": messages_per_chat + 5 * (len(seen) - 1)},
+    }
@@ -0,0 +1,407 @@
+"""
+Teste de carga: estudantes virtuais usando o app como o cliente mobile, no mesmo
+processo (httpx + ASGITransport), sobre o backend em memória ou o emulador.
+
+Cada estudante abre o app (/user/me, /courses/), carrega a lista de chats e os
+perfis públicos, abre uma conversa e passa a consultá-la a cada `poll_interval`
+segundos (GET condicional com If-None-Match). Entre uma consulta e outra, a cada
+`think_time` segundos em média, faz uma ação sorteada de `mix`: enviar texto,
+enviar anexo, buscar monitores, recarregar a lista ou abrir outra conversa.
+
+Os estudantes entram aos poucos durante `ramp_up` segundos e param em `duration`.
+O relatório traz vazão e latência p50/p95/p99 por endpoint e o atraso do event
+loop (quanto um `sleep` curto demora além do pedido) durante o teste.
+
+CLI: python -m app.scripts.load_test
+"""
+import io
+import os
+import time
+import random
+import asyncio
+import platform
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI
+
+from app.benchmarks.suite import BENCH_USER_HEADER, install_auth_override, percentile
+
+# peso relativo de cada ação entre as consultas periódicas
+DEFAULT_MIX: Dict[str, float] = {
+    "send_text": 30,
+    "send_file": 5,
+    "helpers": 10,
+    "chat_list": 15,
+    "open_chat": 40,
+}
+
+# amostragem do atraso do event loop
+LAG_SAMPLE_SECONDS = 0.05
+
+# anexos: fotos repetidas (deduplicadas pelo conteúdo depois do primeiro envio) e PDFs sempre novos
+_PHOTO_POOL = 8
+_PDF_BYTES = 48 * 1024
+
+class LoopLagMonitor:
+    """Mede o atraso do event loop: quanto `sleep(interval)` demora além de `interval`."""
+
+    def __init__(self, interval: float = LAG_SAMPLE_SECONDS):
+        self.interval = interval
+        self.samples: List[float] = []
+        # segundos desde start() de cada amostra
+        self.times: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        origin = loop.time()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            self.samples.append(max(0.0, (now - started - self.interval) * 1000))
+            self.times.append(now - origin)
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="load-loop-lag")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def summary(self) -> Dict[str, float]:
+        values = sorted(self.samples)
+        return {
+            "samples": len(values),
+            "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "max_ms": round(values[-1], 3) if values else 0.0,
+        }
+
+class _Recorder:
+    """Latências por endpoint (rótulo com o caminho do template, ex.: GET /chat/messages/{chat_id})."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[int, int]] = {}
+        # (segundos desde o início, latência ms) de todas as requisições, para a série temporal
+        self.timeline: List[Tuple[float, float]] = []
+        self.failures: Dict[str, int] = {}
+
+    def record(self, label: str, status: int, latency_ms: float) -> None:
+        self.latencies.setdefault(label, []).append(latency_ms)
+        codes = self.statuses.setdefault(label, {})
+        codes[status] = codes.get(status, 0) + 1
+        self.timeline.append((time.perf_counter() - self.started, latency_ms))
+
+    def failed(self, label: str) -> None:
+        self.failures[label] = self.failures.get(label, 0) + 1
+
+def _attachments(seed: int) -> List[Tuple[str, bytes, str]]:
+    """Fotos JPEG pequenas e distintas (geradas uma vez, antes do teste)."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    photos = []
+    for i in range(_PHOTO_POOL):
+        image = Image.effect_noise((640, 480), 40 + rng.random() * 40).convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=80)
+        photos.append((f"foto-{i}.jpg", buffer.getvalue(), "image/jpeg"))
+    return photos
+
+class _Student:
+    """Uma sessão do app; os métodos são as ações do cliente mobile."""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: _Recorder, uid: str, dataset: Dict[str, Any],
+                 photos: List[Tuple[str, bytes, str]], rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.uid = uid
+        self.dataset = dataset
+        self.photos = photos
+        self.rng = rng
+        self.chats: List[Dict[str, Any]] = []
+        self.chat_id: Optional[str] = None
+        self.peer: Optional[str] = None
+        self.last_ts = 0
+        self.cursor: Optional[str] = None
+        self.etag: Optional[str] = None
+
+    async def call(self, label: str, method: str, path: str, **kwargs) -> Optional[httpx.Response]:
+        headers = {BENCH_USER_HEADER: self.uid, **kwargs.pop("headers", {})}
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, headers=headers, **kwargs)
+        except Exception:
+            self.recorder.failed(label)
+            return None
+        self.recorder.record(label, response.status_code, (time.perf_counter() - started) * 1000)
+        return response
+
+    async def app_start(self) -> None:
+        await asyncio.gather(
+            self.call("GET /user/me", "GET", "/user/me"),
+            self.call("GET /courses/", "GET", "/courses/"),
+        )
+        await self.chat_list()
+        if not self.chats:
+            await self.create_chat()
+        await self.open_chat()
+
+    async def chat_list(self) -> None:
+        response = await self.call("GET /chat/user/{uid}", "GET", f"/chat/user/{self.uid}", params={"limit": 50})
+        if response is None or response.status_code != 200:
+            return
+        self.chats = response.json()
+        # o app completa com /users/public os perfis que faltam na lista (e os contatos sugeridos)
+        uids = {p for c in self.chats[:20] for p in c["participants"] if p != self.uid}
+        uids.update(self.dataset["public_uids"][:5])
+        await self.call("GET /users/public", "GET", "/users/public", params={"uids": ",".join(sorted(uids))})
+
+    async def create_chat(self) -> None:
+        peer = self.rng.choice([u for u in self.dataset["public_uids"] if u != self.uid])
+        response = await self.call("POST /chat/create", "POST", "/chat/create",
+                                   json={"other_user_id": peer})
+        if response is not None and response.status_code == 200:
+            self.chats = [{"id": response.json(), "participants": [self.uid, peer]}]
+
+    async def open_chat(self) -> None:
+        if not self.chats:
+            return
+        chat = self.rng.choice(self.chats[:10])
+        self.chat_id = chat["id"]
+        self.peer = next((p for p in chat["participants"] if p != self.uid), self.uid)
+        response = await self.call("GET /chat/messages/{chat_id}", "GET", f"/chat/messages/{self.chat_id}",
+                                   params={"limit": 20})
+        self.etag = None
+        self.cursor = None
+        self.last_ts = 0
+        if response is not None and response.status_code == 200:
+            self.last_ts = max((m["timestamp"] for m in response.json()), default=0)
+
+    async def poll(self) -> None:
+        """Mensagens novas da conversa aberta; 304 enquanto nada mudou."""
+        if self.chat_id is None:
+            return
+        while True:
+            # o cursor "newer" devolvido pela consulta anterior é o ponto de partida da próxima
+            params: Dict[str, Any] = {"cursor": self.cursor} if self.cursor else {"after": self.last_ts}
+            params["limit"] = 20
+            headers = {"If-None-Match": self.etag} if self.etag else {}
+            response = await self.call("GET /chat/messages/{chat_id} (poll)", "GET",
+                                       f"/chat/messages/{self.chat_id}", params=params, headers=headers)
+            if response is None or response.status_code != 200:
+                return
+            page = response.json()
+            self.etag = response.headers.get("ETag")
+            self.cursor = response.headers.get("X-Next-Cursor") or self.cursor
+            # página cheia: ainda há mensagens novas, busca a próxima na hora
+            if len(page) < params["limit"]:
+                return
+            self.etag = None
+
+    async def send_text(self) -> None:
+        if self.chat_id is None:
+            return
+        await self.call("POST /chat/send/{chat_id}", "POST", f"/chat/send/{self.chat_id}",
+                        data={"receiver_id": self.peer, "text": f"mensagem de carga {self.rng.randrange(10**6)}"})
+
+    async def send_file(self) -> None:
+        if self.chat_id is None:
+            return
+        if self.rng.random() < 0.5:
+            name, content, content_type = self.rng.choice(self.photos)
+        else:
+            name, content, content_type = "resumo.pdf", b"%PDF-1.4\n" + os.urandom(_PDF_BYTES), "application/pdf"
+        await self.call("POST /chat/send/{chat_id} (arquivo)", "POST", f"/chat/send/{self.chat_id}",
+                        data={"receiver_id": self.peer}, files={"file": (name, content, content_type)})
+
+    async def helpers(self) -> None:
+        await self.call("GET /users/helpers", "GET", "/users/helpers", params={"subject": self.dataset["subject"]})
+
+    async def run(self, deadline: float, poll_interval: float, think_time: float, mix: Dict[str, float]) -> None:
+        loop = asyncio.get_running_loop()
+        actions = list(mix)
+        weights = [mix[a] for a in actions]
+        await self.app_start()
+        # espalha as consultas dos estudantes que entraram juntos
+        next_poll = loop.time() + self.rng.uniform(0, poll_interval)
+        next_action = loop.time() + self.rng.expovariate(1 / think_time) if think_time > 0 else deadline
+        while True:
+            wake = min(next_poll, next_action)
+            if wake >= deadline:
+                return
+            await asyncio.sleep(max(0.0, wake - loop.time()))
+            if next_poll <= next_action:
+                await self.poll()
+                next_poll = max(loop.time(), next_poll + poll_interval)
+            else:
+                action = self.rng.choices(actions, weights)[0]
+                await getattr(self, action)()
+                next_action = loop.time() + self.rng.expovariate(1 / think_time)
+
+def _endpoint_report(recorder: _Recorder, seconds: float) -> Dict[str, Dict[str, Any]]:
+    endpoints = {}
+    for label in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[label])
+        codes = recorder.statuses[label]
+        errors = sum(n for code, n in codes.items() if code >= 400) + recorder.failures.get(label, 0)
+        endpoints[label] = {
+            "requests": len(values),
+            "rps": round(len(values) / seconds, 2) if seconds else 0.0,
+            "errors": errors,
+            "not_modified": codes.get(304, 0),
+            "statuses": {str(code): n for code, n in sorted(codes.items())},
+            "mean_ms": round(sum(values) / len(values), 3),
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "max_ms": round(values[-1], 3),
+        }
+    for label, count in recorder.failures.items():
+        endpoints.setdefault(label, {"requests": 0, "rps": 0.0, "errors": count})
+    return endpoints
+
+def _timeline(recorder: _Recorder, lag: LoopLagMonitor, window: float) -> List[Dict[str, Any]]:
+    """Vazão, p95 e atraso máximo do loop por janela de `window` segundos (mostra onde a rampa satura)."""
+    buckets: Dict[int, List[float]] = {}
+    for at, latency in recorder.timeline:
+        buckets.setdefault(int(at // window), []).append(latency)
+    lag_max: Dict[int, float] = {}
+    for at, value in zip(lag.times, lag.samples):
+        index = int(at // window)
+        lag_max[index] = max(lag_max.get(index, 0.0), value)
+    windows = []
+    for index in sorted(buckets):
+        values = sorted(buckets[index])
+        windows.append({
+            "start_s": round(index * window, 1),
+            "rps": round(len(values) / window, 1),
+            "p95_ms": round(percentile(values, 95), 2),
+            "loop_lag_max_ms": round(lag_max.get(index, 0.0), 2),
+        })
+    return windows
+
+async def run_load(app: FastAPI, store, dataset: Dict[str, Any], users: int = 50, ramp_up: float = 10.0,
+                   duration: float = 60.0, poll_interval: float = 3.0, think_time: float = 5.0,
+                   mix: Optional[Dict[str, float]] = None, window: float = 5.0, seed: int = 1) -> Dict[str, Any]:
+    """
+    Roda `users` estudantes virtuais dentro do lifespan do app por `duration` segundos
+    (contados do início da rampa) e retorna o relatório. `store`: o `db.store` do backend
+    em memória, para contar operações do Firestore (None no emulador).
+    """
+    mix = dict(DEFAULT_MIX if mix is None else mix)
+    unknown = [a for a in mix if a not in DEFAULT_MIX]
+    if unknown:
+        raise ValueError(f"Ações desconhecidas no mix: {', '.join(unknown)}")
+    if ramp_up > duration:
+        raise ValueError("ramp_up não pode ser maior que duration")
+
+    install_auth_override(app)
+    photos = _attachments(seed)
+    recorder = _Recorder()
+    lag = LoopLagMonitor()
+    population = dataset["counts"]["users"]
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load", limits=limits,
+                                     timeout=None) as client:
+            if store is not None:
+                store.reset_stats()
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            deadline = started + duration
+            recorder.started = time.perf_counter()
+            lag.start()
+
+            async def student(index: int) -> None:
+                await asyncio.sleep(ramp_up * index / users)
+                rng = random.Random(seed * 100_003 + index)
+                uid = f"user-{index % population:05d}"
+                await _Student(client, recorder, uid, dataset, photos, rng).run(deadline, poll_interval,
+                                                                                think_time, mix)
+
+            await asyncio.gather(*[student(i) for i in range(users)])
+            seconds = loop.time() - started
+            await lag.stop()
+            ops = store.stats() if store is not None else None
+
+    endpoints = _endpoint_report(recorder, seconds)
+    total = sum(len(v) for v in recorder.latencies.values())
+    all_latencies = sorted(v for values in recorder.latencies.values() for v in values)
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": dataset["counts"],
+        "config": {"users": users, "ramp_up": ramp_up, "duration": duration, "poll_interval": poll_interval,
+                   "think_time": think_time, "mix": mix, "seed": seed},
+        "seconds": round(seconds, 2),
+        "total": {
+            "requests": total,
+            "rps": round(total / seconds, 1) if seconds else 0.0,
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "p50_ms": round(percentile(all_latencies, 50), 3),
+            "p95_ms": round(percentile(all_latencies, 95), 3),
+            "p99_ms": round(percentile(all_latencies, 99), 3),
+        },
+        "endpoints": endpoints,
+        "loop_lag": lag.summary(),
+        "timeline": _timeline(recorder, lag, window),
+        "firestore_per_request": ({k: round(v / total, 3) for k, v in ops.items()} if ops and total else None),
+    }
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'send_text=30,helpers=10' -> pesos; ações omitidas ficam com peso 0."""
+    mix = {action: 0.0 for action in DEFAULT_MIX}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        action, _, weight = item.partition("=")
+        if action not in DEFAULT_MIX:
+            raise ValueError(f"Ação desconhecida: {action} (use {', '.join(DEFAULT_MIX)})")
+        try:
+            mix[action] = float(weight)
+        except ValueError:
+            raise ValueError(f"Peso inválido para {action}: {weight!r}")
+    if not any(mix.values()):
+        raise ValueError("O mix precisa de pelo menos uma ação com peso > 0")
+    return {a: w for a, w in mix.items() if w > 0}
+
+def format_load_report(report: Dict[str, Any]) -> str:
+    lines = [f"{'endpoint':<40}{'req':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+             f"{'max ms':>9}{'304':>7}{'erros':>7}"]
+    for label, e in report["endpoints"].items():
+        if not e["requests"]:
+            lines.append(f"{label:<40}{0:>8}{'':>45}{'':>7}{e['errors']:>7}")
+            continue
+        lines.append(f"{label:<40}{e['requests']:>8}{e['rps']:>9.1f}{e['p50_ms']:>9.2f}{e['p95_ms']:>9.2f}"
+                     f"{e['p99_ms']:>9.2f}{e['max_ms']:>9.1f}{e['not_modified']:>7}{e['errors']:>7}")
+    t = report["total"]
+    lines.append(f"{'total':<40}{t['requests']:>8}{t['rps']:>9.1f}{t['p50_ms']:>9.2f}{t['p95_ms']:>9.2f}"
+                 f"{t['p99_ms']:>9.2f}{'':>9}{'':>7}{t['errors']:>7}")
+    lag = report["loop_lag"]
+    lines.append("")
+    lines.append(f"atraso do event loop: p50 {lag['p50_ms']:.2f} ms, p95 {lag['p95_ms']:.2f} ms, "
+                 f"p99 {lag['p99_ms']:.2f} ms, máx {lag['max_ms']:.1f} ms ({lag['samples']} amostras)")
+    ops = report.get("firestore_per_request")
+    if ops:
+        lines.append(f"Firestore por requisição: {ops['calls']:.2f} chamadas, {ops['reads']:.2f} leituras, "
+                     f"{ops['writes']:.2f} escritas")
+    if report.get("timeline"):
+        lines.append("")
+        lines.append(f"{'janela':>8}{'req/s':>9}{'p95 ms':>9}{'loop máx':>10}")
+        for w in report["timeline"]:
+            lines.append(f"{w['start_s']:>7.0f}s{w['rps']:>9.1f}{w['p95_ms']:>9.2f}{w['loop_lag_max_ms']:>10.1f}")
+    return "\n".join(lines)
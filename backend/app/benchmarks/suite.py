@@ -0,0 +1,155 @@
+"""
+Benchmarks dos endpoints mais usados, com o app FastAPI rodando no próprio
+processo (httpx + ASGITransport) sobre o backend em memória do Firestore.
+Para cada cenário: vazão, latência p50/p95/p99 e operações do Firestore por requisição.
+"""
+import math
+import time
+import asyncio
+import platform
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+
+from app.auth.auth import get_current_user
+
+# o usuário "autenticado" de cada requisição vem deste header (sem verificar token)
+BENCH_USER_HEADER = "X-Bench-User"
+
+# piso absoluto para acusar regressão de latência (ruído em medidas sub-milissegundo)
+MIN_LATENCY_DELTA_MS = 1.0
+
+async def _bench_user(request: Request) -> Dict[str, Any]:
+    return {"uid": request.headers.get(BENCH_USER_HEADER, "")}
+
+def install_auth_override(app: FastAPI) -> None:
+    """Troca a verificação do token do Firebase pelo header X-Bench-User."""
+    app.dependency_overrides[get_current_user] = _bench_user
+
+def default_scenarios(dataset: Dict[str, Any]) -> List[Dict[str, Any]]:
+    uid, chat_id = dataset["main_uid"], dataset["main_chat_id"]
+    return [
+        {"name": "courses", "method": "GET", "path": "/courses/", "uid": uid},
+        {"name": "users_public", "method": "GET", "path": "/users/public",
+         "params": {"uids": ",".join(dataset["public_uids"])}, "uid": uid},
+        {"name": "users_helpers", "method": "GET", "path": "/users/helpers",
+         "params": {"subject": dataset["subject"]}, "uid": uid},
+        {"name": "chat_user", "method": "GET", "path": f"/chat/user/{uid}", "params": {"limit": 50}, "uid": uid},
+        {"name": "chat_messages", "method": "GET", "path": f"/chat/messages/{chat_id}",
+         "params": {"limit": 20}, "uid": uid},
+        # por último: cada envio grava mensagem + metadados e muda o que os outros cenários leem
+        {"name": "chat_send", "method": "POST", "path": f"/chat/send/{chat_id}",
+         "data": {"receiver_id": dataset["main_peer_uid"], "text": "mensagem do benchmark"}, "uid": uid},
+    ]
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentil por posto mais próximo (lista já ordenada)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+async def _request(client: httpx.AsyncClient, scenario: Dict[str, Any]) -> httpx.Response:
+    return await client.request(
+        scenario["method"], scenario["path"],
+        params=scenario.get("params"), data=scenario.get("data"),
+        headers={BENCH_USER_HEADER: scenario["uid"]},
+    )
+
+async def run_scenario(client: httpx.AsyncClient, store, scenario: Dict[str, Any],
+                       requests: int, concurrency: int, warmup: int = 10) -> Dict[str, Any]:
+    """Executa `requests` chamadas com até `concurrency` simultâneas, depois de `warmup` chamadas descartadas."""
+    for _ in range(warmup):
+        response = await _request(client, scenario)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{scenario['name']}: HTTP {response.status_code} no aquecimento: {response.text[:200]}")
+
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await _request(client, scenario)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    store.reset_stats()
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(1, min(concurrency, requests)))])
+    seconds = time.perf_counter() - started
+    ops = store.stats()
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "seconds": round(seconds, 4),
+        "rps": round(requests / seconds, 1) if seconds else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "firestore_per_request": {k: round(v / requests, 3) for k, v in ops.items()},
+    }
+
+async def run_suite(app: FastAPI, store, dataset: Dict[str, Any], requests: int = 300,
+                    concurrency: int = 10, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Roda os cenários (todos ou os de `only`) dentro do lifespan do app e retorna o relatório."""
+    install_auth_override(app)
+    scenarios = [s for s in default_scenarios(dataset) if not only or s["name"] in only]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in scenarios:
+                results[scenario["name"]] = await run_scenario(client, store, scenario, requests, concurrency)
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dataset": dataset["counts"],
+        "results": results,
+    }
+
+def compare_to_baseline(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25) -> List[str]:
+    """
+    Regressões em relação ao baseline: p95 ou vazão piores que a tolerância
+    (relativa) ou qualquer aumento de operações do Firestore por requisição,
+    que são determinísticas.
+    """
+    regressions = []
+    for name, current in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance) and \
+                current["p95_ms"] - base["p95_ms"] > MIN_LATENCY_DELTA_MS:
+            regressions.append(f"{name}: p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: vazão {base['rps']:.0f} -> {current['rps']:.0f} req/s")
+        for op, value in current["firestore_per_request"].items():
+            before = base.get("firestore_per_request", {}).get(op)
+            if before is not None and value > before + 0.01:
+                regressions.append(f"{name}: Firestore {op}/req {before} -> {value}")
+    return regressions
+
+def format_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> str:
+    lines = [f"{'cenário':<15}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erros':>7}"
+             f"{'chamadas':>10}{'leituras':>10}{'escritas':>10}"]
+    for name, r in report["results"].items():
+        ops = r["firestore_per_request"]
+        line = (f"{name:<15}{r['rps']:>9.0f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                f"{r['errors']:>7}{ops['calls']:>10.2f}{ops['reads']:>10.2f}{ops['writes']:>10.2f}")
+        base = (baseline or {}).get("results", {}).get(name)
+        if base and base["p95_ms"]:
+            line += f"   p95 {(r['p95_ms'] / base['p95_ms'] - 1) * 100:+.0f}%"
+        lines.append(line)
+    return "\n".join(lines)
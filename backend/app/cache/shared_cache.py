@@ -0,0 +1,281 @@
+"""
+Cache em memória por namespace (LRU + TTL) com invalidação entre workers e réplicas.
+
+Cada processo guarda suas próprias entradas; as escritas chamam `invalidate()`, que
+apaga na hora no processo local e publica a invalidação para os demais pelo backend
+de CACHE_INVALIDATION_BACKEND:
+
+- "local" (padrão): nada sai do processo (um único worker);
+- "firestore": um documento por invalidação em `cache_invalidations`, recebido pelos
+  outros processos via listener `on_snapshot`. Configure uma política de TTL do
+  Firestore no campo `expire_at` para a coleção não crescer;
+- "redis": pub/sub num servidor compatível com Redis (Redis, Valkey, KeyDB, um
+  container local...) em CACHE_REDIS_URL. Requer o pacote `redis`.
+
+A publicação é feita por uma thread própria (não bloqueia o event loop) e o TTL de
+cada cache continua valendo como rede de segurança se uma mensagem se perder.
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from cachetools import TLRUCache, TTLCache
+
+logger = logging.getLogger(__name__)
+
+CACHE_INVALIDATION_BACKEND = os.getenv("CACHE_INVALIDATION_BACKEND", "local").lower()
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache-invalidation")
+CACHE_INVALIDATION_COLLECTION = os.getenv("CACHE_INVALIDATION_COLLECTION", "cache_invalidations")
+# por quanto tempo os documentos de invalidação precisam existir (política de TTL do Firestore)
+CACHE_INVALIDATION_RETENTION_SECONDS = int(os.getenv("CACHE_INVALIDATION_RETENTION_SECONDS", "86400"))
+
+_caches: Dict[str, "SharedCache"] = {}
+_caches_lock = threading.Lock()
+
+class SharedCache:
+    """
+    Cache de um namespace. `ttl` fixo em segundos ou `ttu(chave, valor, agora)` com o
+    instante de expiração de cada item (relógio de `time.time`).
+
+    Leituras que podem correr com uma invalidação devem guardar `generation` antes de
+    ir ao Firestore e passá-la ao `set`: se houve invalidação no meio, o valor lido
+    (possivelmente velho) não é publicado.
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl: Optional[float] = None,
+                 ttu: Optional[Callable[[Any, Any, float], float]] = None):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        if ttu is not None:
+            self._data = TLRUCache(maxsize=maxsize, ttu=ttu, timer=time.time)
+        else:
+            self._data = TTLCache(maxsize=maxsize, ttl=ttl if ttl is not None else 300)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            if key in self._data:
+                self._stats["hits"] += 1
+                return self._data[key]
+            self._stats["misses"] += 1
+            return default
+
+    def get_many(self, keys: Iterable[Any]) -> Dict[Any, Any]:
+        """Só as chaves presentes no cache (valores None incluídos)."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    found[key] = self._data[key]
+                    self._stats["hits"] += 1
+                else:
+                    self._stats["misses"] += 1
+        return found
+
+    def set(self, key: Any, value: Any, generation: Optional[int] = None) -> None:
+        self.set_many({key: value}, generation)
+
+    def set_many(self, items: Dict[Any, Any], generation: Optional[int] = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data.update(items)
+
+    def invalidate(self, keys: Optional[Iterable[Any]] = None) -> None:
+        """Apaga as chaves (ou o namespace inteiro) aqui e nos outros processos."""
+        keys = None if keys is None else [str(k) for k in keys]
+        self.drop(keys)
+        invalidation_bus.publish(self.namespace, keys)
+
+    def drop(self, keys: Optional[List[str]] = None) -> None:
+        """Apaga só neste processo."""
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            if keys is None:
+                self._data.clear()
+            else:
+                for key in keys:
+                    self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            self._stats.update(hits=0, misses=0, invalidations=0)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "size": len(self._data), "maxsize": self.maxsize}
+
+def shared_cache(namespace: str, maxsize: int, ttl: Optional[float] = None,
+                 ttu: Optional[Callable[[Any, Any, float], float]] = None) -> SharedCache:
+    """Cria (uma vez por namespace) o cache e o registra para receber invalidações."""
+    with _caches_lock:
+        if namespace in _caches:
+            raise ValueError(f"Cache '{namespace}' já registrado")
+        cache = _caches[namespace] = SharedCache(namespace, maxsize, ttl=ttl, ttu=ttu)
+    return cache
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    with _caches_lock:
+        caches = dict(_caches)
+    return {namespace: cache.stats() for namespace, cache in caches.items()}
+
+# ---------------------------------------------------------------------------
+# backends de invalidação
+# ---------------------------------------------------------------------------
+
+class _FirestoreBackend:
+    def __init__(self):
+        from app.firebase.firestore_client import db
+        self._collection = db.collection(CACHE_INVALIDATION_COLLECTION)
+        self._watch = None
+
+    def send(self, message: Dict[str, Any]) -> None:
+        expire_at = datetime.now(timezone.utc) + timedelta(seconds=CACHE_INVALIDATION_RETENTION_SECONDS)
+        self._collection.document().set({**message, "at": datetime.now(timezone.utc), "expire_at": expire_at})
+
+    def start(self, on_message: Callable[[Dict[str, Any]], None]) -> None:
+        def _on_snapshot(_snapshots, changes, _read_time):
+            for change in changes:
+                if change.type.name == "ADDED":
+                    on_message(change.document.to_dict() or {})
+
+        since = datetime.now(timezone.utc)
+        self._watch = self._collection.where("at", ">=", since).on_snapshot(_on_snapshot)
+
+    def stop(self) -> None:
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+class _RedisBackend:
+    def __init__(self):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_INVALIDATION_BACKEND=redis requer o pacote 'redis' (pip install redis)")
+        self._client = redis.Redis.from_url(CACHE_REDIS_URL)
+        self._pubsub = None
+        self._thread = None
+
+    def send(self, message: Dict[str, Any]) -> None:
+        self._client.publish(CACHE_INVALIDATION_CHANNEL, json.dumps(message))
+
+    def start(self, on_message: Callable[[Dict[str, Any]], None]) -> None:
+        def _handler(item):
+            try:
+                on_message(json.loads(item["data"]))
+            except ValueError as e:
+                logger.warning("Invalidação de cache ilegível: %s", e)
+
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{CACHE_INVALIDATION_CHANNEL: _handler})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._thread.stop()
+            self._thread = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+
+_BACKENDS = {"firestore": _FirestoreBackend, "redis": _RedisBackend}
+
+class InvalidationBus:
+    """Leva as invalidações de um processo aos caches (e assinantes) dos outros."""
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self._backend = None
+        self._outbox: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._sender: Optional[threading.Thread] = None
+        self._subscribers: Dict[str, List[Callable[[Optional[List[str]]], None]]] = {}
+
+    @property
+    def backend_name(self) -> str:
+        return CACHE_INVALIDATION_BACKEND
+
+    @property
+    def shared(self) -> bool:
+        """Se as invalidações chegam aos outros processos (backend iniciado e não "local")."""
+        return self._backend is not None
+
+    def subscribe(self, namespace: str, callback: Callable[[Optional[List[str]]], None]) -> None:
+        """`callback(chaves)` a cada invalidação do namespace vinda de outro processo."""
+        self._subscribers.setdefault(namespace, []).append(callback)
+
+    def _notify(self, namespace: str, keys: Optional[List[str]]) -> None:
+        for callback in self._subscribers.get(namespace, []):
+            try:
+                callback(keys)
+            except Exception as e:
+                logger.warning("Falha no assinante de invalidação '%s': %s", namespace, e)
+
+    def publish(self, namespace: str, keys: Optional[List[str]]) -> None:
+        if self._backend is not None:
+            self._outbox.put({"ns": namespace, "keys": keys, "origin": self.origin})
+
+    def _receive(self, message: Dict[str, Any]) -> None:
+        if message.get("origin") == self.origin:
+            return
+        namespace, keys = message.get("ns"), message.get("keys")
+        with _caches_lock:
+            cache = _caches.get(namespace)
+        if cache is not None:
+            cache.drop(keys)
+        self._notify(namespace, keys)
+
+    def _send_loop(self, backend) -> None:
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            try:
+                backend.send(message)
+            except Exception as e:
+                logger.warning("Falha ao publicar invalidação de cache %s: %s", message.get("ns"), e)
+
+    def start(self) -> None:
+        if self._backend is not None or CACHE_INVALIDATION_BACKEND == "local":
+            return
+        factory = _BACKENDS.get(CACHE_INVALIDATION_BACKEND)
+        if factory is None:
+            raise RuntimeError(f"CACHE_INVALIDATION_BACKEND inválido: {CACHE_INVALIDATION_BACKEND!r}")
+        backend = factory()
+        backend.start(self._receive)
+        self._backend = backend
+        self._sender = threading.Thread(target=self._send_loop, args=(backend,), name="cache-invalidation", daemon=True)
+        self._sender.start()
+        logger.info("Invalidação de cache entre processos via %s", CACHE_INVALIDATION_BACKEND)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        backend, self._backend = self._backend, None
+        if backend is None:
+            return
+        # entrega o que ficou na fila antes de desligar
+        self._outbox.put(None)
+        if self._sender is not None:
+            self._sender.join(timeout)
+            self._sender = None
+        try:
+            backend.stop()
+        except Exception as e:
+            logger.warning("Falha ao encerrar invalidação de cache: %s", e)
+
+invalidation_bus = InvalidationBus()
@@ -1,5 +1,9 @@
+import logging
+from typing import Optional
 from google.cloud.exceptions import NotFound
-from app.firebase.firestore_client import db
+from app.firebase.firestore_client import db, async_db
+
+logger = logging.getLogger(__name__)
 
 class Db:
     _db = db
@@ -8,8 +12,8 @@ class Db:
     def create(collection: str, doc_id: str, data: dict):
         try:
             return Db._db.collection(collection).document(doc_id).set(data)
-        except Exception as e:
-            print(f"[Db.create] Erro ao criar documento: {e}")
+        except Exception:
+            logger.exception("[Db.create] Erro ao criar documento")
             raise
 
     @staticmethod
@@ -19,24 +23,24 @@ class Db:
             return doc.to_dict() if doc.exists else None
         except NotFound:
             return None
-        except Exception as e:
-            print(f"[Db.get] Erro ao buscar documento: {e}")
+        except Exception:
+            logger.exception("[Db.get] Erro ao buscar documento")
             raise
 
     @staticmethod
     def update(collection: str, doc_id: str, data: dict):
         try:
             return Db._db.collection(collection).document(doc_id).update(data)
-        except Exception as e:
-            print(f"[Db.update] Erro ao atualizar documento: {e}")
+        except Exception:
+            logger.exception("[Db.update] Erro ao atualizar documento")
             raise
 
     @staticmethod
     def delete(collection: str, doc_id: str):
         try:
             return Db._db.collection(collection).document(doc_id).delete()
-        except Exception as e:
-            print(f"[Db.delete] Erro ao deletar documento: {e}")
+        except Exception:
+            logger.exception("[Db.delete] Erro ao deletar documento")
             raise
 
     @staticmethod
@@ -46,8 +50,8 @@ class Db:
             for field, op, value in filters:
                 col_ref = col_ref.where(field, op, value)
             return [doc.to_dict() for doc in col_ref.stream()]
-        except Exception as e:
-            print(f"[Db.query] Erro ao realizar consulta: {e}")
+        except Exception:
+            logger.exception("[Db.query] Erro ao realizar consulta")
             raise
 
     @staticmethod
@@ -55,6 +59,102 @@ class Db:
         try:
             sub_ref = Db._db.collection(collection).document(doc_id).collection(subcollection)
             return [doc.to_dict() for doc in sub_ref.stream()]
-        except Exception as e:
-            print(f"[Db.list_subcollection] Erro ao listar subcoleção: {e}")
+        except Exception:
+            logger.exception("[Db.list_subcollection] Erro ao listar subcoleção")
+            raise
+
+    @staticmethod
+    def collection_group(subcollection: str, parent_collection: Optional[str] = None):
+        """
+        Consulta de grupo de coleções (uma única query para todas as subcoleções
+        com o mesmo nome). Retorna pares (id_do_documento_pai, dados).
+        """
+        try:
+            items = []
+            for doc in Db._db.collection_group(subcollection).stream():
+                parent_doc = doc.reference.parent.parent
+                if parent_doc is None:
+                    continue
+                if parent_collection and parent_doc.parent.id != parent_collection:
+                    continue
+                items.append((parent_doc.id, doc.to_dict()))
+            return items
+        except Exception:
+            logger.exception("[Db.collection_group] Erro ao consultar grupo de coleções")
+            raise
+
+
+class AsyncDb:
+    """Espelho assíncrono de `Db`, sobre o firestore.AsyncClient (não bloqueia o event loop)."""
+    _db = async_db
+
+    @staticmethod
+    async def create(collection: str, doc_id: str, data: dict):
+        try:
+            return await AsyncDb._db.collection(collection).document(doc_id).set(data)
+        except Exception:
+            logger.exception("[AsyncDb.create] Erro ao criar documento")
+            raise
+
+    @staticmethod
+    async def get(collection: str, doc_id: str):
+        try:
+            doc = await AsyncDb._db.collection(collection).document(doc_id).get()
+            return doc.to_dict() if doc.exists else None
+        except NotFound:
+            return None
+        except Exception:
+            logger.exception("[AsyncDb.get] Erro ao buscar documento")
+            raise
+
+    @staticmethod
+    async def update(collection: str, doc_id: str, data: dict):
+        try:
+            return await AsyncDb._db.collection(collection).document(doc_id).update(data)
+        except Exception:
+            logger.exception("[AsyncDb.update] Erro ao atualizar documento")
+            raise
+
+    @staticmethod
+    async def delete(collection: str, doc_id: str):
+        try:
+            return await AsyncDb._db.collection(collection).document(doc_id).delete()
+        except Exception:
+            logger.exception("[AsyncDb.delete] Erro ao deletar documento")
+            raise
+
+    @staticmethod
+    async def query(collection: str, filters: list[tuple] = []):
+        try:
+            col_ref = AsyncDb._db.collection(collection)
+            for field, op, value in filters:
+                col_ref = col_ref.where(field, op, value)
+            return [doc.to_dict() async for doc in col_ref.stream()]
+        except Exception:
+            logger.exception("[AsyncDb.query] Erro ao realizar consulta")
+            raise
+
+    @staticmethod
+    async def list_subcollection(collection: str, doc_id: str, subcollection: str):
+        try:
+            sub_ref = AsyncDb._db.collection(collection).document(doc_id).collection(subcollection)
+            return [doc.to_dict() async for doc in sub_ref.stream()]
+        except Exception:
+            logger.exception("[AsyncDb.list_subcollection] Erro ao listar subcoleção")
+            raise
+
+    @staticmethod
+    async def collection_group(subcollection: str, parent_collection: Optional[str] = None):
+        try:
+            items = []
+            async for doc in AsyncDb._db.collection_group(subcollection).stream():
+                parent_doc = doc.reference.parent.parent
+                if parent_doc is None:
+                    continue
+                if parent_collection and parent_doc.parent.id != parent_collection:
+                    continue
+                items.append((parent_doc.id, doc.to_dict()))
+            return items
+        except Exception:
+            logger.exception("[AsyncDb.collection_group] Erro ao consultar grupo de coleções")
             raise
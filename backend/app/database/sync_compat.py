@@ -0,0 +1,35 @@
+"""
+Compatibilidade síncrona para scripts/CLIs que precisam chamar a camada de dados
+assíncrona (repositórios com `async def`) fora de um event loop.
+
+    from app.database.sync_compat import run_sync
+    stats = run_sync(chat_repository.backfill_chat_meta(dry_run=True))
+
+Todas as chamadas usam o mesmo event loop, numa thread dedicada: o AsyncClient do
+Firestore (grpc.aio) fica preso ao loop em que foi usado pela primeira vez, então
+`asyncio.run` a cada chamada não funcionaria. Não use dentro de rotas/serviços.
+"""
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="sync-compat-loop", daemon=True).start()
+        return _loop
+
+def run_sync(coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None) -> Any:
+    """Executa a corrotina no loop de compatibilidade e devolve o resultado (bloqueante)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        raise RuntimeError("run_sync não pode ser usado dentro de um event loop; use await")
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
@@ -0,0 +1,155 @@
+"""
+Fila de escrita adiada (write-behind) para campos denormalizados que podem atrasar e
+ser refeitos a partir da fonte (hoje: `participant_profiles` dos chats, copiado de users/).
+
+`enqueue(ref, payload)` guarda a atualização em memória, no formato de
+`set(payload, merge=True)`. Atualizações do mesmo documento até o próximo flush viram
+uma escrita só: mapas são fundidos campo a campo (como o merge do Firestore) e, no
+mesmo campo, vale o valor enfileirado por último.
+
+Uma tarefa no event loop grava a cada `flush_interval` segundos (ou antes, quando
+acumula `max_batch` documentos), em WriteBatch de até 500 operações. Falhas voltam
+para a fila. O lifespan chama `stop()`, que grava o que sobrou antes de encerrar.
+Fora do lifespan (scripts), `enqueue` grava na hora.
+"""
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from app.firebase.firestore_client import async_db
+
+logger = logging.getLogger(__name__)
+
+# limite do Firestore por commit
+MAX_BATCH_WRITES = 500
+
+def _merge(base: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """Funde `update` sobre `base` (novo dict); nos campos que não são mapas, `update` vence."""
+    merged = dict(base)
+    for key, value in update.items():
+        current = merged.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            merged[key] = _merge(current, value)
+        else:
+            merged[key] = value
+    return merged
+
+class _Entry:
+    __slots__ = ("ref", "payload", "updates")
+
+    def __init__(self, ref: Any, payload: Dict[str, Any]):
+        self.ref = ref
+        self.payload = payload
+        self.updates = 1
+
+    def absorb(self, payload: Dict[str, Any], updates: int = 1) -> None:
+        self.payload = _merge(self.payload, payload)
+        self.updates += updates
+
+class WriteBehindQueue:
+    """Fila de um tipo de documento."""
+
+    def __init__(self, name: str, flush_interval: float = 1.0, max_batch: int = MAX_BATCH_WRITES):
+        self.name = name
+        self.flush_interval = flush_interval
+        self.max_batch = min(max_batch, MAX_BATCH_WRITES)
+        self._pending: Dict[str, _Entry] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stats = {"enqueued": 0, "coalesced": 0, "written": 0, "batches": 0, "failures": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def enqueue(self, ref: Any, payload: Dict[str, Any]) -> None:
+        """Agenda `ref.set(payload, merge=True)`, fundido com o que já está pendente para `ref`."""
+        self._stats["enqueued"] += 1
+        if not self.running:
+            await ref.set(payload, merge=True)
+            self._stats["written"] += 1
+            return
+        entry = self._pending.get(ref.path)
+        if entry is None:
+            self._pending[ref.path] = _Entry(ref, payload)
+        else:
+            entry.absorb(payload)
+            self._stats["coalesced"] += 1
+        if len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        """Grava tudo o que está pendente agora. Retorna quantos documentos foram gravados."""
+        if self._flush_lock is None:
+            return 0
+        async with self._flush_lock:
+            entries, self._pending = list(self._pending.values()), {}
+            written = 0
+            for start in range(0, len(entries), self.max_batch):
+                chunk = entries[start:start + self.max_batch]
+                batch = async_db.batch()
+                for entry in chunk:
+                    batch.set(entry.ref, entry.payload, merge=True)
+                try:
+                    await batch.commit()
+                except Exception as e:
+                    self._stats["failures"] += 1
+                    logger.warning("Falha ao gravar %d documentos da fila '%s': %s", len(chunk), self.name, e)
+                    self._requeue(entries[start:])
+                    break
+                self._stats["batches"] += 1
+                self._stats["written"] += len(chunk)
+                written += len(chunk)
+            return written
+
+    def _requeue(self, entries: List[_Entry]) -> None:
+        # o que chegou durante o commit é mais novo: funde por cima do que falhou
+        for entry in entries:
+            newer = self._pending.get(entry.ref.path)
+            if newer is not None:
+                entry.absorb(newer.payload, newer.updates)
+            self._pending[entry.ref.path] = entry
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._pending:
+                started = time.perf_counter()
+                # cancelada no meio (stop), a gravação em curso termina mesmo assim
+                written = await asyncio.shield(self.flush())
+                logger.debug("Fila '%s': %d documentos em %.1f ms", self.name, written,
+                             (time.perf_counter() - started) * 1000)
+
+    def start(self) -> None:
+        """Inicia o flush periódico no event loop atual (lifespan)."""
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run(), name=f"write-behind-{self.name}")
+
+    async def stop(self, attempts: int = 3) -> None:
+        """Para o flush periódico e grava o que ficou pendente."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        for _ in range(attempts):
+            if not self._pending:
+                break
+            await self.flush()
+        if self._pending:
+            logger.error("Fila '%s' encerrada com %d documentos não gravados", self.name, len(self._pending))
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "pending": len(self._pending)}
@@ -1,26 +1,227 @@
-from typing import Optional
-from firebase_admin import storage
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+from urllib.parse import quote
+from app.firebase.firestore_client import get_bucket
 from fastapi import UploadFile
 
-def upload_file(file: UploadFile, destination_path: str) -> str:
+logger = logging.getLogger(__name__)
+
+# limite de tamanho por anexo (bytes); 0 desativa
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+# tamanho de cada chunk do upload resumable (múltiplo de 256 KiB, exigência do GCS)
+UPLOAD_CHUNK_SIZE = max(1, int(os.getenv("UPLOAD_CHUNK_SIZE_KB", "4096")) // 256) * 256 * 1024
+
+# validade das URLs assinadas de upload direto (cliente -> Storage)
+SIGNED_UPLOAD_TTL_SECONDS = int(os.getenv("SIGNED_UPLOAD_TTL_SECONDS", "900"))
+# token de download do Firebase: gravado como metadado no próprio upload, dispensa make_public()
+DOWNLOAD_TOKEN_METADATA = "firebaseStorageDownloadTokens"
+
+def _bucket():
+    # bucket padrão do backend configurado (Firebase ou em memória)
+    return get_bucket()
+
+class UploadTooLargeError(ValueError):
+    def __init__(self, size: int, max_bytes: int):
+        limit = f"{max_bytes // (1024 * 1024)} MB" if max_bytes >= 1024 * 1024 else f"{max_bytes} bytes"
+        super().__init__(f"Arquivo excede o limite de {limit}")
+        self.size = size
+        self.max_bytes = max_bytes
+
+_stats_lock = threading.Lock()
+_upload_stats = {"uploads": 0, "bytes": 0, "seconds": 0.0, "rejected": 0,
+                 "direct_uploads": 0, "direct_bytes": 0}
+
+def get_upload_stats() -> Dict[str, float]:
+    """Totais de upload do processo e a vazão média (bytes/s)."""
+    with _stats_lock:
+        stats = dict(_upload_stats)
+    stats["bytes_per_second"] = stats["bytes"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+def _remaining_size(fileobj: BinaryIO) -> int:
+    pos = fileobj.tell()
+    fileobj.seek(0, os.SEEK_END)
+    end = fileobj.tell()
+    fileobj.seek(pos)
+    return end - pos
+
+def check_upload_size(size: int, max_bytes: Optional[int] = None) -> None:
+    limit = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if limit and size > limit:
+        with _stats_lock:
+            _upload_stats["rejected"] += 1
+        raise UploadTooLargeError(size, limit)
+
+def hash_stream(fileobj: BinaryIO, max_bytes: Optional[int] = None) -> Tuple[str, int]:
     """
-    Faz o upload do arquivo (UploadFile do FastAPI) para o Firebase Storage e retorna a URL pública.
+    sha256 do arquivo lido em chunks (sem carregá-lo inteiro), rebobinando no fim.
+    Interrompe assim que passar do limite de tamanho. Bloqueante: chame via threadpool.
     """
-    bucket = storage.bucket()
-    blob = bucket.blob(destination_path)
+    limit = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    start = fileobj.tell()
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = fileobj.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if limit and size > limit:
+            fileobj.seek(start)
+            check_upload_size(size, limit)
+        digest.update(chunk)
+    fileobj.seek(start)
+    return digest.hexdigest(), size
+
+def upload_stream(destination_path: str, fileobj: BinaryIO, content_type: Optional[str] = None,
+                  size: Optional[int] = None, max_bytes: Optional[int] = None) -> str:
+    """
+    Envia um arquivo (file-like, ex.: o spool de um UploadFile) para o Storage sem
+    carregá-lo inteiro na memória: acima de 8 MB o cliente usa upload resumable,
+    lendo o arquivo em chunks de UPLOAD_CHUNK_SIZE. Bloqueante: chame via threadpool.
+    O objeto não fica público: a URL devolvida leva o token de download, gravado como
+    metadado no próprio upload (como em `upload_file_from_bytes`).
+    """
+    if size is None:
+        size = _remaining_size(fileobj)
+    check_upload_size(size, max_bytes)
+
+    bucket = _bucket()
+    blob = bucket.blob(destination_path, chunk_size=UPLOAD_CHUNK_SIZE)
+    token = str(uuid.uuid4())
+    blob.metadata = {DOWNLOAD_TOKEN_METADATA: token}
 
-    file_data = file.file.read()
-    blob.upload_from_string(file_data, content_type=file.content_type or "application/octet-stream")
+    started = time.perf_counter()
+    blob.upload_from_file(fileobj, size=size, content_type=content_type or "application/octet-stream")
+    elapsed = time.perf_counter() - started
 
-    blob.make_public()
-    return blob.public_url
+    with _stats_lock:
+        _upload_stats["uploads"] += 1
+        _upload_stats["bytes"] += size
+        _upload_stats["seconds"] += elapsed
+    logger.info("Upload %s: %d bytes em %.2fs (%.0f bytes/s)",
+                destination_path, size, elapsed, size / elapsed if elapsed else 0.0)
+    return download_url(bucket.name, destination_path, token)
+
+def upload_file(file: UploadFile, destination_path: str) -> str:
+    """
+    Faz o upload do arquivo (UploadFile do FastAPI) para o Firebase Storage e retorna a URL de download (com token).
+    """
+    return upload_stream(destination_path, file.file, file.content_type, size=file.size)
 
 def upload_file_from_bytes(destination_path: str, content: bytes, content_type: Optional[str] = None) -> str:
     """
-    Faz upload a partir de bytes já lidos (útil quando a rota já fez await file.read()).
+    Faz upload a partir de bytes já em memória (ex.: imagens processadas no servidor).
+    O token de download vai como metadado no próprio upload: uma requisição só, sem make_public().
     """
-    bucket = storage.bucket()
+    bucket = _bucket()
     blob = bucket.blob(destination_path)
+    token = str(uuid.uuid4())
+    blob.metadata = {DOWNLOAD_TOKEN_METADATA: token}
     blob.upload_from_string(content, content_type=content_type or "application/octet-stream")
-    blob.make_public()
-    return blob.public_url
+    return download_url(bucket.name, destination_path, token)
+
+def store_private_bytes(destination_path: str, content: bytes, content_type: Optional[str] = None) -> None:
+    """Grava bytes sem token de download: o objeto só é lido pelo backend (ex.: arquivo de mensagens)."""
+    _bucket().blob(destination_path).upload_from_string(content, content_type=content_type or "application/octet-stream")
+
+def read_private_bytes(object_path: str) -> bytes:
+    """Lê um objeto gravado por `store_private_bytes` (uma requisição, sem buscar metadados)."""
+    return _bucket().blob(object_path).download_as_bytes()
+
+def download_bytes(object_path: str, max_bytes: Optional[int] = None) -> bytes:
+    """Baixa um objeto pequeno do Storage (ex.: imagem enviada por URL assinada)."""
+    blob = _bucket().get_blob(object_path)
+    if blob is None:
+        raise FileNotFoundError("Arquivo não encontrado")
+    if max_bytes and (blob.size or 0) > max_bytes:
+        raise UploadTooLargeError(blob.size or 0, max_bytes)
+    return blob.download_as_bytes()
+
+def _emulator_host() -> Optional[str]:
+    host = os.getenv("STORAGE_EMULATOR_HOST")
+    if not host:
+        return None
+    return host.rstrip("/") if "://" in host else f"http://{host.rstrip('/')}"
+
+def download_url(bucket_name: str, object_path: str, token: str) -> str:
+    base = _emulator_host() or "https://firebasestorage.googleapis.com"
+    return f"{base}/v0/b/{bucket_name}/o/{quote(object_path, safe='')}?alt=media&token={token}"
+
+def create_signed_upload(object_path: str, content_type: Optional[str] = None,
+                         max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Gera uma URL assinada (V4, PUT) de curta duração para o cliente enviar o arquivo
+    direto ao Storage. O cliente deve repetir os `headers` retornados: eles fazem parte
+    da assinatura (tipo, limite de tamanho e o token de download).
+    Com STORAGE_EMULATOR_HOST definido, devolve a URL de upload do emulador.
+    """
+    limit = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    content_type = content_type or "application/octet-stream"
+    token = str(uuid.uuid4())
+    bucket = _bucket()
+    expires_at_ms = int((time.time() + SIGNED_UPLOAD_TTL_SECONDS) * 1000)
+
+    emulator = _emulator_host()
+    if emulator:
+        return {
+            "upload_url": f"{emulator}/upload/storage/v1/b/{bucket.name}/o?uploadType=media&name={quote(object_path, safe='')}",
+            "method": "POST",
+            "headers": {"Content-Type": content_type},
+            "object_path": object_path,
+            "expires_at": expires_at_ms,
+        }
+
+    headers = {
+        "Content-Type": content_type,
+        f"x-goog-meta-{DOWNLOAD_TOKEN_METADATA}": token,
+    }
+    if limit:
+        headers["x-goog-content-length-range"] = f"0,{limit}"
+    url = bucket.blob(object_path).generate_signed_url(
+        version="v4",
+        expiration=timedelta(seconds=SIGNED_UPLOAD_TTL_SECONDS),
+        method="PUT",
+        content_type=content_type,
+        headers={k: v for k, v in headers.items() if k != "Content-Type"},
+    )
+    return {"upload_url": url, "method": "PUT", "headers": headers,
+            "object_path": object_path, "expires_at": expires_at_ms}
+
+def finalize_upload(object_path: str, max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Confere o objeto enviado pelo cliente e devolve seus metadados (url, tamanho, tipo).
+    Objetos acima do limite são apagados. Lança FileNotFoundError se o upload não existe.
+    """
+    bucket = _bucket()
+    blob = bucket.get_blob(object_path)
+    if blob is None:
+        raise FileNotFoundError("Upload não encontrado")
+    try:
+        check_upload_size(blob.size or 0, max_bytes)
+    except UploadTooLargeError:
+        blob.delete()
+        raise
+
+    token = (blob.metadata or {}).get(DOWNLOAD_TOKEN_METADATA)
+    if not token:
+        # uploads pelo emulador (ou clientes que não mandaram o header) não trazem o token
+        token = str(uuid.uuid4())
+        blob.metadata = {**(blob.metadata or {}), DOWNLOAD_TOKEN_METADATA: token}
+        blob.patch()
+
+    with _stats_lock:
+        _upload_stats["direct_uploads"] += 1
+        _upload_stats["direct_bytes"] += blob.size or 0
+    return {
+        "url": download_url(bucket.name, object_path, token.split(",")[0]),
+        "object_path": object_path,
+        "size": blob.size or 0,
+        "content_type": blob.content_type or "application/octet-stream",
+    }
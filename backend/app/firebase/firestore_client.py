@@ -1,8 +1,21 @@
+"""
+Registro dos clientes do Firebase (Firestore síncrono/assíncrono e bucket do Storage).
+
+Nada é criado no import: credenciais, app do Firebase e canais gRPC só existem na
+primeira chamada de `get_db()`, `get_async_db()` ou `get_bucket()` (normalmente o
+warm-up do lifespan, ver app/firebase/warmup.py). `db`, `async_db` e `bucket`
+continuam importáveis pelos repositórios: são proxies que resolvem o cliente no
+primeiro uso.
+"""
 import os
 import json
+import threading
+from typing import Any, Dict, Optional
+
 import firebase_admin
-from firebase_admin import credentials, firestore, storage
+from firebase_admin import credentials
 from dotenv import load_dotenv
+from app.firebase.instrumentation import instrument_client, instrument_bucket
 
 load_dotenv()
 
@@ -59,11 +72,88 @@ def _firebase_options():
         opts["storageBucket"] = bucket_name
     return opts or None
 
-# Inicializa o app Firebase apenas uma vez
-if not firebase_admin._apps:
-    cred = _resolve_credentials()
-    options = _firebase_options()
-    firebase_admin.initialize_app(cred, options)
+# "firebase" (padrão) ou "memory": Firestore/Storage em memória, sem credenciais
+# (benchmarks e desenvolvimento offline; ver app/firebase/memory_backend.py)
+FIRESTORE_BACKEND = os.getenv("FIRESTORE_BACKEND", "firebase").strip().lower()
+# latência artificial por chamada do backend em memória
+MEMORY_BACKEND_LATENCY_MS = float(os.getenv("MEMORY_BACKEND_LATENCY_MS", "0"))
+
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.RLock()
+
+def _check_backend() -> None:
+    if FIRESTORE_BACKEND not in ("firebase", "memory"):
+        raise RuntimeError(f"FIRESTORE_BACKEND inválido: {FIRESTORE_BACKEND!r} (use 'firebase' ou 'memory')")
+
+def get_firebase_app() -> Optional[firebase_admin.App]:
+    """App padrão do Firebase, inicializado uma única vez (None com o backend em memória)."""
+    _check_backend()
+    if FIRESTORE_BACKEND == "memory":
+        return None
+    with _clients_lock:
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(_resolve_credentials(), _firebase_options())
+        return firebase_admin.get_app()
+
+def _create_clients() -> None:
+    if FIRESTORE_BACKEND == "memory":
+        from app.firebase.memory_backend import create_memory_backend
+
+        db, async_db, bucket = create_memory_backend(
+            latency_ms=MEMORY_BACKEND_LATENCY_MS,
+            bucket_name=os.getenv("FIREBASE_STORAGE_BUCKET") or "memory-bucket",
+        )
+    else:
+        from firebase_admin import firestore, firestore_async, storage
+
+        app = get_firebase_app()
+        db = firestore.client(app)
+        # cliente assíncrono (grpc.aio) usado pelas rotas; o síncrono fica para scripts e listeners
+        async_db = firestore_async.client(app)
+        bucket = storage.bucket(app=app)
+
+    # todo acesso passa pela instrumentação (leituras/escritas/tempo por requisição e /metrics)
+    _clients.update(db=instrument_client(db), async_db=instrument_client(async_db),
+                    bucket=instrument_bucket(bucket))
+
+def _client(name: str) -> Any:
+    client = _clients.get(name)
+    if client is None:
+        _check_backend()
+        with _clients_lock:
+            if not _clients:
+                _create_clients()
+            client = _clients[name]
+    return client
+
+def get_db() -> Any:
+    return _client("db")
+
+def get_async_db() -> Any:
+    return _client("async_db")
+
+def get_bucket() -> Any:
+    return _client("bucket")
+
+def clients_initialized() -> bool:
+    return bool(_clients)
+
+class _LazyClient:
+    """Proxy que cria o cliente do registro no primeiro uso."""
+    __slots__ = ("_name",)
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(_client(self._name), attr)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        setattr(_client(self._name), attr, value)
+
+    def __repr__(self) -> str:
+        return f"<lazy {self._name}>"
 
-db = firestore.client()
-bucket = storage.bucket()
+db = _LazyClient("db")
+async_db = _LazyClient("async_db")
+bucket = _LazyClient("bucket")
@@ -0,0 +1,329 @@
+"""
+Instrumentação de todo acesso ao Firestore e ao Storage.
+
+Os clientes criados em firestore_client (db, async_db, bucket) são embrulhados
+por `_Traced`: referências, queries, batches e snapshots derivados deles também
+são embrulhados, então Db, os repositórios e firebase_storage passam todos por aqui
+sem mudar nada. Cada chamada que vai à rede é medida (tempo, leituras, escritas,
+documentos retornados, bytes) e somada:
+
+- à requisição atual (`RequestOps` no contextvar, preenchido pelo middleware);
+- às métricas agregadas do processo (/metrics).
+"""
+import os
+import time
+import inspect
+import contextvars
+from typing import Any, Dict, Optional, Tuple
+
+from app.monitoring.metrics import registry, COUNT_BUCKETS
+
+INSTRUMENTATION_ENABLED = os.getenv("FIRESTORE_INSTRUMENTATION", "1").lower() not in ("0", "false", "no")
+
+firestore_call_seconds = registry.histogram(
+    "firestore_call_duration_seconds", "Duração das chamadas ao Firestore", ["op"])
+firestore_reads_total = registry.counter(
+    "firestore_reads_total", "Leituras cobradas do Firestore (mínimo de 1 por query)", ["op"])
+firestore_writes_total = registry.counter("firestore_writes_total", "Escritas no Firestore", ["op"])
+firestore_deletes_total = registry.counter("firestore_deletes_total", "Exclusões no Firestore", ["op"])
+firestore_errors_total = registry.counter("firestore_errors_total", "Chamadas ao Firestore com erro", ["op"])
+firestore_query_documents = registry.histogram(
+    "firestore_query_documents", "Documentos retornados por query", ["op"], buckets=COUNT_BUCKETS)
+storage_call_seconds = registry.histogram(
+    "storage_call_duration_seconds", "Duração das chamadas ao Storage", ["op"])
+storage_bytes_total = registry.counter("storage_bytes_total", "Bytes enviados/baixados do Storage", ["direction"])
+storage_errors_total = registry.counter("storage_errors_total", "Chamadas ao Storage com erro", ["op"])
+
+class RequestOps:
+    """Totais de Firestore/Storage de uma requisição."""
+
+    __slots__ = ("firestore_calls", "reads", "writes", "deletes", "documents", "firestore_seconds",
+                 "storage_calls", "bytes_uploaded", "bytes_downloaded", "storage_seconds")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "firestore": {"calls": self.firestore_calls, "reads": self.reads, "writes": self.writes,
+                          "deletes": self.deletes, "documents": self.documents,
+                          "ms": round(self.firestore_seconds * 1000, 2)},
+            "storage": {"calls": self.storage_calls, "bytes_uploaded": self.bytes_uploaded,
+                        "bytes_downloaded": self.bytes_downloaded, "ms": round(self.storage_seconds * 1000, 2)},
+        }
+
+_current_ops: contextvars.ContextVar[Optional[RequestOps]] = contextvars.ContextVar("request_ops", default=None)
+
+def start_request() -> Tuple[RequestOps, contextvars.Token]:
+    ops = RequestOps()
+    return ops, _current_ops.set(ops)
+
+def end_request(token: contextvars.Token) -> None:
+    _current_ops.reset(token)
+
+def current_request_ops() -> Optional[RequestOps]:
+    return _current_ops.get()
+
+def _record_firestore(op: str, seconds: float, error: bool = False, reads: int = 0, writes: int = 0,
+                      deletes: int = 0, documents: Optional[int] = None) -> None:
+    firestore_call_seconds.observe(seconds, op)
+    if error:
+        firestore_errors_total.inc(1, op)
+    if reads:
+        firestore_reads_total.inc(reads, op)
+    if writes:
+        firestore_writes_total.inc(writes, op)
+    if deletes:
+        firestore_deletes_total.inc(deletes, op)
+    if documents is not None:
+        firestore_query_documents.observe(documents, op)
+    ops = _current_ops.get()
+    if ops is not None:
+        ops.firestore_calls += 1
+        ops.reads += reads
+        ops.writes += writes
+        ops.deletes += deletes
+        ops.documents += documents or 0
+        ops.firestore_seconds += seconds
+
+def _record_storage(op: str, seconds: float, error: bool = False, uploaded: int = 0, downloaded: int = 0) -> None:
+    storage_call_seconds.observe(seconds, op)
+    if error:
+        storage_errors_total.inc(1, op)
+    if uploaded:
+        storage_bytes_total.inc(uploaded, "upload")
+    if downloaded:
+        storage_bytes_total.inc(downloaded, "download")
+    ops = _current_ops.get()
+    if ops is not None:
+        ops.storage_calls += 1
+        ops.bytes_uploaded += uploaded
+        ops.bytes_downloaded += downloaded
+        ops.storage_seconds += seconds
+
+# ---------------------------------------------------------------------------
+# proxy
+# ---------------------------------------------------------------------------
+
+def _kind_of(obj: Any) -> Optional[str]:
+    """Tipo de objeto do SDK (real ou em memória) que deve ser embrulhado, pelo nome da classe."""
+    name = type(obj).__name__
+    if name.endswith("DocumentReference"):
+        return "document"
+    if name.endswith(("CollectionReference", "Query", "CollectionGroup")):
+        return "query"
+    if name.endswith("WriteBatch"):
+        return "batch"
+    if name.endswith("DocumentSnapshot"):
+        return "snapshot"
+    if name.endswith("Blob"):
+        return "blob"
+    return None
+
+def _wrap(obj: Any) -> Any:
+    kind = _kind_of(obj)
+    return _Traced(obj, kind) if kind else obj
+
+def _unwrap(value: Any) -> Any:
+    if isinstance(value, _Traced):
+        return value._target
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _unwrap(v) for k, v in value.items()}
+    return value
+
+def _exists(snapshot: Any) -> bool:
+    return bool(getattr(snapshot, "exists", False))
+
+class _Traced:
+    __slots__ = ("_target", "_kind", "_pending")
+
+    def __init__(self, target: Any, kind: str):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_kind", kind)
+        # batch: [escritas, exclusões] enfileiradas até o commit
+        object.__setattr__(self, "_pending", [0, 0])
+
+    def __repr__(self) -> str:
+        return f"<traced {self._target!r}>"
+
+    def __eq__(self, other: Any) -> bool:
+        return self._target == _unwrap(other)
+
+    def __hash__(self) -> int:
+        return hash(self._target)
+
+    def __len__(self) -> int:
+        return len(self._target)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self._target, name, value)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return _wrap(attr)
+        handler = _HANDLERS.get((self._kind, name))
+        if handler is None:
+            queued = self._kind == "batch" and name in ("set", "create", "update", "delete")
+
+            def call(*args: Any, **kwargs: Any) -> Any:
+                result = attr(*_unwrap(args), **_unwrap(kwargs))
+                if queued:
+                    self._pending[1 if name == "delete" else 0] += 1
+                return _wrap(result)
+            return call
+
+        def traced(*args: Any, **kwargs: Any) -> Any:
+            return handler(self, attr, _unwrap(args), _unwrap(kwargs))
+        return traced
+
+def _timed(op: str, fn, args, kwargs, on_result, on_error) -> Any:
+    """Executa a chamada (síncrona ou corrotina) medindo o tempo; `on_result` contabiliza o resultado."""
+    started = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception:
+        on_error(op, time.perf_counter() - started)
+        raise
+    if inspect.isawaitable(result):
+        async def awaited():
+            try:
+                value = await result
+            except Exception:
+                on_error(op, time.perf_counter() - started)
+                raise
+            on_result(op, time.perf_counter() - started, value)
+            return _wrap(value)
+        return awaited()
+    on_result(op, time.perf_counter() - started, result)
+    return _wrap(result)
+
+def _firestore_error(op: str, seconds: float) -> None:
+    _record_firestore(op, seconds, error=True)
+
+def _storage_error(op: str, seconds: float) -> None:
+    _record_storage(op, seconds, error=True)
+
+def _iterate(op: str, fn, args, kwargs, billed_per_query: bool) -> Any:
+    """stream()/get_all(): contabiliza ao fim da iteração (gerador síncrono ou assíncrono)."""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+
+    def finish(count: int, existing: int, error: bool) -> None:
+        # query: mínimo de uma leitura mesmo sem resultados; get_all: uma por referência
+        reads = max(1, count) if billed_per_query else count
+        _record_firestore(op, time.perf_counter() - started, error=error, reads=reads, documents=existing)
+
+    if hasattr(result, "__anext__"):
+        async def agen():
+            count = existing = 0
+            error = False
+            try:
+                async for item in result:
+                    count += 1
+                    existing += _exists(item)
+                    yield _wrap(item)
+            except Exception:
+                error = True
+                raise
+            finally:
+                finish(count, existing, error)
+        return agen()
+
+    def gen():
+        count = existing = 0
+        error = False
+        try:
+            for item in result:
+                count += 1
+                existing += _exists(item)
+                yield _wrap(item)
+        except Exception:
+            error = True
+            raise
+        finally:
+            finish(count, existing, error)
+    return gen()
+
+def _document_get(self: _Traced, fn, args, kwargs) -> Any:
+    return _timed("document.get", fn, args, kwargs,
+                  lambda op, s, snap: _record_firestore(op, s, reads=1, documents=int(_exists(snap))),
+                  _firestore_error)
+
+def _document_write(name: str):
+    def handler(self: _Traced, fn, args, kwargs) -> Any:
+        counts = {"deletes": 1} if name == "delete" else {"writes": 1}
+        return _timed(f"document.{name}", fn, args, kwargs,
+                      lambda op, s, _r: _record_firestore(op, s, **counts), _firestore_error)
+    return handler
+
+def _query_stream(self: _Traced, fn, args, kwargs) -> Any:
+    return _iterate("query.stream", fn, args, kwargs, billed_per_query=True)
+
+def _query_get(self: _Traced, fn, args, kwargs) -> Any:
+    def on_result(op: str, seconds: float, docs: Any) -> None:
+        docs = list(docs)
+        _record_firestore(op, seconds, reads=max(1, len(docs)), documents=len(docs))
+    result = _timed("query.get", fn, args, kwargs, on_result, _firestore_error)
+    if inspect.isawaitable(result):
+        async def wrapped():
+            return [_wrap(d) for d in await result]
+        return wrapped()
+    return [_wrap(d) for d in result]
+
+def _get_all(self: _Traced, fn, args, kwargs) -> Any:
+    return _iterate("get_all", fn, args, kwargs, billed_per_query=False)
+
+def _batch_commit(self: _Traced, fn, args, kwargs) -> Any:
+    writes, deletes = self._pending
+    self._pending[0] = self._pending[1] = 0
+    return _timed("batch.commit", fn, args, kwargs,
+                  lambda op, s, _r: _record_firestore(op, s, writes=writes, deletes=deletes), _firestore_error)
+
+def _storage_call(name: str, uploaded_from=None):
+    def handler(self: _Traced, fn, args, kwargs) -> Any:
+        def on_result(op: str, seconds: float, result: Any) -> None:
+            uploaded = uploaded_from(args, kwargs) if uploaded_from else 0
+            downloaded = len(result) if isinstance(result, (bytes, bytearray)) else 0
+            _record_storage(op, seconds, uploaded=uploaded or 0, downloaded=downloaded)
+        return _timed(f"{self._kind}.{name}", fn, args, kwargs, on_result, _storage_error)
+    return handler
+
+def _upload_size(args, kwargs) -> int:
+    if kwargs.get("size") is not None:
+        return kwargs["size"]
+    return args[1] if len(args) > 1 and isinstance(args[1], int) else 0
+
+def _string_size(args, kwargs) -> int:
+    data = args[0] if args else kwargs.get("data", b"")
+    return len(data.encode("utf-8") if isinstance(data, str) else data)
+
+_HANDLERS = {
+    ("document", "get"): _document_get,
+    ("document", "set"): _document_write("set"),
+    ("document", "update"): _document_write("update"),
+    ("document", "create"): _document_write("create"),
+    ("document", "delete"): _document_write("delete"),
+    ("query", "stream"): _query_stream,
+    ("query", "get"): _query_get,
+    ("client", "get_all"): _get_all,
+    ("batch", "commit"): _batch_commit,
+    ("bucket", "get_blob"): _storage_call("get_blob"),
+    ("blob", "upload_from_file"): _storage_call("upload_from_file", _upload_size),
+    ("blob", "upload_from_string"): _storage_call("upload_from_string", _string_size),
+    ("blob", "download_as_bytes"): _storage_call("download_as_bytes"),
+    ("blob", "make_public"): _storage_call("make_public"),
+    ("blob", "patch"): _storage_call("patch"),
+    ("blob", "delete"): _storage_call("delete"),
+    ("blob", "exists"): _storage_call("exists"),
+}
+
+def instrument_client(client: Any) -> Any:
+    """Embrulha um cliente do Firestore (síncrono ou assíncrono, real ou em memória)."""
+    return _Traced(client, "client") if INSTRUMENTATION_ENABLED else client
+
+def instrument_bucket(bucket: Any) -> Any:
+    return _Traced(bucket, "bucket") if INSTRUMENTATION_ENABLED else bucket
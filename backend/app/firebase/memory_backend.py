@@ -0,0 +1,867 @@
+"""
+Firestore e Storage em memória, para benchmarks e desenvolvimento offline
+(FIRESTORE_BACKEND=memory). Implementa o subconjunto da API do firebase_admin
+usado pelo app, nos clientes síncrono e assíncrono:
+
+- documentos: get/set (com merge)/update (field paths)/create/delete;
+- queries: where (==, !=, <, <=, >, >=, in, not-in, array_contains, array_contains_any),
+  order_by (inclusive `__name__`), limit, start_at/start_after/end_at/end_before, select;
+- subcoleções, collection_group, get_all, WriteBatch (máx. 500 escritas, atômico);
+- SERVER_TIMESTAMP, DELETE_FIELD, Increment, ArrayUnion/ArrayRemove, Maximum/Minimum;
+- on_snapshot (entrega numa thread própria, como o listener real).
+
+Cada chamada (RPC) pode sofrer uma latência artificial (`latency_ms`) e é
+contabilizada em `MemoryStore.stats()` (chamadas, leituras, escritas, exclusões),
+com as mesmas regras de cobrança do Firestore (query vazia conta uma leitura).
+"""
+import time
+import queue
+import random
+import string
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from functools import cmp_to_key
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote
+
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.api_core.exceptions import AlreadyExists, InvalidArgument, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_WRITES = 500
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+_AUTO_ID_CHARS = string.ascii_letters + string.digits
+_INEQUALITY_OPS = {"<", "<=", ">", ">=", "!=", "not-in"}
+
+def _auto_id() -> str:
+    return "".join(random.choice(_AUTO_ID_CHARS) for _ in range(20))
+
+def _split_path(path: str) -> Tuple[str, ...]:
+    return tuple(p for p in path.split("/") if p)
+
+# ---------------------------------------------------------------------------
+# valores: ordenação e igualdade com as regras do Firestore
+# ---------------------------------------------------------------------------
+
+def _order_key(value: Any) -> Tuple:
+    """Chave de ordenação entre tipos: null < bool < número < timestamp < string < bytes < referência < array < map."""
+    if value is None:
+        return (0,)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, bytes):
+        return (5, value)
+    if isinstance(value, MemoryDocumentReference):
+        return (6, value._path)
+    if isinstance(value, (list, tuple)):
+        return (8, tuple(_order_key(v) for v in value))
+    if isinstance(value, dict):
+        return (9, tuple((k, _order_key(v)) for k, v in sorted(value.items())))
+    return (10, repr(value))
+
+def _get_field(data: Dict[str, Any], field_path: str) -> Tuple[bool, Any]:
+    current: Any = data
+    for part in field_path.split("."):
+        if not isinstance(current, dict) or part not in current:
+            return False, None
+        current = current[part]
+    return True, current
+
+def _matches_filter(found: bool, value: Any, op: str, target: Any) -> bool:
+    if not found:
+        return False
+    key = _order_key(value)
+    if op == "==":
+        return key == _order_key(target)
+    if op == "!=":
+        return value is not None and key != _order_key(target)
+    if op == "in":
+        return any(key == _order_key(t) for t in target)
+    if op == "not-in":
+        return value is not None and all(key != _order_key(t) for t in target)
+    if op == "array_contains":
+        return isinstance(value, list) and any(_order_key(v) == _order_key(target) for v in value)
+    if op == "array_contains_any":
+        return isinstance(value, list) and any(_order_key(v) == _order_key(t) for v in value for t in target)
+    target_key = _order_key(target)
+    # comparações só entre valores do mesmo tipo
+    if key[0] != target_key[0]:
+        return False
+    if op == "<":
+        return key < target_key
+    if op == "<=":
+        return key <= target_key
+    if op == ">":
+        return key > target_key
+    if op == ">=":
+        return key >= target_key
+    raise ValueError(f"Operador não suportado: {op}")
+
+# ---------------------------------------------------------------------------
+# escrita: transforms e merge
+# ---------------------------------------------------------------------------
+
+def _clone(value: Any) -> Any:
+    """Cópia profunda de maps/arrays; os demais valores do Firestore são imutáveis."""
+    if isinstance(value, dict):
+        return {k: _clone(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_clone(v) for v in value]
+    return value
+
+def _transform(value: Any, current: Any, commit_time: datetime) -> Any:
+    if value is transforms.SERVER_TIMESTAMP:
+        return commit_time
+    if isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        return base + value.value
+    if isinstance(value, transforms.Maximum):
+        return value.value if not isinstance(current, (int, float)) else max(current, value.value)
+    if isinstance(value, transforms.Minimum):
+        return value.value if not isinstance(current, (int, float)) else min(current, value.value)
+    if isinstance(value, transforms.ArrayUnion):
+        base = list(current) if isinstance(current, list) else []
+        return base + [v for v in value.values if v not in base]
+    if isinstance(value, transforms.ArrayRemove):
+        return [v for v in (current if isinstance(current, list) else []) if v not in value.values]
+    return _clone(value)
+
+def _write_map(target: Dict[str, Any], data: Dict[str, Any], merge: bool, commit_time: datetime) -> None:
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            if not merge:
+                raise ValueError("DELETE_FIELD só pode ser usado em set(merge=True) ou update()")
+            target.pop(key, None)
+        elif isinstance(value, dict):
+            child = target.get(key) if merge and isinstance(target.get(key), dict) else {}
+            _write_map(child, value, merge, commit_time)
+            target[key] = child
+        else:
+            target[key] = _transform(value, target.get(key), commit_time)
+
+def _write_field_paths(target: Dict[str, Any], data: Dict[str, Any], commit_time: datetime) -> None:
+    """Semântica de update(): chaves são field paths ("a.b") e maps substituem o valor inteiro."""
+    for field_path, value in data.items():
+        parts = field_path.split(".")
+        parent = target
+        for part in parts[:-1]:
+            if not isinstance(parent.get(part), dict):
+                parent[part] = {}
+            parent = parent[part]
+        leaf = parts[-1]
+        if value is transforms.DELETE_FIELD:
+            parent.pop(leaf, None)
+        elif isinstance(value, dict):
+            child: Dict[str, Any] = {}
+            _write_map(child, value, False, commit_time)
+            parent[leaf] = child
+        else:
+            parent[leaf] = _transform(value, parent.get(leaf), commit_time)
+
+# ---------------------------------------------------------------------------
+# armazenamento
+# ---------------------------------------------------------------------------
+
+class _StoredDoc:
+    __slots__ = ("data", "create_time", "update_time")
+
+    def __init__(self, data: Dict[str, Any], create_time: datetime, update_time: datetime):
+        self.data = data
+        self.create_time = create_time
+        self.update_time = update_time
+
+class WriteResult:
+    def __init__(self, update_time: datetime):
+        self.update_time = update_time
+
+class _Watch:
+    def __init__(self, store: "MemoryStore", query: "MemoryQuery", callback: Callable):
+        self._store = store
+        self.query = query
+        self.callback = callback
+        self.active = True
+
+    def unsubscribe(self) -> None:
+        self.active = False
+        self._store._remove_watch(self)
+
+class MemoryStore:
+    """Dados de todas as coleções (por caminho) e contadores de operações. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._collections: Dict[Tuple[str, ...], Dict[str, _StoredDoc]] = {}
+        self._last_commit: Optional[datetime] = None
+        self._stats = {"calls": 0, "reads": 0, "writes": 0, "deletes": 0}
+        self._watches: List[_Watch] = []
+        self._events: Optional[queue.Queue] = None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for key in self._stats:
+                self._stats[key] = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._collections.clear()
+
+    def _count(self, **deltas: int) -> None:
+        with self._lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    def _commit_time(self) -> DatetimeWithNanoseconds:
+        # horário do servidor, estritamente crescente entre commits (como no Firestore)
+        now = datetime.now(timezone.utc)
+        if self._last_commit is not None and now <= self._last_commit:
+            now = self._last_commit + timedelta(microseconds=1)
+        self._last_commit = now
+        return DatetimeWithNanoseconds(now.year, now.month, now.day, now.hour, now.minute,
+                                       now.second, now.microsecond, tzinfo=timezone.utc)
+
+    def read(self, path: Tuple[str, ...]) -> Optional[_StoredDoc]:
+        with self._lock:
+            self._stats["reads"] += 1
+            # sem cópia: um documento gravado nunca é alterado (cada commit cria outro)
+            return self._collections.get(path[:-1], {}).get(path[-1])
+
+    def documents(self, collection_path: Tuple[str, ...], group: bool) -> List[Tuple[Tuple[str, ...], _StoredDoc]]:
+        """Documentos candidatos de uma query (sem contar leituras). Chamar com o lock."""
+        if group:
+            collections = [(p, docs) for p, docs in self._collections.items() if p[-1] == collection_path[-1]]
+        else:
+            collections = [(collection_path, self._collections.get(collection_path, {}))]
+        return [(p + (doc_id,), stored) for p, docs in collections for doc_id, stored in docs.items()]
+
+    def commit(self, writes: List[Tuple[str, Tuple[str, ...], Optional[Dict[str, Any]], bool]]) -> List[WriteResult]:
+        """Aplica as escritas de forma atômica: ou todas, ou nenhuma."""
+        if len(writes) > MAX_BATCH_WRITES:
+            raise InvalidArgument(f"maximum {MAX_BATCH_WRITES} writes allowed per request")
+        with self._lock:
+            commit_time = self._commit_time()
+            staged: Dict[Tuple[str, ...], Optional[_StoredDoc]] = {}
+            before: Dict[Tuple[str, ...], Optional[_StoredDoc]] = {}
+            for kind, path, data, merge in writes:
+                if path not in staged:
+                    before[path] = self._collections.get(path[:-1], {}).get(path[-1])
+                    staged[path] = before[path]
+                current = staged[path]
+                if kind == "delete":
+                    staged[path] = None
+                    continue
+                if kind == "create" and current is not None:
+                    raise AlreadyExists(f"Document already exists: {'/'.join(path)}")
+                if kind == "update" and current is None:
+                    raise NotFound(f"No document to update: {'/'.join(path)}")
+                if kind == "update":
+                    new_data = _clone(current.data)
+                    _write_field_paths(new_data, data or {}, commit_time)
+                else:
+                    new_data = _clone(current.data) if merge and current is not None else {}
+                    _write_map(new_data, data or {}, bool(merge), commit_time)
+                create_time = current.create_time if current is not None else commit_time
+                staged[path] = _StoredDoc(new_data, create_time, commit_time)
+
+            for path, stored in staged.items():
+                docs = self._collections.setdefault(path[:-1], {})
+                if stored is None:
+                    docs.pop(path[-1], None)
+                else:
+                    docs[path[-1]] = stored
+            self._stats["writes"] += sum(1 for w in writes if w[0] != "delete")
+            self._stats["deletes"] += sum(1 for w in writes if w[0] == "delete")
+            if self._watches:
+                self._notify(before, staged, commit_time)
+        return [WriteResult(commit_time) for _ in writes]
+
+    # -- listeners -----------------------------------------------------------
+
+    def add_watch(self, query: "MemoryQuery", callback: Callable) -> _Watch:
+        watch = _Watch(self, query, callback)
+        with self._lock:
+            if self._events is None:
+                self._events = queue.Queue()
+                threading.Thread(target=self._dispatch, name="memory-firestore-watch", daemon=True).start()
+            self._watches.append(watch)
+            current = [query._snapshot(path, stored) for path, stored in query._candidates()]
+            read_time = self._commit_time()
+        changes = [DocumentChange(ChangeType.ADDED, snap, -1, i) for i, snap in enumerate(current)]
+        self._events.put((watch, current, changes, read_time))
+        return watch
+
+    def _remove_watch(self, watch: _Watch) -> None:
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _notify(self, before: Dict, after: Dict, commit_time: datetime) -> None:
+        for watch in self._watches:
+            query = watch.query
+            changes = []
+            for path, new in after.items():
+                old = before.get(path)
+                was = old is not None and query._matches(path, old.data)
+                now = new is not None and query._matches(path, new.data)
+                if now:
+                    change_type = ChangeType.MODIFIED if was else ChangeType.ADDED
+                    changes.append(DocumentChange(change_type, query._snapshot(path, new), -1, -1))
+                elif was:
+                    changes.append(DocumentChange(ChangeType.REMOVED, query._snapshot(path, old), -1, -1))
+            if changes:
+                docs = [query._snapshot(path, stored) for path, stored in query._candidates()]
+                self._events.put((watch, docs, changes, commit_time))
+
+    def _dispatch(self) -> None:
+        while True:
+            watch, docs, changes, read_time = self._events.get()
+            if not watch.active:
+                continue
+            try:
+                watch.callback(docs, changes, read_time)
+            except Exception as e:
+                logger.warning("Falha no callback de on_snapshot (memória): %s", e)
+
+# ---------------------------------------------------------------------------
+# snapshots, referências e queries
+# ---------------------------------------------------------------------------
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference: "MemoryDocumentReference", data: Optional[Dict[str, Any]],
+                 read_time: datetime, create_time: Optional[datetime] = None, update_time: Optional[datetime] = None):
+        self._reference = reference
+        self._data = data
+        self.read_time = read_time
+        self.create_time = create_time
+        self.update_time = update_time
+
+    @property
+    def id(self) -> str:
+        return self._reference.id
+
+    @property
+    def reference(self) -> "MemoryDocumentReference":
+        return self._reference
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return _clone(self._data) if self._data is not None else None
+
+    def get(self, field_path: str) -> Any:
+        found, value = _get_field(self._data or {}, field_path)
+        if not found:
+            raise KeyError(field_path)
+        return _clone(value)
+
+def _project(data: Dict[str, Any], field_paths: Optional[List[str]]) -> Dict[str, Any]:
+    if field_paths is None:
+        return data
+    out: Dict[str, Any] = {}
+    for field_path in field_paths:
+        found, value = _get_field(data, field_path)
+        if found:
+            _write_field_paths(out, {field_path: value}, datetime.now(timezone.utc))
+    return out
+
+class MemoryDocumentReference:
+    def __init__(self, client: "MemoryClient", path: Tuple[str, ...]):
+        if len(path) % 2:
+            raise ValueError("Caminho de documento deve ter um número par de segmentos")
+        self._client = client
+        self._path = path
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, MemoryDocumentReference) and other._path == self._path
+
+    def __hash__(self) -> int:
+        return hash(self._path)
+
+    @property
+    def id(self) -> str:
+        return self._path[-1]
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._path)
+
+    @property
+    def parent(self) -> "MemoryCollectionReference":
+        return self._client._collection(self._path[:-1])
+
+    def collection(self, collection_id: str) -> "MemoryCollectionReference":
+        return self._client._collection(self._path + _split_path(collection_id))
+
+    def _read(self, field_paths: Optional[List[str]] = None) -> MemoryDocumentSnapshot:
+        store = self._client._store
+        stored = store.read(self._path)
+        with store._lock:
+            read_time = store._last_commit or datetime.now(timezone.utc)
+        if stored is None:
+            return MemoryDocumentSnapshot(self, None, read_time)
+        return MemoryDocumentSnapshot(self, _project(stored.data, field_paths), read_time,
+                                      stored.create_time, stored.update_time)
+
+    def _write(self, kind: str, data: Optional[Dict[str, Any]] = None, merge: bool = False) -> WriteResult:
+        return self._client._store.commit([(kind, self._path, data, merge)])[0]
+
+    def get(self, field_paths: Optional[List[str]] = None, transaction: Any = None):
+        return self._client._call(lambda: self._read(field_paths))
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False):
+        if merge not in (True, False):
+            raise NotImplementedError("merge com lista de campos não é suportado no backend em memória")
+        return self._client._call(lambda: self._write("set", document_data, merge))
+
+    def create(self, document_data: Dict[str, Any]):
+        return self._client._call(lambda: self._write("create", document_data))
+
+    def update(self, field_updates: Dict[str, Any], option: Any = None):
+        return self._client._call(lambda: self._write("update", field_updates))
+
+    def delete(self, option: Any = None):
+        return self._client._call(lambda: self._write("delete").update_time)
+
+    def on_snapshot(self, callback: Callable):
+        query = self.parent.where("__name__", "==", self)
+        return self._client._store.add_watch(query, callback)
+
+class MemoryQuery:
+    ASCENDING = ASCENDING
+    DESCENDING = DESCENDING
+
+    def __init__(self, client: "MemoryClient", collection_path: Tuple[str, ...], all_descendants: bool = False,
+                 filters: Tuple = (), orders: Tuple = (), limit: Optional[int] = None,
+                 start: Optional[Tuple[Any, bool]] = None, end: Optional[Tuple[Any, bool]] = None,
+                 projection: Optional[List[str]] = None):
+        self._client = client
+        self._collection_path = collection_path
+        self._all_descendants = all_descendants
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._start = start
+        self._end = end
+        self._projection = projection
+
+    def _copy(self, **changes: Any) -> "MemoryQuery":
+        state = {
+            "all_descendants": self._all_descendants, "filters": self._filters, "orders": self._orders,
+            "limit": self._limit, "start": self._start, "end": self._end, "projection": self._projection,
+        }
+        state.update(changes)
+        return MemoryQuery(self._client, self._collection_path, **state)
+
+    # -- construção ------------------------------------------------------------
+
+    def where(self, field_path: Optional[str] = None, op_string: Optional[str] = None,
+              value: Any = None, *, filter: Any = None) -> "MemoryQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in ("==", "!=", "<", "<=", ">", ">=", "in", "not-in", "array_contains", "array_contains_any"):
+            raise ValueError(f"Operador não suportado: {op_string}")
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "MemoryQuery":
+        if direction not in (ASCENDING, DESCENDING):
+            raise ValueError(f"Direção inválida: {direction}")
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._copy(limit=count)
+
+    def select(self, field_paths: Iterable[str]) -> "MemoryQuery":
+        return self._copy(projection=list(field_paths))
+
+    def start_at(self, document_fields_or_snapshot: Any) -> "MemoryQuery":
+        return self._copy(start=(document_fields_or_snapshot, True))
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "MemoryQuery":
+        return self._copy(start=(document_fields_or_snapshot, False))
+
+    def end_before(self, document_fields_or_snapshot: Any) -> "MemoryQuery":
+        return self._copy(end=(document_fields_or_snapshot, False))
+
+    def end_at(self, document_fields_or_snapshot: Any) -> "MemoryQuery":
+        return self._copy(end=(document_fields_or_snapshot, True))
+
+    # -- execução --------------------------------------------------------------
+
+    def _effective_orders(self) -> List[Tuple[str, str]]:
+        orders = list(self._orders)
+        if not orders:
+            # desigualdade sem order_by explícito: ordena pelo campo da desigualdade
+            for field_path, op, _ in self._filters:
+                if op in _INEQUALITY_OPS and field_path not in [o[0] for o in orders]:
+                    orders.append((field_path, ASCENDING))
+        if "__name__" not in [o[0] for o in orders]:
+            orders.append(("__name__", orders[-1][1] if orders else ASCENDING))
+        return orders
+
+    def _value(self, path: Tuple[str, ...], data: Dict[str, Any], field_path: str) -> Tuple[bool, Any]:
+        if field_path == "__name__":
+            return True, self._client._document(path)
+        return _get_field(data, field_path)
+
+    def _matches(self, path: Tuple[str, ...], data: Dict[str, Any]) -> bool:
+        if self._all_descendants:
+            if path[-2] != self._collection_path[-1]:
+                return False
+        elif path[:-1] != self._collection_path:
+            return False
+        for field_path, op, target in self._filters:
+            found, value = self._value(path, data, field_path)
+            if field_path == "__name__" and isinstance(target, str):
+                target = self._cursor_name(target)
+            if not _matches_filter(found, value, op, target):
+                return False
+        return True
+
+    def _cursor_name(self, value: Any) -> Any:
+        if isinstance(value, str):
+            parts = _split_path(value)
+            return self._client._document(self._collection_path + parts if len(parts) == 1 else parts)
+        return value
+
+    def _cursor_values(self, cursor: Any, orders: List[Tuple[str, str]]) -> List[Any]:
+        if isinstance(cursor, MemoryDocumentSnapshot):
+            fields = cursor.to_dict() or {}
+            fields["__name__"] = cursor.reference
+            cursor = fields
+        if isinstance(cursor, dict):
+            values = []
+            for field_path, _ in orders[:len(cursor)]:
+                if field_path in cursor:
+                    values.append(cursor[field_path])
+                else:
+                    found, value = _get_field(cursor, field_path)
+                    if not found:
+                        raise ValueError(f"Cursor sem o campo do order_by: {field_path}")
+                    values.append(value)
+            cursor = values
+        values = list(cursor)
+        if len(values) > len(orders):
+            raise ValueError("Cursor com mais valores que o order_by")
+        return [self._cursor_name(v) if orders[i][0] == "__name__" else v for i, v in enumerate(values)]
+
+    @staticmethod
+    def _compare(a: List[Any], b: List[Any], orders: List[Tuple[str, str]]) -> int:
+        for va, vb, (_, direction) in zip(a, b, orders):
+            ka, kb = _order_key(va), _order_key(vb)
+            if ka != kb:
+                result = -1 if ka < kb else 1
+                return -result if direction == DESCENDING else result
+        return 0
+
+    def _candidates(self) -> List[Tuple[Tuple[str, ...], _StoredDoc]]:
+        store = self._client._store
+        with store._lock:
+            return [(path, stored) for path, stored in store.documents(self._collection_path, self._all_descendants)
+                    if self._matches(path, stored.data)]
+
+    def _snapshot(self, path: Tuple[str, ...], stored: _StoredDoc) -> MemoryDocumentSnapshot:
+        return MemoryDocumentSnapshot(self._client._document(path), _project(stored.data, self._projection),
+                                      stored.update_time, stored.create_time, stored.update_time)
+
+    def _fetch(self) -> List[MemoryDocumentSnapshot]:
+        orders = self._effective_orders()
+        rows = []
+        for path, stored in self._candidates():
+            values = []
+            for field_path, _ in orders:
+                found, value = self._value(path, stored.data, field_path)
+                if not found:
+                    break
+                values.append(value)
+            else:
+                rows.append((values, path, stored))
+        rows.sort(key=cmp_to_key(lambda x, y: self._compare(x[0], y[0], orders)))
+
+        if self._start is not None:
+            cursor, inclusive = self._start
+            bound = self._cursor_values(cursor, orders)
+            rows = [r for r in rows if (c := self._compare(r[0], bound, orders)) > 0 or (inclusive and c == 0)]
+        if self._end is not None:
+            cursor, inclusive = self._end
+            bound = self._cursor_values(cursor, orders)
+            rows = [r for r in rows if (c := self._compare(r[0], bound, orders)) < 0 or (inclusive and c == 0)]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+
+        # cobrança do Firestore: um documento lido por resultado, mínimo de uma leitura por query
+        self._client._store._count(reads=max(1, len(rows)))
+        return [self._snapshot(path, stored) for _, path, stored in rows]
+
+    def stream(self, transaction: Any = None):
+        return self._client._stream(self._fetch)
+
+    def get(self, transaction: Any = None):
+        return self._client._call(self._fetch)
+
+    def on_snapshot(self, callback: Callable):
+        return self._client._store.add_watch(self, callback)
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client: "MemoryClient", path: Tuple[str, ...]):
+        if len(path) % 2 == 0:
+            raise ValueError("Caminho de coleção deve ter um número ímpar de segmentos")
+        super().__init__(client, path)
+
+    @property
+    def id(self) -> str:
+        return self._collection_path[-1]
+
+    @property
+    def parent(self) -> Optional[MemoryDocumentReference]:
+        if len(self._collection_path) == 1:
+            return None
+        return self._client._document(self._collection_path[:-1])
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        return self._client._document(self._collection_path + _split_path(document_id or _auto_id()))
+
+class MemoryWriteBatch:
+    def __init__(self, client: "MemoryClient"):
+        self._client = client
+        self._writes: List[Tuple[str, Tuple[str, ...], Optional[Dict[str, Any]], bool]] = []
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def set(self, reference: MemoryDocumentReference, document_data: Dict[str, Any], merge: bool = False) -> None:
+        if merge not in (True, False):
+            raise NotImplementedError("merge com lista de campos não é suportado no backend em memória")
+        self._writes.append(("set", reference._path, _clone(document_data), merge))
+
+    def create(self, reference: MemoryDocumentReference, document_data: Dict[str, Any]) -> None:
+        self._writes.append(("create", reference._path, _clone(document_data), False))
+
+    def update(self, reference: MemoryDocumentReference, field_updates: Dict[str, Any], option: Any = None) -> None:
+        self._writes.append(("update", reference._path, _clone(field_updates), False))
+
+    def delete(self, reference: MemoryDocumentReference, option: Any = None) -> None:
+        self._writes.append(("delete", reference._path, None, False))
+
+    def commit(self, **_kwargs: Any):
+        writes, self._writes = self._writes, []
+        return self._client._call(lambda: self._client._store.commit(writes))
+
+# ---------------------------------------------------------------------------
+# clientes
+# ---------------------------------------------------------------------------
+
+class MemoryClient:
+    """Equivalente em memória do firestore.Client (síncrono)."""
+
+    is_async = False
+
+    def __init__(self, store: Optional[MemoryStore] = None, latency_ms: float = 0.0):
+        self.store = store or MemoryStore()
+        self.latency_ms = latency_ms
+
+    @property
+    def _store(self) -> MemoryStore:
+        return self.store
+
+    def _collection(self, path: Tuple[str, ...]) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, path)
+
+    def _document(self, path: Tuple[str, ...]) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self, path)
+
+    def _pause(self) -> None:
+        self.store._count(calls=1)
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+
+    def _call(self, fn: Callable[[], Any]) -> Any:
+        self._pause()
+        return fn()
+
+    def _stream(self, fetch: Callable[[], List[Any]]):
+        self._pause()
+        return iter(fetch())
+
+    def collection(self, *collection_path: str) -> MemoryCollectionReference:
+        return self._collection(_split_path("/".join(collection_path)))
+
+    def document(self, *document_path: str) -> MemoryDocumentReference:
+        return self._document(_split_path("/".join(document_path)))
+
+    def collection_group(self, collection_id: str) -> MemoryQuery:
+        if "/" in collection_id:
+            raise ValueError("collection_group recebe só o id da coleção, sem '/'")
+        return MemoryQuery(self, (collection_id,), all_descendants=True)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def _get_all(self, references: Iterable[MemoryDocumentReference],
+                 field_paths: Optional[List[str]]) -> List[MemoryDocumentSnapshot]:
+        return [ref._read(field_paths) for ref in dict.fromkeys(references)]
+
+    def get_all(self, references: Iterable[MemoryDocumentReference],
+                field_paths: Optional[List[str]] = None, transaction: Any = None):
+        references = list(references)
+        return self._stream(lambda: self._get_all(references, field_paths))
+
+class AsyncMemoryClient(MemoryClient):
+    """Equivalente em memória do firestore.AsyncClient: mesmas operações, aguardáveis."""
+
+    is_async = True
+
+    async def _pause_async(self) -> None:
+        self.store._count(calls=1)
+        # sempre cede o event loop, como uma chamada de rede de verdade
+        await asyncio.sleep(self.latency_ms / 1000 if self.latency_ms > 0 else 0)
+
+    async def _call(self, fn: Callable[[], Any]) -> Any:
+        await self._pause_async()
+        return fn()
+
+    async def _stream(self, fetch: Callable[[], List[Any]]):
+        await self._pause_async()
+        for item in fetch():
+            yield item
+
+# ---------------------------------------------------------------------------
+# Storage
+# ---------------------------------------------------------------------------
+
+class MemoryBlob:
+    def __init__(self, bucket: "MemoryBucket", name: str, chunk_size: Optional[int] = None):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = chunk_size
+        self.metadata: Optional[Dict[str, str]] = None
+        self.content_type: Optional[str] = None
+        self.size: Optional[int] = None
+
+    @property
+    def public_url(self) -> str:
+        return f"https://storage.googleapis.com/{self.bucket.name}/{quote(self.name)}"
+
+    def _save(self, data: bytes, content_type: Optional[str]) -> None:
+        self.content_type = content_type or "application/octet-stream"
+        self.size = len(data)
+        self.bucket._put(self.name, data, self.content_type, self.metadata)
+
+    def upload_from_file(self, file_obj: Any, size: Optional[int] = None, content_type: Optional[str] = None, **_kwargs: Any) -> None:
+        data = file_obj.read(size) if size is not None else file_obj.read()
+        self._save(data, content_type)
+
+    def upload_from_string(self, data: Any, content_type: str = "text/plain", **_kwargs: Any) -> None:
+        self._save(data.encode("utf-8") if isinstance(data, str) else bytes(data), content_type)
+
+    def download_as_bytes(self, **_kwargs: Any) -> bytes:
+        return self.bucket._get(self.name)[0]
+
+    def exists(self, **_kwargs: Any) -> bool:
+        return self.bucket._has(self.name)
+
+    def make_public(self, **_kwargs: Any) -> None:
+        self.bucket._touch(self.name)
+
+    def patch(self, **_kwargs: Any) -> None:
+        self.bucket._set_metadata(self.name, self.metadata)
+
+    def delete(self, **_kwargs: Any) -> None:
+        self.bucket._delete(self.name)
+
+    def generate_signed_url(self, expiration: Any = None, method: str = "GET", **_kwargs: Any) -> str:
+        return f"{self.public_url}?X-Memory-Signed={method}"
+
+class MemoryBucket:
+    """Bucket do Storage em memória (objetos, tipo e metadados)."""
+
+    def __init__(self, name: str = "memory-bucket", latency_ms: float = 0.0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self._lock = threading.Lock()
+        self._objects: Dict[str, Dict[str, Any]] = {}
+
+    def _op(self) -> None:
+        if self.latency_ms > 0:
+            time.sleep(self.latency_ms / 1000)
+
+    def _put(self, name: str, data: bytes, content_type: str, metadata: Optional[Dict[str, str]]) -> None:
+        self._op()
+        with self._lock:
+            self._objects[name] = {"data": data, "content_type": content_type, "metadata": dict(metadata or {})}
+
+    def _get(self, name: str) -> Tuple[bytes, Dict[str, Any]]:
+        self._op()
+        with self._lock:
+            obj = self._objects.get(name)
+        if obj is None:
+            raise NotFound(f"No such object: {self.name}/{name}")
+        return obj["data"], obj
+
+    def _has(self, name: str) -> bool:
+        with self._lock:
+            return name in self._objects
+
+    def _touch(self, name: str) -> None:
+        self._op()
+        if not self._has(name):
+            raise NotFound(f"No such object: {self.name}/{name}")
+
+    def _set_metadata(self, name: str, metadata: Optional[Dict[str, str]]) -> None:
+        self._op()
+        with self._lock:
+            if name not in self._objects:
+                raise NotFound(f"No such object: {self.name}/{name}")
+            self._objects[name]["metadata"] = dict(metadata or {})
+
+    def _delete(self, name: str) -> None:
+        self._op()
+        with self._lock:
+            if self._objects.pop(name, None) is None:
+                raise NotFound(f"No such object: {self.name}/{name}")
+
+    def blob(self, blob_name: str, chunk_size: Optional[int] = None, **_kwargs: Any) -> MemoryBlob:
+        return MemoryBlob(self, blob_name, chunk_size)
+
+    def get_blob(self, blob_name: str, **_kwargs: Any) -> Optional[MemoryBlob]:
+        self._op()
+        with self._lock:
+            obj = self._objects.get(blob_name)
+            if obj is None:
+                return None
+            blob = MemoryBlob(self, blob_name)
+            blob.content_type = obj["content_type"]
+            blob.size = len(obj["data"])
+            blob.metadata = dict(obj["metadata"]) or None
+        return blob
+
+    def list_blobs(self, prefix: Optional[str] = None, **_kwargs: Any) -> List[MemoryBlob]:
+        with self._lock:
+            names = sorted(n for n in self._objects if not prefix or n.startswith(prefix))
+        return [self.get_blob(n) for n in names]
+
+def create_memory_backend(latency_ms: float = 0.0, bucket_name: str = "memory-bucket"
+                          ) -> Tuple[MemoryClient, AsyncMemoryClient, MemoryBucket]:
+    """Clientes síncrono e assíncrono sobre o mesmo MemoryStore, mais um bucket em memória."""
+    store = MemoryStore()
+    return (MemoryClient(store, latency_ms), AsyncMemoryClient(store, latency_ms),
+            MemoryBucket(bucket_name, latency_ms))
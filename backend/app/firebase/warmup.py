@@ -0,0 +1,119 @@
+"""
+Warm-up dos clientes do Firebase no startup e estado de prontidão (/readyz).
+
+O lifespan chama `warm_up()` antes de aceitar tráfego: cria os clientes do registro
+(credenciais, app do Firebase), abre os canais gRPC do Firestore com uma leitura
+de um documento qualquer, abre a sessão HTTP do Storage e baixa os certificados
+usados na verificação dos ID tokens. Assim as primeiras requisições depois de um
+scale-out não pagam (nem estouram o timeout com) esse custo.
+
+Erro de configuração (credenciais) derruba o startup; falhas de rede só deixam o
+processo "não pronto" e o /readyz tenta de novo.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.firebase.firestore_client import FIRESTORE_BACKEND, get_db, get_async_db, get_bucket, get_firebase_app
+
+logger = logging.getLogger(__name__)
+
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1").lower() not in ("0", "false", "no")
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "15"))
+# intervalo mínimo entre novas tentativas disparadas pelo /readyz
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+# documento lido só para abrir o canal (não precisa existir; custa uma leitura)
+WARMUP_COLLECTION = "_warmup"
+
+# passos sem os quais o processo não atende: sem eles a requisição iria falhar
+_CRITICAL_STEPS = ("clients", "firestore")
+
+_state: Dict[str, Any] = {"ready": False, "ready_at": None, "attempts": 0, "last_attempt": 0.0, "steps": {}}
+_lock = asyncio.Lock()
+
+def _create_clients() -> None:
+    get_db(), get_async_db(), get_bucket()
+
+async def _ping_firestore() -> None:
+    # canal do cliente assíncrono, no event loop que vai atender as requisições
+    await get_async_db().collection(WARMUP_COLLECTION).document("ping").get()
+
+def _ping_firestore_sync() -> None:
+    # canal do cliente síncrono (listeners on_snapshot, scripts)
+    get_db().collection(WARMUP_COLLECTION).document("ping").get()
+
+def _ping_storage() -> None:
+    get_bucket().get_blob(f"{WARMUP_COLLECTION}/ping")
+
+def _prefetch_token_certs() -> None:
+    if FIRESTORE_BACKEND != "firebase":
+        return
+    from firebase_admin import auth, _token_gen
+    # a sessão com cache HTTP do verificador guarda os certificados até o max-age
+    verifier = auth._get_client(get_firebase_app())._token_verifier
+    verifier.request(url=_token_gen.ID_TOKEN_CERT_URI, method="GET")
+
+async def _run_step(name: str, fn: Callable, is_async: bool = False) -> bool:
+    started = time.perf_counter()
+    try:
+        if is_async:
+            await fn()
+        else:
+            await run_in_threadpool(fn)
+    except Exception as e:
+        _state["steps"][name] = {"ok": False, "error": str(e)}
+        logger.warning("Warm-up '%s' falhou: %s", name, e)
+        return False
+    _state["steps"][name] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 1)}
+    return True
+
+async def _warm_up() -> None:
+    # credenciais inválidas/ausentes: erro de configuração, sobe a exceção
+    started = time.perf_counter()
+    await run_in_threadpool(_create_clients)
+    _state["steps"]["clients"] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 1)}
+    await asyncio.gather(
+        _run_step("firestore", _ping_firestore, is_async=True),
+        _run_step("firestore_sync", _ping_firestore_sync),
+        _run_step("storage", _ping_storage),
+        _run_step("auth_certs", _prefetch_token_certs),
+    )
+
+async def warm_up() -> bool:
+    """Aquece os clientes; retorna se o processo está pronto para atender."""
+    async with _lock:
+        if _state["ready"]:
+            return True
+        _state["attempts"] += 1
+        _state["last_attempt"] = time.monotonic()
+        _state["steps"] = {}
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(_warm_up(), WARMUP_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning("Warm-up excedeu %.0fs", WARMUP_TIMEOUT_SECONDS)
+        ready = all(_state["steps"].get(s, {}).get("ok") for s in _CRITICAL_STEPS)
+        _state["ready"] = ready
+        if ready:
+            _state["ready_at"] = time.time()
+            logger.info("Warm-up concluído em %.0f ms", (time.perf_counter() - started) * 1000)
+        return ready
+
+async def readiness() -> Dict[str, Any]:
+    """Estado para o /readyz; se ainda não pronto, tenta o warm-up de novo (com intervalo mínimo)."""
+    if not _state["ready"] and time.monotonic() - _state["last_attempt"] >= WARMUP_RETRY_SECONDS:
+        try:
+            await warm_up()
+        except Exception as e:
+            _state["steps"]["clients"] = {"ok": False, "error": str(e)}
+    return {
+        "ready": _state["ready"],
+        "backend": FIRESTORE_BACKEND,
+        "ready_at": _state["ready_at"],
+        "attempts": _state["attempts"],
+        "steps": dict(_state["steps"]),
+    }
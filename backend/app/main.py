@@ -1,8 +1,19 @@
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from app.api.router import api_router
+from app.realtime.chat_hub import snapshot_bridge, SNAPSHOT_BRIDGE_ENABLED
+from app.services import image_service
+from app.cache.shared_cache import invalidation_bus
+from app.repository.chat_repository import chat_meta_writes
+from app.firebase.warmup import warm_up, STARTUP_WARMUP
+from app.services.helper_search import helper_index, HELPER_INDEX_LISTENER
+from app.services.archive_service import message_archiver
+from app.services.message_search import message_search, MESSAGE_SEARCH_ENABLED
+from app.monitoring.middleware import RequestMetricsMiddleware
+from app.monitoring.profiling import loop_monitor, SlowRequestProfiler, LOOP_LAG_MONITOR, PROFILING_ENABLED
 import logging
 from pathlib import Path
 
@@ -11,7 +22,37 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
-app = FastAPI(debug=True)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # clientes do Firebase criados e aquecidos antes do primeiro request (nada disso roda no import)
+    if STARTUP_WARMUP:
+        await warm_up()
+    # antes dos demais: o warm-up já passou, o que travar o loop daqui em diante é medido
+    if LOOP_LAG_MONITOR or PROFILING_ENABLED:
+        loop_monitor.start()
+    invalidation_bus.start()
+    chat_meta_writes.start()
+    if SNAPSHOT_BRIDGE_ENABLED:
+        snapshot_bridge.start()
+    if HELPER_INDEX_LISTENER:
+        helper_index.start()
+    message_archiver.start()
+    if MESSAGE_SEARCH_ENABLED:
+        message_search.start()
+    try:
+        yield
+    finally:
+        # metadados de chat ainda na fila são gravados antes de desligar
+        await message_archiver.stop()
+        await message_search.stop()
+        await chat_meta_writes.stop()
+        snapshot_bridge.stop()
+        helper_index.stop()
+        invalidation_bus.stop()
+        image_service.shutdown_pool()
+        await loop_monitor.stop()
+
+app = FastAPI(debug=True, lifespan=lifespan)
 
 uploads_dir = Path(__file__).parent / "uploads"
 uploads_dir.mkdir(exist_ok=True)  # cria se não existir
@@ -31,7 +72,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
+# perfis por amostragem das requisições lentas (por dentro da contabilidade, que ela usa)
+if PROFILING_ENABLED:
+    app.add_middleware(SlowRequestProfiler)
+# contabilidade de Firestore/Storage por requisição (headers, log e /metrics)
+app.add_middleware(RequestMetricsMiddleware)
 
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
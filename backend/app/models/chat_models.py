@@ -1,15 +1,24 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pydantic import BaseModel, Field
 
 class CreateChatRequest(BaseModel):
     other_user_id: str
 
+class ParticipantProfile(BaseModel):
+    name: Optional[str] = None
+    avatarUrl: Optional[str] = None
+    avatar_thumbs: Optional[Dict[str, str]] = None
+
 class ChatMeta(BaseModel):
     id: str
     participants: List[str]
     last_message: Optional[str] = None
     last_sender: Optional[str] = None
     updated_at: Optional[int] = None
+    # mensagens não lidas pelo usuário que fez a requisição
+    unread_count: int = 0
+    # cópia de nome/avatar de cada participante: a lista de chats não precisa de /users/public
+    participant_profiles: Dict[str, ParticipantProfile] = {}
 
 class SendMessageResponse(BaseModel):
     message_id: str
@@ -24,4 +33,38 @@ class MessageDTO(BaseModel):
     file_url: Optional[str] = None
     file_type: Optional[str] = None
     file_name: Optional[str] = None
+    file_thumbs: Optional[Dict[str, str]] = None
     timestamp: int
+
+class MessageSearchHit(BaseModel):
+    chat_id: str
+    message_id: str
+    sender_id: str
+    timestamp: int
+    # trecho do texto (MESSAGE_SEARCH_SNIPPET_CHARS)
+    message: Optional[str] = None
+    file_name: Optional[str] = None
+
+class UploadUrlRequest(BaseModel):
+    file_name: str
+    content_type: Optional[str] = None
+    size: Optional[int] = Field(None, ge=0)
+
+class FinalizeMessageRequest(BaseModel):
+    receiver_id: str
+    object_path: str
+    file_name: Optional[str] = None
+    text: Optional[str] = None
+
+class ChatSyncEntry(BaseModel):
+    chat: ChatMeta
+    messages: List[MessageDTO]
+    # há mais mensagens novas do que o limite por chat: continuar com /chat/messages?cursor=
+    messages_cursor: Optional[str] = None
+
+class ChatSyncResponse(BaseModel):
+    chats: List[ChatSyncEntry]
+    # usar como `since` na próxima chamada
+    next_since: int
+    # mais chats mudaram do que o limite: chamar de novo com next_since
+    has_more: bool
@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class DisciplineModel(BaseModel):
@@ -22,4 +22,11 @@ class ChatMessageModel(BaseModel):
     timestamp: Optional[str] = None
 
 class ChatResponseModel(ChatMessageModel):
-    timestamp: datetime
\ No newline at end of file
+    timestamp: datetime
+
+class SignedUploadModel(BaseModel):
+    upload_url: str
+    method: str
+    headers: Dict[str, str]
+    object_path: str
+    expires_at: int
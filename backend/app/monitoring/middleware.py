@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import logging
+from typing import Any, Dict
+
+from app.firebase.instrumentation import start_request, end_request
+from app.monitoring.metrics import registry, COUNT_BUCKETS
+
+logger = logging.getLogger("app.requests")
+
+# headers X-Firestore-* e Server-Timing nas respostas
+OPS_RESPONSE_HEADERS = os.getenv("OPS_RESPONSE_HEADERS", "1").lower() not in ("0", "false", "no")
+# uma linha JSON por requisição com os totais de Firestore/Storage
+REQUEST_OPS_LOG = os.getenv("REQUEST_OPS_LOG", "1").lower() not in ("0", "false", "no")
+# acima disso a requisição é registrada como WARNING (query sem limite, N+1...)
+FIRESTORE_READS_WARN_PER_REQUEST = int(os.getenv("FIRESTORE_READS_WARN_PER_REQUEST", "500"))
+
+http_request_seconds = registry.histogram(
+    "http_request_duration_seconds", "Duração das requisições HTTP", ["method", "route", "status"])
+request_reads = registry.histogram(
+    "firestore_reads_per_request", "Leituras do Firestore por requisição", ["method", "route"], buckets=COUNT_BUCKETS)
+request_writes = registry.histogram(
+    "firestore_writes_per_request", "Escritas no Firestore por requisição", ["method", "route"], buckets=COUNT_BUCKETS)
+request_calls = registry.histogram(
+    "firestore_calls_per_request", "Chamadas ao Firestore por requisição", ["method", "route"], buckets=COUNT_BUCKETS)
+
+def _route_label(scope: Dict[str, Any]) -> str:
+    # o template da rota (/chat/messages/{chat_id}), nunca o caminho cru: cardinalidade baixa
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class RequestMetricsMiddleware:
+    """
+    Middleware ASGI: abre a contabilidade de Firestore/Storage da requisição
+    (contextvar), devolve os totais em headers e registra log e métricas ao final.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ops, token = start_request()
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if OPS_RESPONSE_HEADERS:
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                    headers = list(message.get("headers", []))
+                    headers += [
+                        (b"x-firestore-calls", str(ops.firestore_calls).encode()),
+                        (b"x-firestore-reads", str(ops.reads).encode()),
+                        (b"x-firestore-writes", str(ops.writes + ops.deletes).encode()),
+                        (b"server-timing", (f"firestore;dur={ops.firestore_seconds * 1000:.1f}, "
+                                            f"storage;dur={ops.storage_seconds * 1000:.1f}, "
+                                            f"app;dur={elapsed_ms:.1f}").encode()),
+                    ]
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            end_request(token)
+            self._observe(scope, ops, status_code, time.perf_counter() - started)
+
+    @staticmethod
+    def _observe(scope, ops, status_code: int, seconds: float) -> None:
+        method, route = scope.get("method", ""), _route_label(scope)
+        http_request_seconds.observe(seconds, method, route, str(status_code))
+        request_reads.observe(ops.reads, method, route)
+        request_writes.observe(ops.writes + ops.deletes, method, route)
+        request_calls.observe(ops.firestore_calls, method, route)
+
+        runaway = ops.reads > FIRESTORE_READS_WARN_PER_REQUEST
+        level = logging.WARNING if runaway else logging.INFO
+        if not (REQUEST_OPS_LOG or runaway) or not logger.isEnabledFor(level):
+            return
+        entry = {
+            "method": method,
+            "route": route,
+            "path": scope.get("path"),
+            "status": status_code,
+            "ms": round(seconds * 1000, 2),
+            **ops.as_dict(),
+        }
+        logger.log(level, json.dumps(entry, ensure_ascii=False))
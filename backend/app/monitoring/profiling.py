@@ -0,0 +1,383 @@
+"""
+Diagnóstico de travamentos do event loop.
+
+- `loop_monitor` (LOOP_LAG_MONITOR, ligado por padrão): uma tarefa dorme
+  LOOP_LAG_INTERVAL_SECONDS e mede quanto acordou atrasada. O atraso vai para o
+  histograma `event_loop_lag_seconds`; acima de LOOP_STALL_SECONDS vira WARNING.
+- Perfis por amostragem (PROFILING_ENABLED, desligado por padrão): uma thread lê a
+  pilha da thread do event loop (`sys._current_frames`) a cada
+  PROFILE_SAMPLE_INTERVAL_MS. Uma chamada bloqueante dentro de uma rota `async def`
+  (cliente síncrono do Firestore, Storage, verificação de token) aparece como
+  amostras seguidas no mesmo ponto da pilha.
+  - Requisições com mais de SLOW_REQUEST_SECONDS (SlowRequestProfiler) gravam as
+    amostras do intervalo, separando as do código da própria requisição das de
+    outras tarefas que ocuparam o loop no mesmo período.
+  - Travamentos do loop (um `call_soon_threadsafe` da thread sem resposta por
+    LOOP_STALL_SECONDS) gravam as pilhas do período travado.
+
+Os perfis são arquivos JSON em PROFILE_DIR (no máximo PROFILE_MAX_FILES, os mais
+antigos são apagados) e saem em /debug/profiles (só administradores). As pilhas
+estão no formato "folded" (raiz;...;folha contagem) aceito por flamegraph.pl e speedscope.
+
+Amostras "ociosas" (o loop esperando no selector) indicam que a requisição estava
+aguardando I/O, não bloqueando o loop: o tempo aparece em `ops` (Firestore/Storage).
+Desligado, nada disso é instalado (o middleware nem entra na pilha).
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import logging
+import tempfile
+import threading
+from collections import Counter as Tally, deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.firebase.instrumentation import current_request_ops
+from app.monitoring.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+def _flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() not in ("0", "false", "no")
+
+LOOP_LAG_MONITOR = _flag("LOOP_LAG_MONITOR", "1")
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+LOOP_STALL_SECONDS = float(os.getenv("LOOP_STALL_SECONDS", "0.25"))
+PROFILING_ENABLED = _flag("PROFILING_ENABLED", "0")
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "1.0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+# histórico de amostras mantido em memória: requisições mais longas têm o início cortado
+PROFILE_WINDOW_SECONDS = float(os.getenv("PROFILE_WINDOW_SECONDS", "30"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "api-profiles")))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+# pilhas distintas guardadas por perfil (as mais frequentes)
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", "50"))
+PROFILE_MAX_DEPTH = 64
+# com o amostrador ativo, intervalo entre pings (call_soon_threadsafe) que detectam o loop travado
+STALL_PING_SECONDS = 0.025
+
+loop_lag_seconds = registry.histogram(
+    "event_loop_lag_seconds", "Atraso do event loop (quanto o monitor acordou depois do previsto)")
+loop_stalls = registry.counter("event_loop_stalls_total", "Travamentos do event loop acima de LOOP_STALL_SECONDS")
+slow_requests = registry.counter(
+    "slow_requests_total", "Requisições acima de SLOW_REQUEST_SECONDS", ["method", "route"])
+
+PROFILE_NAME = re.compile(r"^[\w.-]+\.json$")
+
+# (código, linha) da folha até a raiz
+Stack = Tuple[Tuple[Any, int], ...]
+
+# prefixo até a biblioteca padrão ou o site-packages (greedy: o último da linha)
+_LIBRARY_PREFIX = re.compile(r"^.*[/\\](?:site-packages|dist-packages|python\d+\.\d+)[/\\]")
+
+def _short_path(path: str) -> str:
+    """app/services/x.py, fastapi/routing.py, asyncio/events.py..."""
+    short = _LIBRARY_PREFIX.sub("", path)
+    if short != path:
+        return short
+    index = path.rfind(f"{os.sep}app{os.sep}")
+    return path[index + 1:] if index >= 0 else path
+
+def _frame_label(code: Any, lineno: int) -> str:
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{lineno})"
+
+def _is_idle(stack: Stack) -> bool:
+    """O loop parado no selector, esperando I/O ou timer."""
+    if not stack:
+        return True
+    code = stack[0][0]
+    return code.co_name == "select" and code.co_filename.endswith("selectors.py")
+
+def fold(stacks: List[Stack], limit: int = PROFILE_MAX_STACKS) -> List[Dict[str, Any]]:
+    """Pilhas agregadas no formato folded (raiz primeiro), das mais frequentes para as menos."""
+    tally = Tally(";".join(_frame_label(c, n) for c, n in reversed(s)) for s in stacks)
+    return [{"stack": stack, "count": count} for stack, count in tally.most_common(limit)]
+
+def top_functions(stacks: List[Stack], limit: int = 15) -> List[Dict[str, Any]]:
+    """Folhas mais frequentes (onde o loop estava de fato) com a fração das amostras."""
+    tally = Tally(_frame_label(*s[0]) for s in stacks if s)
+    total = len(stacks) or 1
+    return [{"function": f, "samples": n, "share": round(n / total, 3)} for f, n in tally.most_common(limit)]
+
+class ProfileStore:
+    """Diretório com rotação: mantém só os `max_files` perfis mais novos."""
+
+    def __init__(self, directory: Path, max_files: int):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def save(self, kind: str, profile: Dict[str, Any]) -> str:
+        created = datetime.now(timezone.utc)
+        slug = re.sub(r"[^\w-]+", "_", profile.get("route") or "").strip("_")[:60]
+        name = f"{created:%Y%m%dT%H%M%S%f}-{kind}{'-' + slug if slug else ''}.json"
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / name
+            path.write_text(json.dumps({"kind": kind, "created_at": created.isoformat(timespec="milliseconds"),
+                                        **profile}, ensure_ascii=False), encoding="utf-8")
+            files = sorted(self.directory.glob("*.json"))
+            for old in files[:max(0, len(files) - self.max_files)]:
+                old.unlink(missing_ok=True)
+        return name
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Resumo dos perfis, do mais novo para o mais antigo."""
+        if not self.directory.is_dir():
+            return []
+        summaries = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                profile = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            summaries.append({
+                "name": path.name,
+                **{k: profile.get(k) for k in ("kind", "created_at", "method", "route", "status", "duration_ms")},
+            })
+        return summaries
+
+    def read(self, name: str) -> Dict[str, Any]:
+        """Perfil pelo nome do arquivo; ValueError para nomes inválidos, FileNotFoundError se não existe."""
+        if not PROFILE_NAME.match(name):
+            raise ValueError("Nome de perfil inválido")
+        return json.loads((self.directory / name).read_text(encoding="utf-8"))
+
+class LoopMonitor:
+    """Monitor de atraso do loop + amostrador de pilhas (ver docstring do módulo)."""
+
+    def __init__(self, profiling: bool = PROFILING_ENABLED, store: Optional[ProfileStore] = None):
+        self.profiling = profiling
+        self.store = store or ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES)
+        self.interval = PROFILE_SAMPLE_INTERVAL_MS / 1000
+        maxlen = max(1, int(PROFILE_WINDOW_SECONDS / self.interval))
+        # (instante monotonic, pilha, id da requisição em execução ou None)
+        self._samples: Deque[Tuple[float, Stack, Optional[int]]] = deque(maxlen=maxlen)
+        # id(frame do middleware) -> id da requisição: identifica de quem é cada amostra
+        # (o frame de uma corrotina é o mesmo objeto do início ao fim dela)
+        self._request_frames: Dict[int, int] = {}
+        self._next_request = 0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        # ping pendente (instante do envio) e instante da última resposta do loop
+        self._ping_sent: Optional[float] = None
+        self._pong_at = 0.0
+        self._stall_started: Optional[float] = None
+        self._stats = {"max_lag_seconds": 0.0, "stalls": 0, "slow_requests": 0, "profiles": 0, "samples": 0}
+
+    # --- atraso do loop (tarefa no event loop) ---
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.monotonic() + LOOP_LAG_INTERVAL_SECONDS
+            await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS)
+            lag = max(0.0, time.monotonic() - expected)
+            loop_lag_seconds.observe(lag)
+            self._stats["max_lag_seconds"] = max(self._stats["max_lag_seconds"], lag)
+            # com o amostrador, os travamentos são detectados (e perfilados) por ele
+            if lag >= LOOP_STALL_SECONDS and not self.profiling:
+                self._stall(lag)
+
+    def _stall(self, seconds: float, profile: Optional[str] = None) -> None:
+        self._stats["stalls"] += 1
+        loop_stalls.inc()
+        logger.warning("Event loop travado por %.0f ms%s", seconds * 1000, f" (perfil {profile})" if profile else "")
+
+    def start(self) -> None:
+        """Inicia o monitor no event loop atual (lifespan) e, com PROFILING_ENABLED, a thread de amostragem."""
+        if self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run(), name="loop-lag-monitor")
+        if self.profiling:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name="loop-stack-sampler", daemon=True)
+            self._thread.start()
+            logger.info("Perfis de requisições lentas ativos (>%.2fs, amostras a cada %.0f ms, em %s)",
+                        SLOW_REQUEST_SECONDS, PROFILE_SAMPLE_INTERVAL_MS, self.store.directory)
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self._thread is not None:
+            self._stop.set()
+            await run_in_threadpool(self._thread.join, 2)
+            self._thread = None
+        self._ping_sent = self._stall_started = None
+
+    # --- amostragem (thread própria) ---
+
+    def _capture(self, frame: Any) -> Tuple[Stack, Optional[int]]:
+        stack = []
+        request = None
+        while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+            if request is None:
+                request = self._request_frames.get(id(frame))
+            stack.append((frame.f_code, frame.f_lineno))
+            frame = frame.f_back
+        # pilhas mais fundas que o limite: ainda procura a requisição no resto
+        while request is None and frame is not None:
+            request = self._request_frames.get(id(frame))
+            frame = frame.f_back
+        return tuple(stack), request
+
+    def _sample_loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            now = time.monotonic()
+            stack, request = self._capture(frame)
+            del frame
+            self._samples.append((now, stack, request))
+            self._stats["samples"] += 1
+            self._check_stall(now)
+
+    def _pong(self) -> None:
+        # roda no event loop: o ping foi atendido
+        self._pong_at = time.monotonic()
+        self._ping_sent = None
+
+    def _check_stall(self, now: float) -> None:
+        """
+        Pinga o loop a cada STALL_PING_SECONDS; um ping sem resposta há LOOP_STALL_SECONDS
+        é um travamento em curso. Quando a resposta chega, grava as pilhas do período.
+        """
+        sent = self._ping_sent
+        if sent is not None:
+            if self._stall_started is None and now - sent >= LOOP_STALL_SECONDS:
+                self._stall_started = sent
+            return
+        if self._stall_started is not None:
+            started, self._stall_started = self._stall_started, None
+            self._save_stall(started, self._pong_at)
+        if now - self._pong_at >= STALL_PING_SECONDS:
+            self._ping_sent = now
+            try:
+                self._loop.call_soon_threadsafe(self._pong)
+            except RuntimeError:
+                # loop já fechado (encerramento)
+                self._ping_sent = None
+
+    def _save_stall(self, started: float, ended: float) -> None:
+        stacks = [s for _t, s, _r in self.samples_between(started, ended)]
+        name = None
+        try:
+            name = self.store.save("stall", {
+                "duration_ms": round((ended - started) * 1000, 1),
+                "interval_ms": PROFILE_SAMPLE_INTERVAL_MS,
+                "samples": len(stacks),
+                "top_functions": top_functions(stacks),
+                "stacks": fold(stacks),
+            })
+            self._stats["profiles"] += 1
+        except OSError as e:
+            logger.warning("Falha ao gravar perfil de travamento: %s", e)
+        self._stall(ended - started, name)
+
+    def samples_between(self, start: float, end: float) -> List[Tuple[float, Stack, Optional[int]]]:
+        return [s for s in list(self._samples) if start <= s[0] <= end]
+
+    # --- requisições (SlowRequestProfiler) ---
+
+    def request_started(self, frame_id: int) -> int:
+        self._next_request += 1
+        self._request_frames[frame_id] = self._next_request
+        return self._next_request
+
+    def request_finished(self, frame_id: int) -> None:
+        self._request_frames.pop(frame_id, None)
+
+    def save_request_profile(self, request: int, scope: Dict[str, Any], status_code: int,
+                             started: float, seconds: float, ops: Optional[Dict[str, Any]]) -> Optional[str]:
+        """Grava o perfil de uma requisição lenta (roda numa thread: escreve em disco)."""
+        self._stats["slow_requests"] += 1
+        window = self.samples_between(started, started + seconds)
+        own = [s for _t, s, r in window if r == request]
+        busy = [s for _t, s, r in window if r != request and not _is_idle(s)]
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        profile = {
+            "method": scope.get("method"),
+            "route": route,
+            "path": scope.get("path"),
+            "status": status_code,
+            "duration_ms": round(seconds * 1000, 1),
+            "interval_ms": PROFILE_SAMPLE_INTERVAL_MS,
+            "window_truncated": bool(self._samples) and self._samples[0][0] > started,
+            # amostras do intervalo: do código da requisição, de outras tarefas e com o loop ocioso
+            "samples": len(window),
+            "own_samples": len(own),
+            "other_busy_samples": len(busy),
+            "idle_samples": sum(1 for _t, s, r in window if r != request and _is_idle(s)),
+            "ops": ops,
+            "top_functions": top_functions(own),
+            "own": fold(own),
+            "others": fold(busy),
+        }
+        try:
+            name = self.store.save("request", profile)
+        except OSError as e:
+            logger.warning("Falha ao gravar perfil de %s %s: %s", profile["method"], route, e)
+            return None
+        self._stats["profiles"] += 1
+        return name
+
+    def stats(self) -> Dict[str, float]:
+        return {**self._stats, "profiling": int(self.profiling), "buffered_samples": len(self._samples),
+                "requests_in_flight": len(self._request_frames)}
+
+loop_monitor = LoopMonitor()
+
+class SlowRequestProfiler:
+    """
+    Middleware ASGI (só instalado com PROFILING_ENABLED): marca o frame da requisição
+    para o amostrador e, acima de SLOW_REQUEST_SECONDS, grava o perfil depois da resposta.
+    """
+
+    def __init__(self, app, monitor: LoopMonitor = loop_monitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        frame_id = id(sys._getframe())
+        request = self.monitor.request_started(frame_id)
+        started = time.monotonic()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.monitor.request_finished(frame_id)
+            seconds = time.monotonic() - started
+            if seconds >= SLOW_REQUEST_SECONDS:
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                slow_requests.inc(1, scope.get("method", ""), route)
+                ops = current_request_ops()
+                await run_in_threadpool(self.monitor.save_request_profile, request, scope, status_code,
+                                        started, seconds, ops.as_dict() if ops is not None else None)
@@ -0,0 +1,136 @@
+import os
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set
+
+from app.repository import chat_repository
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("CHAT_HUB_QUEUE_SIZE", "200"))
+SNAPSHOT_BRIDGE_ENABLED = os.getenv("CHAT_SNAPSHOT_BRIDGE", "").lower() in ("1", "true", "yes")
+
+class Subscription:
+    """Uma conexão de um usuário: fila própria, consumida no event loop que a criou."""
+
+    def __init__(self, uid: str, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.uid = uid
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        # cliente lento: descarta o evento mais antigo em vez de crescer sem limite
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(event)
+
+    def deliver(self, event: Dict[str, Any]) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._offer, event)
+        except RuntimeError:
+            # loop já encerrado; a conexão será removida no unsubscribe
+            pass
+
+class ChatHub:
+    """
+    Fan-out em processo das atualizações de chat para os participantes conectados.
+    `publish` pode ser chamado de qualquer thread (rotas síncronas rodam no threadpool).
+    """
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE, dedupe_size: int = 2048):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._queue_size = queue_size
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self._dedupe_size = dedupe_size
+
+    def subscribe(self, uid: str) -> Subscription:
+        sub = Subscription(uid, asyncio.get_running_loop(), self._queue_size)
+        with self._lock:
+            self._subscribers.setdefault(uid, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subscribers.get(sub.uid)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    self._subscribers.pop(sub.uid, None)
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def _seen(self, key: str) -> bool:
+        if key in self._recent:
+            self._recent.move_to_end(key)
+            return True
+        self._recent[key] = None
+        if len(self._recent) > self._dedupe_size:
+            self._recent.popitem(last=False)
+        return False
+
+    def publish(self, recipients: Iterable[str], event: Dict[str, Any], dedupe_key: Optional[str] = None) -> int:
+        """Entrega o evento a todas as conexões dos destinatários. Retorna quantas receberam."""
+        with self._lock:
+            # o mesmo evento pode chegar pela escrita local e pelo bridge do Firestore
+            if dedupe_key and self._seen(dedupe_key):
+                return 0
+            targets = [sub for uid in set(recipients) for sub in self._subscribers.get(uid, ())]
+        for sub in targets:
+            sub.deliver(event)
+        return len(targets)
+
+    def publish_message(self, message: Dict[str, Any]) -> int:
+        recipients = [message.get("sender_id"), message.get("receiver_id")]
+        return self.publish(
+            [r for r in recipients if r],
+            {"type": "message", "chat_id": message.get("chat_id"), "message": message},
+            dedupe_key=f"msg:{message.get('chat_id')}:{message.get('id')}",
+        )
+
+    def publish_chat(self, chat: Dict[str, Any]) -> int:
+        return self.publish(
+            chat.get("participants") or [],
+            {"type": "chat", "chat": chat},
+            dedupe_key=f"chat:{chat.get('id')}:{chat.get('updated_at')}",
+        )
+
+chat_hub = ChatHub()
+
+class SnapshotBridge:
+    """
+    Leva ao hub as escritas feitas por outros workers/réplicas, via listeners
+    `on_snapshot` do Firestore. Opcional: habilitado com CHAT_SNAPSHOT_BRIDGE=1.
+    """
+
+    def __init__(self, hub: ChatHub):
+        self._hub = hub
+        self._watches = []
+
+    def start(self) -> None:
+        if self._watches:
+            return
+        self._watches = chat_repository.watch_chat_changes(
+            on_message=self._hub.publish_message,
+            on_chat=self._hub.publish_chat,
+        )
+        logger.info("Bridge de snapshots do chat iniciado")
+
+    def stop(self) -> None:
+        for watch in self._watches:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                logger.warning("Falha ao encerrar listener do chat: %s", e)
+        self._watches = []
+
+snapshot_bridge = SnapshotBridge(chat_hub)
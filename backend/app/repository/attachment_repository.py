@@ -0,0 +1,36 @@
+from typing import Any, Dict, Optional
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore
+from app.firebase.firestore_client import async_db
+
+# índice de anexos por conteúdo: attachments/{sha256} -> blob, url, tamanho e refcount
+COLLECTION = "attachments"
+
+async def get_attachment(digest: str) -> Optional[Dict[str, Any]]:
+    doc = await async_db.collection(COLLECTION).document(digest).get()
+    return doc.to_dict() if doc.exists else None
+
+async def register_attachment(digest: str, data: Dict[str, Any]) -> bool:
+    """
+    Cria a entrada do índice com refcount 1. Retorna False se outro envio
+    do mesmo conteúdo registrou primeiro (nesse caso, só soma a referência).
+    """
+    try:
+        await async_db.collection(COLLECTION).document(digest).create({
+            **data,
+            "refcount": 1,
+            "created_at": firestore.SERVER_TIMESTAMP,
+        })
+        return True
+    except AlreadyExists:
+        await add_reference(digest)
+        return False
+
+async def add_reference(digest: str) -> None:
+    await async_db.collection(COLLECTION).document(digest).update({
+        "refcount": firestore.Increment(1),
+        "last_used_at": firestore.SERVER_TIMESTAMP,
+    })
+
+async def set_thumbs(digest: str, thumbs: Dict[str, str]) -> None:
+    await async_db.collection(COLLECTION).document(digest).update({"thumbs": thumbs})
@@ -1,8 +1,31 @@
-import time, uuid
-from typing import List, Dict, Optional, Tuple, Any
-from datetime import datetime
+import os, time, uuid, json, base64, logging
+from typing import AsyncIterator, Callable, List, Dict, Optional, Tuple, Any
+from datetime import datetime, timedelta, timezone
 from google.cloud import firestore
-from app.firebase.firestore_client import db
+from cachetools import LRUCache
+from app.cache.shared_cache import shared_cache, invalidation_bus
+from app.database.write_behind import WriteBehindQueue
+from app.repository import message_archive
+from app.firebase.firestore_client import db, async_db
+
+CHAT_VERSION_CACHE_TTL_SECONDS = float(os.getenv("CHAT_VERSION_CACHE_TTL_SECONDS", "30"))
+# atraso máximo das escritas adiadas nos chats (cópias dos perfis dos participantes)
+CHAT_META_FLUSH_SECONDS = float(os.getenv("CHAT_META_FLUSH_SECONDS", "1.0"))
+
+# chats/{id}.messages_version: incrementado a cada escrita nas mensagens (nova mensagem,
+# miniaturas); é a versão (ETag) das páginas de mensagens. Cache: chat_id -> versão.
+# Só é consultado com o barramento de invalidação compartilhado (firestore/redis): com
+# "local", uma escrita feita por outro worker deixaria a versão velha aqui até o TTL.
+chat_version_cache = shared_cache("chat_versions", maxsize=20000, ttl=CHAT_VERSION_CACHE_TTL_SECONDS)
+
+# escritas nos chats que podem atrasar e ser refeitas (participant_profiles, reconstruído
+# a partir de users/): várias atualizações do mesmo chat viram uma escrita só (ver
+# app/database/write_behind.py). O lifespan inicia e drena. Mensagem, não lidas,
+# updated_at e messages_version nunca passam por aqui: vão no commit da mensagem.
+chat_meta_writes = WriteBehindQueue("chat_meta", flush_interval=CHAT_META_FLUSH_SECONDS)
+
+# chats que já sabemos existir (existência não muda): evita ler/gravar em create_or_get_chat
+_known_chats: LRUCache = LRUCache(maxsize=50000)
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
@@ -19,31 +42,84 @@ def _to_ms(v: Any) -> Optional[int]:
     except Exception:
         return None
 
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def _to_us(v: Any) -> Optional[int]:
+    """Como _to_ms, mas em microssegundos (precisão do Timestamp do Firestore), para cursores."""
+    if v is None:
+        return None
+    if isinstance(v, (int, float)):
+        return int(v) * 1000
+    if isinstance(v, datetime):
+        if v.tzinfo is None:
+            v = v.replace(tzinfo=timezone.utc)
+        return (v - _EPOCH) // timedelta(microseconds=1)
+    return None
+
+def _from_us(us: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=us)
+
+def _from_ms(ms: int) -> datetime:
+    return _from_us(int(ms) * 1000)
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    """Cursor opaco para o cliente: JSON compacto em base64 url-safe."""
+    raw = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("cursor inválido")
+    if not isinstance(data, dict):
+        raise ValueError("cursor inválido")
+    return data
+
 def chat_id_for(u1: str, u2: str) -> str:
     a, b = sorted([u1, u2])
     return f"{a}_{b}"
 
-def upsert_chat_meta(chat_id: str, participants: List[str],
-                     last_message: Optional[str], last_sender: Optional[str]) -> None:
+def _chat_meta_payload(chat_id: str, participants: List[str], last_message: Optional[str],
+                       last_sender: Optional[str], updated_at: Any) -> Dict[str, Any]:
     """
-    Grava metadados do chat em SNAKE_CASE e com updated_at em epoch ms.
-    Mantemos também os campos camelCase para compatibilidade (migração suave).
+    Metadados do chat em SNAKE_CASE. Mantemos também os campos camelCase
+    para compatibilidade (migração suave).
     """
-    now = _now_ms()
-    meta_snake = {
+    return {
         "id": chat_id,
         "participants": participants,
         "last_message": last_message,
         "last_sender": last_sender,
-        "updated_at": now,
-    }
-
-    meta_camel = {
+        "updated_at": updated_at,
         "lastMessage": last_message,
         "lastSender": last_sender,
-        "updatedAt": now,
+        "updatedAt": updated_at,
     }
-    db.collection("chats").document(chat_id).set({**meta_snake, **meta_camel}, merge=True)
+
+async def chat_exists(chat_id: str) -> bool:
+    """Se o documento do chat existe."""
+    if chat_id in _known_chats:
+        return True
+    ref = async_db.collection("chats").document(chat_id)
+    snap = await ref.get(field_paths=["participants"])
+    if snap.exists:
+        _known_chats[chat_id] = True
+    return snap.exists
+
+async def upsert_chat_meta(chat_id: str, participants: List[str],
+                     last_message: Optional[str], last_sender: Optional[str],
+                     participant_profiles: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Grava metadados do chat com updated_at = horário do servidor."""
+    payload = _chat_meta_payload(chat_id, participants, last_message, last_sender, firestore.SERVER_TIMESTAMP)
+    if participant_profiles:
+        payload["participant_profiles"] = participant_profiles
+    result = await async_db.collection("chats").document(chat_id).set(payload, merge=True)
+    _known_chats[chat_id] = True
+    return _chat_to_dict(chat_id, {**payload, "updated_at": result.update_time})
 
 def _kind_from(content_type: Optional[str], filename: Optional[str]) -> str:
     ct = (content_type or '').lower()
@@ -54,62 +130,215 @@ def _kind_from(content_type: Optional[str], filename: Optional[str]) -> str:
     if any(name.endswith(ext) for ext in ('.mp4','.mov','.mkv','.webm','.mp3','.wav','.m4a','.ogg')): return 'Mídia'
     return 'Arquivo'
 
-def list_user_chats(uid: str) -> List[Dict[str, Any]]:
-    qs = db.collection("chats").where("participants", "array_contains", uid).stream()
+def _chat_to_dict(chat_id: str, c: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": c.get("id", chat_id),
+        "participants": c.get("participants", []),
+        "last_message": c.get("last_message", c.get("lastMessage")),
+        "last_sender": c.get("last_sender", c.get("lastSender")),
+        "updated_at": _to_ms(c.get("updated_at", c.get("updatedAt"))) or 0,
+        "unread": c.get("unread") or {},
+        "participant_profiles": c.get("participant_profiles") or {},
+    }
 
-    items: List[Dict[str, Any]] = []
-    for d in qs:
-        c = d.to_dict() or {}
+def _preview_from_message(m: Dict[str, Any]) -> str:
+    text = (m.get("message") or "").strip()
+    if text:
+        return text[:120]
+    if m.get("file_url"):
+        return _kind_from(m.get("file_type"), m.get("file_name"))
+    return "Mensagem"
 
-        # lê snake ou camel
+async def list_user_chats(uid: str, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Chats do usuário, mais recentes primeiro, numa única query indexada
+    (participants array_contains + updated_at desc). Só leitura: metadados
+    faltando são corrigidos por `backfill_chat_meta` (python -m app.scripts.backfill_chat_meta).
+    """
+    q = async_db.collection("chats").where("participants", "array_contains", uid)\
+          .order_by("updated_at", direction=firestore.Query.DESCENDING)\
+          .order_by("__name__", direction=firestore.Query.DESCENDING)
+    if cursor:
+        c = decode_cursor(cursor)
+        if (c.get("t") is None and c.get("u") is None) or not c.get("id"):
+            raise ValueError("cursor inválido")
+        updated_at = _from_us(c["t"]) if isinstance(c.get("t"), int) else c.get("u")
+        q = q.start_after({"updated_at": updated_at, "__name__": str(c["id"])})
+    docs = [d async for d in q.limit(limit).stream()]
+
+    items = [_chat_to_dict(d.id, d.to_dict() or {}) for d in docs]
+    next_cursor = None
+    if len(docs) == limit:
+        updated_at = (docs[-1].to_dict() or {}).get("updated_at")
+        if isinstance(updated_at, datetime):
+            next_cursor = encode_cursor({"t": _to_us(updated_at), "id": docs[-1].id})
+        else:
+            next_cursor = encode_cursor({"u": updated_at, "id": docs[-1].id})
+    return items, next_cursor
+
+async def list_chats_changed_since(uid: str, since_ms: int, limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    Chats do usuário com updated_at > since, do mais antigo para o mais novo
+    (a marca d'água avança de forma monotônica). Query indexada:
+    participants array_contains + updated_at asc.
+    """
+    q = async_db.collection("chats").where("participants", "array_contains", uid)\
+          .where("updated_at", ">", _from_ms(since_ms))\
+          .order_by("updated_at", direction=firestore.Query.ASCENDING)\
+          .order_by("__name__", direction=firestore.Query.ASCENDING)\
+          .limit(limit)
+    return [_chat_to_dict(d.id, d.to_dict() or {}) async for d in q.stream()]
+
+async def backfill_chat_meta(dry_run: bool = False, batch_size: int = 400) -> Dict[str, int]:
+    """
+    Repara em lote os metadados dos chats: preenche last_message/last_sender a partir
+    da última mensagem e garante `updated_at` como Timestamp (necessário para a ordenação
+    de list_user_chats; chats antigos guardavam epoch ms).
+    As escritas são agrupadas em WriteBatch de até `batch_size` operações.
+    """
+    stats = {"scanned": 0, "repaired": 0, "batches": 0}
+    batch = async_db.batch()
+    pending = 0
+
+    async for d in async_db.collection("chats").stream():
+        stats["scanned"] += 1
+        c = d.to_dict() or {}
         last_message = c.get("last_message", c.get("lastMessage"))
-        last_sender  = c.get("last_sender",  c.get("lastSender"))
-        updated_at   = c.get("updated_at",   c.get("updatedAt"))
+        last_sender = c.get("last_sender", c.get("lastSender"))
+        updated_at = c.get("updated_at", c.get("updatedAt"))
+        if last_message and isinstance(c.get("updated_at"), datetime):
+            continue
 
-        if not last_message:
-            try:
-                last_q = db.collection("chats").document(d.id)\
-                           .collection("messages")\
-                           .order_by("timestamp", direction=firestore.Query.DESCENDING)\
-                           .limit(1).stream()
-                last_docs = list(last_q)
-                if last_docs:
-                    mm = last_docs[0].to_dict() or {}
-                    ts_ms = _to_ms(mm.get("timestamp")) or 0
-                    if (mm.get("message") or "").strip():
-                        last_message = (mm.get("message") or "").strip()
-                    elif mm.get("file_url"):
-                        last_message = _kind_from(mm.get("file_type"), mm.get("file_name"))
-                    else:
-                        last_message = "Mensagem"
-                    updated_at = updated_at or ts_ms
-
-                    db.collection("chats").document(d.id).set({
-                        "last_message": last_message,
-                        "last_sender": mm.get("sender_id"),
-                        "updated_at": updated_at,
-                        "lastMessage": last_message,
-                        "lastSender": mm.get("sender_id"),
-                        "updatedAt": updated_at,
-                    }, merge=True)
-            except Exception:
-                pass
-
-        items.append({
-            "id": c.get("id", d.id),
-            "participants": c.get("participants", []),
-            "last_message": last_message,
-            "last_sender": last_sender,
-            "updated_at": _to_ms(updated_at) or 0,
-        })
-
-    items.sort(key=lambda x: x.get("updated_at") or 0, reverse=True)
-    return items
-
-def append_message(chat_id: str, sender_id: str, receiver_id: str, message: Optional[str],
-                   file_url: Optional[str], file_type: Optional[str], file_name: Optional[str]) -> Tuple[str, int]:
+        last_q = d.reference.collection("messages")\
+                    .order_by("timestamp", direction=firestore.Query.DESCENDING)\
+                    .limit(1)
+        last_docs = [m async for m in last_q.stream()]
+        if not last_docs and isinstance(c.get("updated_at"), datetime):
+            # chat ainda sem mensagens: nada a reparar
+            continue
+        if last_docs:
+            mm = last_docs[0].to_dict() or {}
+            last_message = last_message or _preview_from_message(mm)
+            last_sender = last_sender or mm.get("sender_id")
+            updated_at = updated_at or _to_ms(mm.get("timestamp"))
+        updated_at = _to_ms(updated_at)
+
+        stats["repaired"] += 1
+        if dry_run:
+            continue
+        batch.set(d.reference, _chat_meta_payload(
+            d.id, c.get("participants", []), last_message, last_sender,
+            _from_ms(updated_at) if updated_at is not None else firestore.SERVER_TIMESTAMP,
+        ), merge=True)
+        pending += 1
+        if pending >= batch_size:
+            await batch.commit()
+            stats["batches"] += 1
+            batch = async_db.batch()
+            pending = 0
+
+    if pending:
+        await batch.commit()
+        stats["batches"] += 1
+    return stats
+
+async def _purge_archived(chat_id: str, index: Dict[str, Any], dry_run: bool) -> int:
+    """Apaga os documentos de mensagens de blocos arquivados há mais de MESSAGE_ARCHIVE_DELETE_GRACE_SECONDS."""
+    ready_before_ms = _now_ms() - int(message_archive.MESSAGE_ARCHIVE_DELETE_GRACE_SECONDS * 1000)
+    target = None
+    for chunk in index.get("chunks") or []:
+        if chunk.get("archived_at", 0) > ready_before_ms:
+            break
+        target = message_archive.chunk_key(chunk, "last")
+    purged = (index["purged_t"], index["purged_id"]) if index.get("purged_t") is not None else None
+    if target is None or (purged is not None and purged >= target):
+        return 0
+
+    q = async_db.collection("chats").document(chat_id).collection("messages")\
+          .where("timestamp", "<=", _from_us(target[0]))\
+          .order_by("timestamp").order_by("__name__")
+    if purged is not None:
+        q = q.start_after({"timestamp": _from_us(purged[0]), "__name__": purged[1]})
+    refs = [d.reference async for d in q.stream() if _message_key(d) <= target]
+    if dry_run:
+        return len(refs)
+    for i in range(0, len(refs), 500):
+        batch = async_db.batch()
+        for ref in refs[i:i + 500]:
+            batch.delete(ref)
+        await batch.commit()
+    await message_archive.index_ref(chat_id).set({"purged_t": target[0], "purged_id": target[1]}, merge=True)
+    message_archive.archive_index_cache.invalidate([chat_id])
+    return len(refs)
+
+async def archive_chat_messages(chat_id: str, older_than_days: Optional[float] = None,
+                                chunk_size: Optional[int] = None, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Arquiva as mensagens antigas de um chat (ver app/repository/message_archive.py):
+    apaga as mensagens de blocos já arquivados há tempo suficiente e empacota, em blocos
+    completos de `chunk_size`, as mensagens mais velhas que `older_than_days`.
+    Rode um único arquivamento por chat de cada vez (não há trava entre processos).
+    """
+    chunk_size = chunk_size or message_archive.MESSAGE_ARCHIVE_CHUNK_SIZE
+    stats = {"chunks": 0, "archived": 0, "bytes": 0, "deleted": 0}
+    index = await message_archive.load_index(chat_id)
+    stats["deleted"] = await _purge_archived(chat_id, index, dry_run)
+
+    cutoff = _from_us(message_archive.archive_cutoff_us(older_than_days))
+    col = async_db.collection("chats").document(chat_id).collection("messages")
+    chunks = list(index.get("chunks") or [])
+    until = (index["until_t"], index["until_id"]) if index.get("until_t") is not None else None
+    while True:
+        q = col.where("timestamp", "<", cutoff).order_by("timestamp").order_by("__name__")
+        if until is not None:
+            # arquivadas mas ainda não apagadas ficam para trás
+            q = q.start_after({"timestamp": _from_us(until[0]), "__name__": until[1]})
+        docs = [d async for d in q.limit(chunk_size).stream()]
+        if len(docs) < chunk_size:
+            break
+        records = [_archive_record(d) for d in docs]
+        first, until = message_archive.record_key(records[0]), message_archive.record_key(records[-1])
+        stats["chunks"] += 1
+        stats["archived"] += len(records)
+        if dry_run:
+            continue
+        path = message_archive.chunk_path(chat_id, first)
+        stats["bytes"] += await message_archive.write_chunk(path, records)
+        chunks.append({"path": path, "count": len(records), "archived_at": _now_ms(),
+                       "first_t": first[0], "first_id": first[1], "last_t": until[0], "last_id": until[1]})
+        # o índice só aponta para o bloco depois que ele existe no Storage
+        await message_archive.index_ref(chat_id).set({
+            "chunks": chunks,
+            "until_t": until[0],
+            "until_id": until[1],
+            "messages": sum(c["count"] for c in chunks),
+            "updated_at": firestore.SERVER_TIMESTAMP,
+        }, merge=True)
+        message_archive.archive_index_cache.invalidate([chat_id])
+    return stats
+
+async def archive_old_messages(older_than_days: Optional[float] = None, chunk_size: Optional[int] = None,
+                               dry_run: bool = False) -> Dict[str, int]:
+    """Roda `archive_chat_messages` em todos os chats, um de cada vez. Retorna os totais."""
+    totals = {"chats": 0, "chunks": 0, "archived": 0, "bytes": 0, "deleted": 0}
+    async for chat_id in iter_chat_ids():
+        stats = await archive_chat_messages(chat_id, older_than_days, chunk_size, dry_run)
+        totals["chats"] += 1
+        for key, value in stats.items():
+            totals[key] += value
+    return totals
+
+async def append_message(chat_id: str, sender_id: str, receiver_id: str, message: Optional[str],
+                   file_url: Optional[str], file_type: Optional[str], file_name: Optional[str],
+                   preview: Optional[str], file_thumbs: Optional[Dict[str, str]] = None) -> Tuple[str, int, Dict[str, Any]]:
+    """
+    Grava a mensagem e atualiza os metadados do chat num único WriteBatch (atômico).
+    `timestamp` da mensagem e `updated_at` do chat usam o mesmo SERVER_TIMESTAMP,
+    que é o horário do commit. Não lidas e messages_version nunca ficam para trás da
+    mensagem (ETag, sync). Retorna (id da mensagem, timestamp em ms, metadados do chat).
+    """
     mid = str(uuid.uuid4())
-    ref = db.collection("chats").document(chat_id).collection("messages").document(mid)
+    chat_ref = async_db.collection("chats").document(chat_id)
     payload = {
         "sender_id": sender_id,
         "receiver_id": receiver_id,
@@ -119,31 +348,262 @@ def append_message(chat_id: str, sender_id: str, receiver_id: str, message: Opti
         "file_name": file_name,
         "timestamp": firestore.SERVER_TIMESTAMP,
     }
-    ref.set(payload)
-    return mid, _now_ms()
+    if file_thumbs:
+        payload["file_thumbs"] = file_thumbs
+    meta = _chat_meta_payload(chat_id, [sender_id, receiver_id], preview, sender_id, firestore.SERVER_TIMESTAMP)
+
+    batch = async_db.batch()
+    batch.set(chat_ref.collection("messages").document(mid), payload)
+    # contador de não lidas do destinatário: incremento atômico no mesmo commit
+    batch.set(chat_ref, {**meta, "unread": {receiver_id: firestore.Increment(1)},
+                         "messages_version": firestore.Increment(1)}, merge=True)
+    results = await batch.commit()
+    chat_version_cache.invalidate([chat_id])
+    _known_chats[chat_id] = True
+
+    committed_at = results[0].update_time if results else None
+    ts_ms = _to_ms(committed_at) or _now_ms()
+    chat = _chat_to_dict(chat_id, {**meta, "updated_at": committed_at or ts_ms})
+    # não lidas (após o Increment) e perfis não fazem parte deste write: ficam de fora do evento
+    chat.pop("unread")
+    chat.pop("participant_profiles")
+    return mid, ts_ms, chat
+
+async def mark_chat_read(chat_id: str, uid: str) -> None:
+    """Zera o contador de não lidas do usuário no chat."""
+    # escrita direta: adiada, zeraria por cima de incrementos gravados depois dela
+    await async_db.collection("chats").document(chat_id).set({"unread": {uid: 0}}, merge=True)
+
+async def fan_out_participant_profile(uid: str, profile: Dict[str, Any]) -> int:
+    """
+    Atualiza a cópia denormalizada do perfil (participant_profiles.{uid}) em todos os
+    chats do usuário. As escritas vão para a fila `chat_meta_writes` (WriteBatch de
+    até 500, atualizações repetidas do mesmo chat fundidas). Retorna quantos chats serão atualizados.
+    """
+    q = async_db.collection("chats").where("participants", "array_contains", uid).select(["participants"])
+    total = 0
+    async for d in q.stream():
+        await chat_meta_writes.enqueue(d.reference, {"participant_profiles": {uid: profile}})
+        total += 1
+    return total
+
+async def update_message_fields(chat_id: str, message_id: str, fields: Dict[str, Any]) -> None:
+    """Atualiza campos de uma mensagem e a versão das páginas de mensagens do chat (um commit)."""
+    chat_ref = async_db.collection("chats").document(chat_id)
+    batch = async_db.batch()
+    batch.update(chat_ref.collection("messages").document(message_id), fields)
+    batch.set(chat_ref, {"messages_version": firestore.Increment(1)}, merge=True)
+    await batch.commit()
+    chat_version_cache.invalidate([chat_id])
+
+def cached_messages_version(chat_id: str) -> Optional[int]:
+    """Versão em cache (sem ler o Firestore); None se não há ou se o cache não é confiável entre workers."""
+    return chat_version_cache.get(chat_id) if invalidation_bus.shared else None
+
+async def get_messages_version(chat_id: str) -> int:
+    """
+    Versão das mensagens do chat (0 para chats sem escrita desde a criação do campo).
+    Sem barramento compartilhado, sempre lê o documento (uma leitura de um campo).
+    """
+    version = cached_messages_version(chat_id)
+    if version is None:
+        generation = chat_version_cache.generation
+        snap = await async_db.collection("chats").document(chat_id).get(field_paths=["messages_version"])
+        version = int((snap.to_dict() or {}).get("messages_version") or 0) if snap.exists else 0
+        chat_version_cache.set(chat_id, version, generation=generation)
+    return version
+
+_MESSAGE_FIELDS = ("sender_id", "receiver_id", "message", "file_url", "file_type", "file_name", "file_thumbs")
+
+def _message_to_dict(chat_id: str, d) -> Dict[str, Any]:
+    m = d.to_dict() or {}
+    return {
+        "id": d.id,
+        "chat_id": chat_id,
+        **{field: m.get(field) for field in _MESSAGE_FIELDS},
+        "timestamp": _to_ms(m.get("timestamp")) or 0,
+    }
+
+def _message_key(d) -> message_archive.Key:
+    return _to_us((d.to_dict() or {}).get("timestamp")) or 0, d.id
+
+def _archive_record(d) -> Dict[str, Any]:
+    m = d.to_dict() or {}
+    t, mid = _message_key(d)
+    return {"id": mid, "t": t, **{field: m.get(field) for field in _MESSAGE_FIELDS if m.get(field) is not None}}
+
+def _message_from_record(chat_id: str, r: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": r["id"], "chat_id": chat_id, **{field: r.get(field) for field in _MESSAGE_FIELDS},
+            "timestamp": r["t"] // 1000}
+
+def _message_cursor(key: message_archive.Key, direction: str) -> str:
+    return encode_cursor({"t": key[0], "id": key[1], "d": direction})
+
+async def list_messages(chat_id: str, limit: int, before_ts: Optional[int] = None,
+                  after_ts: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Página de mensagens em ordem cronológica + cursor opaco para a próxima página.
 
-def list_messages(chat_id: str, limit: int, before_ts: Optional[int]) -> List[Dict]:
-    col = db.collection("chats").document(chat_id).collection("messages")
-    q = col.order_by("timestamp", direction=firestore.Query.DESCENDING).limit(limit)
-    docs = list(q.stream())
+    - sem parâmetros: as `limit` mensagens mais recentes; o cursor aponta para as mais antigas;
+    - `before_ts`/cursor "older": mensagens anteriores (timestamp < before), paginando para trás;
+    - `after_ts`/cursor "newer": mensagens novas (timestamp > after), paginando para frente.
 
-    items: List[Dict[str, Any]] = []
+    Os limites viram cursores da própria query (start_after/end_before sobre
+    timestamp, com desempate pelo id do documento), então cada página lê só `limit` documentos.
+    Páginas que passam do início das mensagens vivas continuam nos blocos do arquivo
+    (app/repository/message_archive.py), com os mesmos cursores.
+    """
+    col = async_db.collection("chats").document(chat_id).collection("messages")
+
+    direction = "older"
+    start: Optional[Dict[str, Any]] = None
+    end: Optional[Dict[str, Any]] = None
+    # os mesmos limites como chaves (µs, id), exclusivos, para ler o arquivo
+    bound: Optional[message_archive.Key] = None
+    lower: Optional[message_archive.Key] = None
+    if cursor:
+        c = decode_cursor(cursor)
+        if c.get("d") not in ("older", "newer") or not isinstance(c.get("t"), int) or not c.get("id"):
+            raise ValueError("cursor inválido")
+        direction = c["d"]
+        start = {"timestamp": _from_us(c["t"]), "__name__": str(c["id"])}
+        bound = (c["t"], str(c["id"]))
+    elif before_ts is not None:
+        start = {"timestamp": _from_ms(before_ts)}
+        bound = (int(before_ts) * 1000, message_archive.MIN_ID)
+    elif after_ts is not None:
+        direction = "newer"
+        start = {"timestamp": _from_ms(after_ts)}
+        bound = (int(after_ts) * 1000, message_archive.MAX_ID)
+
+    if direction == "older":
+        order = firestore.Query.DESCENDING
+        if after_ts is not None and (cursor or before_ts is not None):
+            end = {"timestamp": _from_ms(after_ts)}
+            lower = (int(after_ts) * 1000, message_archive.MAX_ID)
+    else:
+        order = firestore.Query.ASCENDING
+
+    index: Optional[Dict[str, Any]] = None
+    purged = False
+    if direction == "older" and bound is not None and bound[0] < message_archive.archive_cutoff_us():
+        # cursor dentro da faixa já apagada: nada de mensagens vivas antes dele
+        index = await message_archive.get_index(chat_id)
+        purged = index.get("purged_t") is not None and bound <= (index["purged_t"], index["purged_id"])
+
+    docs = []
+    if not purged:
+        q = col.order_by("timestamp", direction=order).order_by("__name__", direction=order)
+        if start:
+            q = q.start_after(start)
+        if end:
+            q = q.end_before(end)
+        docs = [d async for d in q.limit(limit).stream()]
+    page = [(_message_key(d), _message_to_dict(chat_id, d)) for d in docs]
+
+    if direction == "older":
+        if len(page) < limit:
+            # acabaram as mensagens vivas: o restante (mais antigo) pode estar arquivado
+            index = index if index is not None else await message_archive.get_index(chat_id)
+            if index.get("chunks"):
+                position = page[-1][0] if page else bound
+                records = await message_archive.read_archived(index, lower, position, limit - len(page),
+                                                              newest_first=True)
+                page += [(message_archive.record_key(r), _message_from_record(chat_id, r)) for r in records]
+        next_cursor = _message_cursor(page[-1][0], "older") if len(page) == limit else None
+        page.reverse()
+    else:
+        if bound[0] < message_archive.archive_cutoff_us():
+            # começa numa faixa que pode estar arquivada (e talvez ainda não apagada)
+            index = await message_archive.get_index(chat_id)
+            if index.get("chunks") and bound < message_archive.chunk_key(index["chunks"][-1], "last"):
+                records = await message_archive.read_archived(index, bound, None, limit, newest_first=False)
+                merged = {r["id"]: (message_archive.record_key(r), _message_from_record(chat_id, r)) for r in records}
+                merged.update((m["id"], (key, m)) for key, m in page)
+                page = sorted(merged.values(), key=lambda item: item[0])[:limit]
+        # para frente o cursor continua válido mesmo sem novidades (polling)
+        next_cursor = _message_cursor(page[-1][0], "newer") if page else cursor
+
+    return [m for _key, m in page], next_cursor
+
+async def iter_chat_ids() -> AsyncIterator[str]:
+    """Ids de todos os chats (jobs e reconstruções offline)."""
+    async for d in async_db.collection("chats").select(["participants"]).stream():
+        yield d.id
+
+async def stream_chat_history(chat_id: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Todas as mensagens do chat, arquivadas e vivas, em ordem cronológica, com a chave
+    `t` (µs). Para reconstruções offline: lê o chat inteiro.
+    """
+    index = await message_archive.load_index(chat_id)
+    until = (index["until_t"], index["until_id"]) if index.get("until_t") is not None else None
+    for chunk in index.get("chunks") or []:
+        for r in await message_archive.read_chunk(chunk["path"]):
+            yield {**_message_from_record(chat_id, r), "t": r["t"]}
+    col = async_db.collection("chats").document(chat_id).collection("messages")
+    async for d in col.order_by("timestamp").order_by("__name__").stream():
+        key = _message_key(d)
+        # arquivadas ainda não apagadas já saíram dos blocos
+        if until is None or key > until:
+            yield {**_message_to_dict(chat_id, d), "t": key[0]}
+
+async def list_messages_committed_since(since_us: int, limit: int,
+                                        start_after: Any = None) -> Tuple[List[Dict[str, Any]], Any]:
+    """
+    Mensagens de todos os chats com timestamp >= since (collection group `messages`),
+    em ordem de commit, até `limit`, com a chave `t` (µs). Retorna também o último
+    snapshot, para continuar com `start_after`.
+    """
+    q = async_db.collection_group("messages").where("timestamp", ">=", _from_us(since_us)).order_by("timestamp")
+    if start_after is not None:
+        q = q.start_after(start_after)
+    docs = [d async for d in q.limit(limit).stream()]
+    items = []
     for d in docs:
-        m = d.to_dict() or {}
-        ts_ms = _to_ms(m.get("timestamp")) or 0
-        items.append({
-            "id": d.id,
-            "chat_id": chat_id,
-            "sender_id": m.get("sender_id"),
-            "receiver_id": m.get("receiver_id"),
-            "message": m.get("message"),
-            "file_url": m.get("file_url"),
-            "file_type": m.get("file_type"),
-            "file_name": m.get("file_name"),
-            "timestamp": ts_ms,
-        })
-
-    items.sort(key=lambda x: x["timestamp"])
-    if before_ts:
-        items = [i for i in items if i["timestamp"] and i["timestamp"] < before_ts]
-    return items
+        chat_ref = d.reference.parent.parent
+        if chat_ref is None or chat_ref.parent.id != "chats":
+            continue
+        items.append({**_message_to_dict(chat_ref.id, d), "t": _message_key(d)[0]})
+    return items, (docs[-1] if docs else None)
+
+def watch_chat_changes(on_message: Callable[[Dict[str, Any]], Any],
+                       on_chat: Callable[[Dict[str, Any]], Any]) -> List[Any]:
+    """
+    Registra listeners `on_snapshot` para mensagens novas (collection group `messages`)
+    e metadados de chat alterados a partir de agora. Os callbacks rodam na thread do
+    listener do Firestore. Retorna os watches (use `.unsubscribe()` para encerrar).
+    Usa o cliente síncrono: `on_snapshot` não existe no AsyncClient.
+    """
+    since_ms = _now_ms()
+
+    def _on_messages(_snapshots, changes, _read_time):
+        for change in changes:
+            if change.type.name != "ADDED":
+                continue
+            doc = change.document
+            chat_ref = doc.reference.parent.parent
+            if chat_ref is None or chat_ref.parent.id != "chats":
+                continue
+            try:
+                on_message(_message_to_dict(chat_ref.id, doc))
+            except Exception as e:
+                logger.warning("Falha ao repassar mensagem %s: %s", doc.id, e)
+
+    def _on_chats(_snapshots, changes, _read_time):
+        for change in changes:
+            if change.type.name == "REMOVED":
+                continue
+            doc = change.document
+            try:
+                on_chat(_chat_to_dict(doc.id, doc.to_dict() or {}))
+            except Exception as e:
+                logger.warning("Falha ao repassar chat %s: %s", doc.id, e)
+
+    messages_watch = db.collection_group("messages")\
+                       .where("timestamp", ">=", _from_ms(since_ms))\
+                       .on_snapshot(_on_messages)
+    chats_watch = db.collection("chats")\
+                    .where("updated_at", ">=", _from_ms(since_ms))\
+                    .on_snapshot(_on_chats)
+    return [messages_watch, chats_watch]
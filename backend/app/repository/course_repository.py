@@ -1,16 +1,16 @@
-from app.database.db import Db
+from app.database.db import AsyncDb
 
-def get_all_courses_raw():
-    return Db.query("courses")
+async def get_all_courses_raw():
+    return await AsyncDb.query("courses")
 
-def get_course(course_id: str):
-    return Db.get("courses", course_id)
+async def get_course(course_id: str):
+    return await AsyncDb.get("courses", course_id)
 
-def create_course(course_id: str, data: dict):
-    return Db.create("courses", course_id, data)
+async def create_course(course_id: str, data: dict):
+    return await AsyncDb.create("courses", course_id, data)
 
-def update_course(course_id: str, data: dict):
-    return Db.update("courses", course_id, data)
+async def update_course(course_id: str, data: dict):
+    return await AsyncDb.update("courses", course_id, data)
 
-def delete_course(course_id: str):
-    return Db.delete("courses", course_id)
\ No newline at end of file
+async def delete_course(course_id: str):
+    return await AsyncDb.delete("courses", course_id)
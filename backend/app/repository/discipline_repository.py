@@ -1,16 +1,23 @@
-from app.database.db import Db
+from app.database.db import AsyncDb
 
-def get_disciplines_for_course(course_id: str):
-    return Db.list_subcollection("courses", course_id, "disciplines")
+async def get_disciplines_for_course(course_id: str):
+    return await AsyncDb.list_subcollection("courses", course_id, "disciplines")
 
-def get_discipline(course_id: str, discipline_id: str):
-    return Db.get(f"courses/{course_id}/disciplines", discipline_id)
+async def get_disciplines_by_course():
+    """Todas as disciplinas do catálogo numa única query, agrupadas pelo curso pai."""
+    grouped = {}
+    for course_id, data in await AsyncDb.collection_group("disciplines", parent_collection="courses"):
+        grouped.setdefault(course_id, []).append(data)
+    return grouped
 
-def create_discipline(course_id: str, discipline_id: str, data: dict):
-    return Db.create(f"courses/{course_id}/disciplines", discipline_id, data)
+async def get_discipline(course_id: str, discipline_id: str):
+    return await AsyncDb.get(f"courses/{course_id}/disciplines", discipline_id)
 
-def update_discipline(course_id: str, discipline_id: str, data: dict):
-    return Db.update(f"courses/{course_id}/disciplines", discipline_id, data)
+async def create_discipline(course_id: str, discipline_id: str, data: dict):
+    return await AsyncDb.create(f"courses/{course_id}/disciplines", discipline_id, data)
 
-def delete_discipline(course_id: str, discipline_id: str):
-    return Db.delete(f"courses/{course_id}/disciplines", discipline_id)
+async def update_discipline(course_id: str, discipline_id: str, data: dict):
+    return await AsyncDb.update(f"courses/{course_id}/disciplines", discipline_id, data)
+
+async def delete_discipline(course_id: str, discipline_id: str):
+    return await AsyncDb.delete(f"courses/{course_id}/disciplines", discipline_id)
@@ -0,0 +1,120 @@
+"""
+Arquivo das mensagens antigas dos chats: blocos imutáveis no Storage + índice no Firestore.
+
+Mensagens com mais de MESSAGE_ARCHIVE_AGE_DAYS dias são empacotadas em blocos de
+MESSAGE_ARCHIVE_CHUNK_SIZE mensagens: um objeto JSON Lines comprimido com gzip por
+bloco, em `{MESSAGE_ARCHIVE_PREFIX}/{chat_id}/{t}-{id}.jsonl.gz`, nunca reescrito.
+O documento `chats/{chat_id}/archive/index` lista os blocos em ordem cronológica
+(primeira e última chave de cada um), então ler o histórico antigo custa um download
+por bloco em vez de uma leitura por mensagem.
+
+Os documentos das mensagens arquivadas só são apagados numa execução seguinte, depois
+de MESSAGE_ARCHIVE_DELETE_GRACE_SECONDS: até lá os caches do índice já expiraram em
+todos os processos e nenhum deles lê uma página sem as mensagens arquivadas.
+
+O job fica em `chat_repository.archive_chat_messages` (CLI: python -m app.scripts.archive_messages)
+e a leitura transparente em `chat_repository.list_messages`.
+"""
+import os
+import gzip
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from cachetools import LRUCache
+from fastapi.concurrency import run_in_threadpool
+
+from app.cache.shared_cache import shared_cache
+from app.firebase.firestore_client import async_db
+from app.firebase.firebase_storage import store_private_bytes, read_private_bytes
+
+MESSAGE_ARCHIVE_AGE_DAYS = float(os.getenv("MESSAGE_ARCHIVE_AGE_DAYS", "90"))
+MESSAGE_ARCHIVE_CHUNK_SIZE = int(os.getenv("MESSAGE_ARCHIVE_CHUNK_SIZE", "500"))
+MESSAGE_ARCHIVE_PREFIX = os.getenv("MESSAGE_ARCHIVE_PREFIX", "chat-archive")
+ARCHIVE_INDEX_CACHE_TTL_SECONDS = float(os.getenv("ARCHIVE_INDEX_CACHE_TTL_SECONDS", "600"))
+# precisa ser maior que o TTL do cache do índice (processos sem o barramento de invalidação)
+MESSAGE_ARCHIVE_DELETE_GRACE_SECONDS = float(os.getenv(
+    "MESSAGE_ARCHIVE_DELETE_GRACE_SECONDS", str(2 * ARCHIVE_INDEX_CACHE_TTL_SECONDS)))
+# blocos descomprimidos mantidos em memória (são imutáveis: nunca invalidados)
+ARCHIVE_CHUNK_CACHE_SIZE = int(os.getenv("ARCHIVE_CHUNK_CACHE_SIZE", "64"))
+
+# chave de ordenação das mensagens: (timestamp em µs, id do documento)
+Key = Tuple[int, str]
+# limites só por horário: (t, MIN_ID) fica antes e (t, MAX_ID) depois de qualquer mensagem em t
+MIN_ID, MAX_ID = "", "\U0010ffff"
+
+# chat_id -> índice ({} para chats sem arquivo)
+archive_index_cache = shared_cache("chat_archives", maxsize=20000, ttl=ARCHIVE_INDEX_CACHE_TTL_SECONDS)
+_chunk_cache: LRUCache = LRUCache(maxsize=ARCHIVE_CHUNK_CACHE_SIZE)
+
+def archive_cutoff_us(older_than_days: Optional[float] = None) -> int:
+    """Mensagens com timestamp anterior a isso (µs) podem estar arquivadas."""
+    days = MESSAGE_ARCHIVE_AGE_DAYS if older_than_days is None else older_than_days
+    return int((time.time() - days * 86400) * 1_000_000)
+
+def index_ref(chat_id: str):
+    return async_db.collection("chats").document(chat_id).collection("archive").document("index")
+
+async def load_index(chat_id: str) -> Dict[str, Any]:
+    """Índice lido do Firestore, sem cache ({} se o chat nunca foi arquivado)."""
+    snap = await index_ref(chat_id).get()
+    return (snap.to_dict() or {}) if snap.exists else {}
+
+async def get_index(chat_id: str) -> Dict[str, Any]:
+    index = archive_index_cache.get(chat_id)
+    if index is None:
+        generation = archive_index_cache.generation
+        index = await load_index(chat_id)
+        archive_index_cache.set(chat_id, index, generation=generation)
+    return index
+
+def chunk_key(chunk: Dict[str, Any], edge: str) -> Key:
+    return chunk[f"{edge}_t"], chunk[f"{edge}_id"]
+
+def chunk_path(chat_id: str, first: Key) -> str:
+    return f"{MESSAGE_ARCHIVE_PREFIX}/{chat_id}/{first[0]}-{first[1]}.jsonl.gz"
+
+def encode_chunk(records: List[Dict[str, Any]]) -> bytes:
+    lines = "\n".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) for r in records)
+    return gzip.compress(lines.encode("utf-8"))
+
+def decode_chunk(data: bytes) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in gzip.decompress(data).decode("utf-8").splitlines() if line]
+
+async def write_chunk(path: str, records: List[Dict[str, Any]]) -> int:
+    """Grava o bloco no Storage; retorna o tamanho comprimido."""
+    data = encode_chunk(records)
+    await run_in_threadpool(store_private_bytes, path, data, "application/gzip")
+    return len(data)
+
+async def read_chunk(path: str) -> List[Dict[str, Any]]:
+    records = _chunk_cache.get(path)
+    if records is None:
+        records = decode_chunk(await run_in_threadpool(read_private_bytes, path))
+        _chunk_cache[path] = records
+    return records
+
+def record_key(record: Dict[str, Any]) -> Key:
+    return record["t"], record["id"]
+
+async def read_archived(index: Dict[str, Any], lower: Optional[Key], upper: Optional[Key],
+                        limit: int, newest_first: bool) -> List[Dict[str, Any]]:
+    """
+    Até `limit` registros arquivados com lower < chave < upper (None: sem limite), a
+    partir do mais novo (`newest_first`) ou do mais antigo. Só baixa os blocos do intervalo.
+    """
+    chunks = index.get("chunks") or []
+    found: List[Dict[str, Any]] = []
+    for chunk in (reversed(chunks) if newest_first else chunks):
+        if lower is not None and chunk_key(chunk, "last") <= lower:
+            continue
+        if upper is not None and chunk_key(chunk, "first") >= upper:
+            continue
+        selected = [r for r in await read_chunk(chunk["path"])
+                    if (lower is None or record_key(r) > lower) and (upper is None or record_key(r) < upper)]
+        if newest_first:
+            selected.reverse()
+        found.extend(selected)
+        if len(found) >= limit:
+            break
+    return found[:limit]
@@ -1,33 +1,106 @@
-from typing import Any, Dict, List, Optional
-from app.firebase.firestore_client import db
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from app.cache.shared_cache import shared_cache
+from app.firebase.firestore_client import db, async_db
 
 COLLECTION = "users"
 
-def get_user_by_uid(uid: str) -> Optional[Dict[str, Any]]:
-    doc = db.collection(COLLECTION).document(uid).get()
+PUBLIC_PROFILE_FIELDS = ["name", "avatarUrl", "avatar_thumbs"]
+# campos lidos pelo índice de busca de monitores
+HELPER_FIELDS = ["name", "email", "avatarUrl", "avatar_thumbs", "helping_subjects", "last_active_at"]
+PUBLIC_PROFILE_CACHE_MAXSIZE = int(os.getenv("PUBLIC_PROFILE_CACHE_MAXSIZE", "5000"))
+PUBLIC_PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PUBLIC_PROFILE_CACHE_TTL_SECONDS", "120"))
+USER_VERSION_CACHE_TTL_SECONDS = float(os.getenv("USER_VERSION_CACHE_TTL_SECONDS", "60"))
+
+# LRU + TTL de perfis públicos (uid -> {uid, name, avatarUrl} ou None se o usuário não existe)
+public_profile_cache = shared_cache("public_profiles", maxsize=PUBLIC_PROFILE_CACHE_MAXSIZE,
+                                    ttl=PUBLIC_PROFILE_CACHE_TTL_SECONDS)
+
+# versão (update_time) do documento de cada usuário: If-None-Match de /user/me sem ler o Firestore
+user_version_cache = shared_cache("user_versions", maxsize=PUBLIC_PROFILE_CACHE_MAXSIZE,
+                                  ttl=USER_VERSION_CACHE_TTL_SECONDS)
+
+async def get_user_with_version(uid: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Documento do usuário e sua versão (update_time em µs), ou (None, None)."""
+    generation = user_version_cache.generation
+    doc = await async_db.collection(COLLECTION).document(uid).get()
     if not doc.exists:
-        return None
+        return None, None
     data = doc.to_dict() or {}
     data["uid"] = uid
+    version = None
+    if doc.update_time is not None:
+        version = str(int(doc.update_time.timestamp() * 1_000_000))
+        user_version_cache.set(uid, version, generation=generation)
+    return data, version
+
+async def get_user_by_uid(uid: str) -> Optional[Dict[str, Any]]:
+    data, _ = await get_user_with_version(uid)
     return data
 
-def create_user(uid: str, payload: Dict[str, Any]) -> None:
-    db.collection(COLLECTION).document(uid).set(payload)
+async def create_user(uid: str, payload: Dict[str, Any]) -> None:
+    await async_db.collection(COLLECTION).document(uid).set(payload)
+    user_version_cache.invalidate([uid])
+
+async def update_user(uid: str, payload: Dict[str, Any]) -> None:
+    await async_db.collection(COLLECTION).document(uid).update(payload)
+    user_version_cache.invalidate([uid])
 
-def update_user(uid: str, payload: Dict[str, Any]) -> None:
-    db.collection(COLLECTION).document(uid).update(payload)
+def _helpers_query(client):
+    # só quem ajuda em alguma disciplina (lista não vazia)
+    return client.collection(COLLECTION).where("helping_subjects", "!=", []).select(HELPER_FIELDS)
 
-def list_helpers_by_subject(subject: str) -> List[Dict[str, Any]]:
-    q = db.collection(COLLECTION).where("helping_subjects", "array_contains", subject)
-    docs = q.stream()
+async def list_helper_profiles() -> List[Dict[str, Any]]:
+    """Todos os usuários com `helping_subjects`, só com os campos da busca de monitores."""
     out: List[Dict[str, Any]] = []
-    for d in docs:
-        u = d.to_dict() or {}
-        out.append({
-            "uid": u.get("uid", d.id),
-            "name": u.get("name"),
-            "email": u.get("email"),
-            "avatarUrl": u.get("avatarUrl"),
-            "helping_subjects": u.get("helping_subjects", []),
-        })
+    async for d in _helpers_query(async_db).stream():
+        out.append({**(d.to_dict() or {}), "uid": d.id})
     return out
+
+def watch_helper_profiles(on_change: Callable[[str, Optional[Dict[str, Any]]], Any],
+                          on_ready: Callable[[], Any]):
+    """
+    Listener `on_snapshot` sobre os monitores: `on_change(uid, dados)` a cada documento
+    novo/alterado e `on_change(uid, None)` quando sai da query. O primeiro snapshot traz
+    todos os documentos e termina com `on_ready()`. Retorna o watch (`.unsubscribe()`).
+    """
+    def _on_snapshot(_snapshots, changes, _read_time):
+        for change in changes:
+            doc = change.document
+            removed = change.type.name == "REMOVED"
+            on_change(doc.id, None if removed else {**(doc.to_dict() or {}), "uid": doc.id})
+        on_ready()
+
+    return _helpers_query(db).on_snapshot(_on_snapshot)
+
+def public_profile(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Parte pública do perfil (o que outros usuários podem ver)."""
+    return {
+        "name": user.get("name"),
+        "avatarUrl": user.get("avatarUrl"),
+        "avatar_thumbs": user.get("avatar_thumbs") or {},
+    }
+
+def invalidate_public_profile(uid: str) -> None:
+    public_profile_cache.invalidate([uid])
+
+async def get_public_profiles(uids: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Perfis públicos (nome/avatar) na ordem dos uids, ignorando os inexistentes.
+    O que não está no cache é lido num único `get_all` com máscara de campos.
+    """
+    uids = list(uids)
+    profiles: Dict[str, Optional[Dict[str, Any]]] = public_profile_cache.get_many(uids)
+    missing = [uid for uid in uids if uid not in profiles]
+
+    if missing:
+        generation = public_profile_cache.generation
+        refs = [async_db.collection(COLLECTION).document(uid) for uid in missing]
+        fetched: Dict[str, Optional[Dict[str, Any]]] = {uid: None for uid in missing}
+        async for snap in async_db.get_all(refs, field_paths=PUBLIC_PROFILE_FIELDS):
+            if snap.exists:
+                fetched[snap.id] = {"uid": snap.id, **public_profile(snap.to_dict() or {})}
+        public_profile_cache.set_many(fetched, generation=generation)
+        profiles.update(fetched)
+
+    return [profiles[uid] for uid in uids if profiles.get(uid)]
@@ -1,36 +1,120 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, Query, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Query, HTTPException, Response, WebSocket, WebSocketDisconnect, status
 from typing import Optional, List
-from app.auth.auth import get_current_user
-from app.models.chat_models import CreateChatRequest, ChatMeta, SendMessageResponse, MessageDTO
-from app.services.chat_service import create_or_get_chat, send_message_service
-from app.repository.chat_repository import list_user_chats, list_messages
+from app.auth.auth import get_current_user, verify_token
+from app.models.chat_models import (
+    CreateChatRequest, ChatMeta, SendMessageResponse, MessageDTO, UploadUrlRequest, FinalizeMessageRequest,
+    ChatSyncResponse, MessageSearchHit,
+)
+from app.models.models import SignedUploadModel
+from app.services.chat_service import (
+    create_or_get_chat, send_message_service, create_chat_upload, send_uploaded_file_message, sync_user_chats,
+    list_chats_for_user, mark_read, search_messages,
+)
+from app.repository.chat_repository import list_messages, cached_messages_version, get_messages_version
+from app.api.conditional import ConditionalGet
+from app.realtime.chat_hub import chat_hub, Subscription
+from app.firebase.firebase_storage import UploadTooLargeError
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+# o corpo continua sendo a lista de mensagens; o cursor da próxima página vai no header
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# intervalo de ping quando não há eventos, para manter proxies/load balancers com a conexão aberta
+WS_PING_INTERVAL_SECONDS = 25
+
 @router.post("/create", response_model=str)
-def create_chat(req: CreateChatRequest, user=Depends(get_current_user)):
+async def create_chat(req: CreateChatRequest, user=Depends(get_current_user)):
     uid = user["uid"]
     other = req.other_user_id
     if not other or other == uid:
         raise HTTPException(status_code=400, detail="other_user_id inválido")
-    return create_or_get_chat(uid, other)
+    return await create_or_get_chat(uid, other)
 
 @router.get("/user/{user_id}", response_model=List[ChatMeta])
-def user_chats(user_id: str, user=Depends(get_current_user)):
+async def user_chats(
+    user_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devolvido em X-Next-Cursor"),
+    user=Depends(get_current_user),
+):
     if user_id != user["uid"]:
         raise HTTPException(status_code=403, detail="Unauthorized")
-    items = list_user_chats(user_id)
-    return [ChatMeta(**{
-        "id": i["id"],
-        "participants": i["participants"],
-        "last_message": i.get("last_message"),
-        "last_sender": i.get("last_sender"),
-        "updated_at": i.get("updated_at", 0),
-    }) for i in items]
+    try:
+        items, next_cursor = await list_chats_for_user(user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [ChatMeta(**i) for i in items]
+
+@router.post("/{chat_id}/read", status_code=204)
+async def mark_chat_read(chat_id: str, user=Depends(get_current_user)):
+    """Zera o contador de não lidas do usuário neste chat."""
+    try:
+        await mark_read(chat_id, user["uid"])
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    return Response(status_code=204)
+
+@router.get("/sync", response_model=ChatSyncResponse)
+async def sync_chats(
+    since: int = Query(0, ge=0, description="Epoch ms da última sincronização (next_since anterior)"),
+    limit: int = Query(50, ge=1, le=100, description="Máximo de chats por resposta"),
+    messages_per_chat: int = Query(50, ge=1, le=100),
+    user=Depends(get_current_user),
+):
+    """Sincronização incremental: chats alterados e mensagens novas desde `since`, numa resposta só."""
+    return await sync_user_chats(user["uid"], since, chat_limit=limit, messages_per_chat=messages_per_chat)
+
+@router.get("/search", response_model=List[MessageSearchHit])
+async def search_chat_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="Termos; o último vale como prefixo"),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devolvido em X-Next-Cursor"),
+    chat_id: Optional[str] = Query(None, description="Restringe a busca a um chat"),
+    user=Depends(get_current_user),
+):
+    """Busca nas mensagens dos chats do usuário, da mais recente para a mais antiga."""
+    try:
+        items, next_cursor = await search_messages(user["uid"], q, limit=limit, cursor=cursor, chat_id=chat_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return [MessageSearchHit(**i) for i in items]
 
 @router.get("/messages/{chat_id}", response_model=List[MessageDTO])
-def get_messages(chat_id: str, limit: int = Query(20, ge=1, le=50), before: Optional[int] = Query(None), user=Depends(get_current_user)):
-    items = list_messages(chat_id, limit=limit, before_ts=before)
+async def get_messages(
+    chat_id: str,
+    response: Response,
+    limit: int = Query(20, ge=1, le=50),
+    before: Optional[int] = Query(None, description="Mensagens anteriores a este epoch ms"),
+    after: Optional[int] = Query(None, description="Mensagens posteriores a este epoch ms"),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devolvido em X-Next-Cursor"),
+    conditional: ConditionalGet = Depends(),
+    user=Depends(get_current_user),
+):
+    # a página é identificada pelos parâmetros; a versão muda a cada escrita nas mensagens do chat
+    page = ("messages", chat_id, limit, before, after, cursor)
+    version = cached_messages_version(chat_id)
+    if version is not None:
+        conditional.not_modified(*page, version)
+    version = await get_messages_version(chat_id)
+    conditional.check(*page, version)
+    try:
+        items, next_cursor = await list_messages(chat_id, limit=limit, before_ts=before, after_ts=after, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return [MessageDTO(**i) for i in items]
 
 @router.post("/send/{chat_id}", response_model=SendMessageResponse)
@@ -41,12 +125,79 @@ async def send_message(
     file: Optional[UploadFile] = File(None),
     user=Depends(get_current_user)
 ):
-    file_bytes = None
-    filename = None
-    content_type = None
-    if file:
-        file_bytes = await file.read()
-        filename = file.filename
-        content_type = file.content_type
-    mid = send_message_service(chat_id, user["uid"], receiver_id, text, file_bytes, filename, content_type)
+    try:
+        if file:
+            # o arquivo segue como stream (spool do UploadFile), sem await file.read()
+            mid = await send_message_service(chat_id, user["uid"], receiver_id, text,
+                                             file.file, file.filename, file.content_type, file.size)
+        else:
+            mid = await send_message_service(chat_id, user["uid"], receiver_id, text, None, None, None)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return {"message_id": mid, "chat_id": chat_id}
+
+@router.post("/upload-url/{chat_id}", response_model=SignedUploadModel)
+async def chat_upload_url(chat_id: str, req: UploadUrlRequest, user=Depends(get_current_user)):
+    """Upload direto, passo 1: URL assinada para enviar o arquivo ao Storage sem passar pela API."""
+    try:
+        return await create_chat_upload(chat_id, user["uid"], req.file_name, req.content_type, req.size)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+@router.post("/send/{chat_id}/finalize", response_model=SendMessageResponse)
+async def finalize_file_message(chat_id: str, req: FinalizeMessageRequest, user=Depends(get_current_user)):
+    """Upload direto, passo 2: registra a mensagem com o arquivo já enviado ao Storage."""
+    try:
+        mid = await send_uploaded_file_message(chat_id, user["uid"], req.receiver_id, req.text,
+                                               req.object_path, req.file_name)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     return {"message_id": mid, "chat_id": chat_id}
+
+async def _push_events(websocket: WebSocket, sub: Subscription):
+    while True:
+        try:
+            event = await asyncio.wait_for(sub.queue.get(), timeout=WS_PING_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            event = {"type": "ping"}
+        await websocket.send_json(event)
+
+async def _drain_client(websocket: WebSocket):
+    # o cliente só manda pings; receber aqui é o que detecta a desconexão
+    while True:
+        await websocket.receive_text()
+
+@router.websocket("/ws")
+async def chat_updates(websocket: WebSocket, token: str = Query(...)):
+    """
+    Stream de atualizações do usuário autenticado (substitui o polling):
+    {"type": "message", "chat_id", "message": MessageDTO}, {"type": "chat", "chat": ChatMeta}
+    e {"type": "chat_read", "chat_id"} (o usuário leu o chat em outra conexão).
+    O token vai na query string porque o WebSocket do navegador não envia headers.
+    """
+    try:
+        user = await verify_token(token)
+    except Exception:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    sub = chat_hub.subscribe(user["uid"])
+    tasks = [asyncio.create_task(_push_events(websocket, sub)), asyncio.create_task(_drain_client(websocket))]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for t in done:
+            if not t.cancelled() and t.exception() and not isinstance(t.exception(), WebSocketDisconnect):
+                raise t.exception()
+    finally:
+        for t in tasks:
+            t.cancel()
+        chat_hub.unsubscribe(sub)
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
+from app.api.conditional import ConditionalGet
 from app.services.course_service import (
-    list_courses_with_disciplines,
+    get_catalogue,
+    cached_catalogue_version,
     create_new_course,
     get_course_by_id,
     update_course_by_id,
@@ -12,27 +14,33 @@ from app.models.models import CourseModel
 router = APIRouter(prefix="/courses", tags=["Cursos"])
 
 @router.get("/", response_model=list[CourseModel])
-def get_courses():
-    return list_courses_with_disciplines()
+async def get_courses(conditional: ConditionalGet = Depends()):
+    version = cached_catalogue_version()
+    if version:
+        # 304 direto da memória, sem ler o Firestore
+        conditional.not_modified("courses", version)
+    courses, version = await get_catalogue()
+    conditional.check("courses", version)
+    return courses
 
 @router.get("/{course_id}")
-def get_course(course_id: str):
-    course = get_course_by_id(course_id)
+async def get_course(course_id: str):
+    course = await get_course_by_id(course_id)
     if not course:
         raise HTTPException(status_code=404, detail="Curso não encontrado")
     return course
 
 @router.post("/{course_id}", status_code=status.HTTP_201_CREATED)
-def create_course(course_id: str, name: str):
-    create_new_course(course_id, name)
+async def create_course(course_id: str, name: str):
+    await create_new_course(course_id, name)
     return JSONResponse(status_code=201, content={"message": "Curso criado com sucesso", "data": {"id": course_id, "name": name}})
 
 @router.put("/{course_id}")
-def update_course(course_id: str, name: str):
-    update_course_by_id(course_id, name)
+async def update_course(course_id: str, name: str):
+    await update_course_by_id(course_id, name)
     return JSONResponse(status_code=200, content={"message": "Curso atualizado com sucesso", "data": {"id": course_id, "name": name}})
 
 @router.delete("/{course_id}")
-def delete_course(course_id: str):
-    delete_course_by_id(course_id)
+async def delete_course(course_id: str):
+    await delete_course_by_id(course_id)
     return JSONResponse(status_code=200, content={"message": "Curso removido com sucesso"})
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.auth.auth import require_admin
+from app.monitoring.profiling import loop_monitor
+
+router = APIRouter(prefix="/debug", tags=["Monitoramento"])
+
+@router.get("/profiles", include_in_schema=False)
+async def list_profiles(user=Depends(require_admin)):
+    """Perfis de requisições lentas e travamentos do event loop, do mais novo para o mais antigo."""
+    return {"profiling": loop_monitor.profiling, "stats": loop_monitor.stats(),
+            "profiles": loop_monitor.store.list()}
+
+@router.get("/profiles/{name}", include_in_schema=False)
+async def get_profile(
+    name: str,
+    format: str = Query("json", pattern="^(json|folded)$", description="folded: texto para flamegraph.pl/speedscope"),
+    user=Depends(require_admin),
+):
+    try:
+        profile = loop_monitor.store.read(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    if format == "folded":
+        # requisição: só as pilhas do código dela; travamento: todas
+        stacks = profile.get("own") if profile.get("kind") == "request" else profile.get("stacks")
+        return PlainTextResponse("".join(f"{s['stack']} {s['count']}\n" for s in stacks or []))
+    return profile
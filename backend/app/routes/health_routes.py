@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.firebase.warmup import readiness
+
+router = APIRouter(tags=["Monitoramento"])
+
+@router.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: o processo está de pé (não toca o Firebase)."""
+    return {"status": "ok"}
+
+@router.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: 200 depois do warm-up dos clientes do Firebase, 503 antes disso."""
+    state = await readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
@@ -0,0 +1,40 @@
+import os
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from app.auth.auth import get_token_cache_stats
+from app.cache.shared_cache import cache_stats
+from app.firebase.firebase_storage import get_upload_stats
+from app.monitoring.metrics import registry, gauge_lines
+from app.monitoring.profiling import loop_monitor
+from app.realtime.chat_hub import chat_hub
+from app.repository.chat_repository import chat_meta_writes
+from app.services.helper_search import helper_index
+from app.services.message_search import message_search
+
+router = APIRouter(tags=["Monitoramento"])
+
+# se definido, o scraper precisa mandar "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+def _process_stats():
+    yield from gauge_lines("auth_token_cache", "Cache de tokens verificados", get_token_cache_stats(), label="stat")
+    yield from gauge_lines("storage_uploads", "Totais de upload do processo", get_upload_stats(), label="stat")
+    yield from gauge_lines("chat_ws_connections", "Conexões WebSocket abertas", {"": chat_hub.connection_count()})
+    caches = cache_stats()
+    for stat in ("hits", "misses", "invalidations", "size"):
+        yield from gauge_lines(f"cache_{stat}", f"Caches compartilhados: {stat}",
+                               {name: values[stat] for name, values in caches.items()}, label="cache")
+    yield from gauge_lines("chat_meta_writes", "Fila de escrita dos metadados de chat", chat_meta_writes.stats(), label="stat")
+    yield from gauge_lines("helper_index", "Índice de busca de monitores", helper_index.stats(), label="stat")
+    yield from gauge_lines("message_search_index", "Índice de busca de mensagens", message_search.stats(), label="stat")
+    yield from gauge_lines("loop_monitor", "Monitor do event loop e perfis de requisições lentas", loop_monitor.stats(), label="stat")
+
+registry.add_collector(lambda: list(_process_stats()))
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Métricas agregadas no formato texto do Prometheus."""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Não autorizado")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
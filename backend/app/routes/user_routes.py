@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from pydantic import BaseModel, Field
 from typing import List, Optional, Any
-from app.firebase.firestore_client import db
 from app.auth.auth import get_current_user
+from app.api.conditional import ConditionalGet
 from app.services.user_service import (
     create_profile,
-    get_me,
+    get_me_with_version,
+    cached_me_version,
     update_me,
     get_helpers,
+    create_avatar_upload,
+    finalize_avatar_upload,
 )
+from app.repository.user_repository import get_public_profiles
+from app.firebase.firebase_storage import UploadTooLargeError
+from app.models.models import SignedUploadModel
+from app.routes.chat_routes import NEXT_CURSOR_HEADER
 
 router = APIRouter(prefix="/user", tags=["Usuários"])
 
@@ -16,9 +23,17 @@ helpers_router = APIRouter(prefix="/users", tags=["Usuários"])
 
 public_router = APIRouter(prefix="/users", tags=["Usuários"])
 
+PUBLIC_USERS_MAX_UIDS = 100
+
 class UserCreate(BaseModel):
     name: str = Field(..., min_length=3, description="Nome completo do usuário")
 
+class AvatarUploadRequest(BaseModel):
+    content_type: str = Field(..., description="MIME type da imagem, ex.: image/jpeg")
+
+class AvatarFinalizeRequest(BaseModel):
+    object_path: str
+
 class UserUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=3)
     helping_subjects: Optional[List[str]] = None
@@ -27,7 +42,7 @@ class UserUpdate(BaseModel):
 @router.post("/create", status_code=status.HTTP_201_CREATED, summary="Cria o perfil de um novo usuário no Firestore")
 async def create_user_profile(user_data: UserCreate, current_user: dict = Depends(get_current_user)):
     try:
-        return create_profile(
+        return await create_profile(
             uid=current_user.get("uid"),
             email=current_user.get("email"),
             name=user_data.name,
@@ -38,35 +53,85 @@ async def create_user_profile(user_data: UserCreate, current_user: dict = Depend
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
 
 @router.get("/me", summary="Obtém o perfil do usuário autenticado")
-async def get_my_profile(current_user: dict = Depends(get_current_user)):
+async def get_my_profile(conditional: ConditionalGet = Depends(), current_user: dict = Depends(get_current_user)):
+    uid = current_user.get("uid")
+    version = cached_me_version(uid)
+    if version:
+        conditional.not_modified("user", uid, version)
     try:
-        return get_me(current_user.get("uid"))
+        user, version = await get_me_with_version(uid)
     except LookupError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    if version:
+        conditional.check("user", uid, version)
+    return user
 
 @router.put("/me", summary="Atualiza o perfil do usuário autenticado")
 async def update_my_profile(update_data: UserUpdate, current_user: dict = Depends(get_current_user)):
     try:
-        updated = update_me(current_user.get("uid"), update_data.dict(exclude_unset=True))
+        updated = await update_me(current_user.get("uid"), update_data.dict(exclude_unset=True))
         return updated
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao atualizar perfil: {e}")
 
+@router.post("/me/avatar/upload-url", response_model=SignedUploadModel, summary="Gera URL assinada para enviar o avatar direto ao Storage")
+async def avatar_upload_url(req: AvatarUploadRequest, current_user: dict = Depends(get_current_user)):
+    try:
+        return await create_avatar_upload(current_user.get("uid"), req.content_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/me/avatar/finalize", summary="Registra o avatar enviado pela URL assinada")
+async def avatar_finalize(req: AvatarFinalizeRequest, current_user: dict = Depends(get_current_user)):
+    try:
+        return await finalize_avatar_upload(current_user.get("uid"), req.object_path)
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _helpers_page(subject: str, uid: str, limit: int, cursor: Optional[str],
+                        course_id: Optional[str], response: Response):
+    try:
+        items, next_cursor = await get_helpers(subject, uid, limit=limit, cursor=cursor, course_id=course_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return items
+
 @router.get("/helpers", summary="Lista estudantes que ajudam na disciplina informada (alias)")
 async def list_helpers_by_subject_alias(
-    subject: str = Query(..., min_length=1, description="Nome da disciplina"),
+    response: Response,
+    subject: str = Query(..., min_length=1, description="Nome ou id da disciplina"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devolvido em X-Next-Cursor"),
+    course_id: Optional[str] = Query(None, description="Curso do solicitante (prioriza monitores do mesmo curso)"),
     current_user: dict = Depends(get_current_user),
 ):
-    return get_helpers(subject, current_user.get("uid"))
+    return await _helpers_page(subject, current_user.get("uid"), limit, cursor, course_id, response)
 
 @helpers_router.get("/helpers", summary="Lista estudantes que ajudam na disciplina informada")
 async def list_helpers_by_subject(
-    subject: str = Query(..., min_length=1, description="Nome da disciplina"),
+    response: Response,
+    subject: str = Query(..., min_length=1, description="Nome ou id da disciplina"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Cursor opaco devolvido em X-Next-Cursor"),
+    course_id: Optional[str] = Query(None, description="Curso do solicitante (prioriza monitores do mesmo curso)"),
     current_user: dict = Depends(get_current_user),
 ):
-    return get_helpers(subject, current_user.get("uid"))
+    """
+    Monitores da disciplina, do mais relevante para o menos: mesmo curso do
+    solicitante, atividade recente, nome. Erros de acento/caixa/digitação no nome
+    da disciplina são tolerados. Próxima página: `cursor` com o valor de X-Next-Cursor.
+    """
+    return await _helpers_page(subject, current_user.get("uid"), limit, cursor, course_id, response)
 
 @public_router.get("/public", summary="Retorna nome/avatar públicos por lista de UIDs")
 async def get_public_users(
@@ -77,19 +142,13 @@ async def get_public_users(
     Exemplo: /users/public?uids=uidA,uidB,uidC
     Retorna: [{ uid, name, avatarUrl }]
     """
-    raw = [u.strip() for u in (uids or "").split(",") if u.strip()]
+    # remove repetidos mantendo a ordem
+    raw = list(dict.fromkeys(u.strip() for u in (uids or "").split(",") if u.strip()))
     if not raw:
         return []
-
-    users = []
-    for uid in raw:
-        doc = db.collection("users").document(uid).get()
-        if doc.exists:
-            d = doc.to_dict() or {}
-            users.append({
-                "uid": uid,
-                "name": d.get("name"),
-                "avatarUrl": d.get("avatarUrl"),
-            })
-    return users
-
+    if len(raw) > PUBLIC_USERS_MAX_UIDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {PUBLIC_USERS_MAX_UIDS} UIDs por requisição",
+        )
+    return await get_public_profiles(raw)
@@ -0,0 +1,47 @@
+"""
+Arquivamento das mensagens antigas dos chats em blocos no Storage.
+
+Uso (a partir de backend/):
+    python -m app.scripts.archive_messages [--dry-run] [--older-than-days 90] [--chunk-size 500] [--chat ID ...]
+
+Rode periodicamente (cron, Cloud Scheduler): as mensagens arquivadas por uma execução
+são apagadas do Firestore por uma execução seguinte (MESSAGE_ARCHIVE_DELETE_GRACE_SECONDS).
+"""
+import argparse
+import logging
+
+from app.cache.shared_cache import invalidation_bus
+from app.database.sync_compat import run_sync
+from app.repository.chat_repository import archive_chat_messages, archive_old_messages
+from app.repository.message_archive import MESSAGE_ARCHIVE_AGE_DAYS, MESSAGE_ARCHIVE_CHUNK_SIZE
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Arquiva as mensagens antigas dos chats.")
+    parser.add_argument("--dry-run", action="store_true", help="apenas conta o que seria arquivado/apagado")
+    parser.add_argument("--older-than-days", type=float, default=MESSAGE_ARCHIVE_AGE_DAYS,
+                        help="idade mínima das mensagens arquivadas (padrão: MESSAGE_ARCHIVE_AGE_DAYS)")
+    parser.add_argument("--chunk-size", type=int, default=MESSAGE_ARCHIVE_CHUNK_SIZE, help="mensagens por bloco")
+    parser.add_argument("--chat", action="append", default=[], help="arquiva só este chat (pode repetir)")
+    args = parser.parse_args()
+    # a API só procura no arquivo mensagens mais velhas que MESSAGE_ARCHIVE_AGE_DAYS
+    if args.older_than_days < MESSAGE_ARCHIVE_AGE_DAYS:
+        parser.error(f"--older-than-days não pode ser menor que MESSAGE_ARCHIVE_AGE_DAYS ({MESSAGE_ARCHIVE_AGE_DAYS:g})")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size precisa ser positivo")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    # avisa os servidores que o índice de arquivo dos chats mudou
+    invalidation_bus.start()
+    try:
+        if args.chat:
+            for chat_id in args.chat:
+                stats = run_sync(archive_chat_messages(chat_id, args.older_than_days, args.chunk_size, args.dry_run))
+                logging.info("Chat %s: %s", chat_id, stats)
+        else:
+            stats = run_sync(archive_old_messages(args.older_than_days, args.chunk_size, args.dry_run))
+            logging.info("Arquivamento concluído: %s", stats)
+    finally:
+        invalidation_bus.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Backfill dos metadados de chat (last_message, last_sender, updated_at).
+
+Uso (a partir de backend/):
+    python -m app.scripts.backfill_chat_meta [--dry-run] [--batch-size 400]
+"""
+import argparse
+import logging
+
+from app.database.sync_compat import run_sync
+from app.repository.chat_repository import backfill_chat_meta
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Repara os metadados dos chats em lote.")
+    parser.add_argument("--dry-run", action="store_true", help="apenas conta os chats que seriam reparados")
+    parser.add_argument("--batch-size", type=int, default=400, help="escritas por WriteBatch (máx. 500)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    stats = run_sync(backfill_chat_meta(dry_run=args.dry_run, batch_size=min(max(args.batch_size, 1), 500)))
+    logging.info("Backfill concluído: %s", stats)
+
+if __name__ == "__main__":
+    main()
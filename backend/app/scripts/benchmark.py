@@ -0,0 +1,75 @@
+"""
+Benchmark offline dos endpoints principais, sobre o backend em memória
+(nunca toca um projeto Firebase real: FIRESTORE_BACKEND é forçado para "memory").
+
+Uso (a partir de backend/):
+    python -m app.scripts.benchmark [--requests 300] [--concurrency 10] [--latency-ms 0]
+                                    [--scenario courses --scenario chat_user ...]
+                                    [--save-baseline bench.json] [--compare bench.json] [--tolerance 0.25]
+
+Com --compare, sai com código 1 se algum cenário regrediu em relação ao baseline.
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import logging
+
+os.environ["FIRESTORE_BACKEND"] = "memory"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark dos endpoints sobre o Firestore em memória.")
+    parser.add_argument("--requests", type=int, default=300, help="requisições medidas por cenário")
+    parser.add_argument("--concurrency", type=int, default=10, help="requisições simultâneas")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latência artificial por chamada ao Firestore/Storage")
+    parser.add_argument("--scenario", action="append", help="roda só este cenário (pode repetir)")
+    parser.add_argument("--users", type=int, default=500, help="usuários na massa de dados")
+    parser.add_argument("--messages", type=int, default=200, help="mensagens no chat dos cenários")
+    parser.add_argument("--save-baseline", metavar="ARQUIVO", help="grava o resultado em JSON")
+    parser.add_argument("--compare", metavar="ARQUIVO", help="compara com um baseline salvo antes")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="piora relativa aceita em p95/vazão")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    from app.firebase.firestore_client import db, async_db, bucket
+    from app.benchmarks.dataset import seed_dataset
+    from app.benchmarks.suite import run_suite, compare_to_baseline, format_report
+    from app.main import app
+
+    # o app configura o logging em INFO; durante a medição só interessam avisos
+    logging.getLogger().setLevel(logging.WARNING)
+    dataset = seed_dataset(db, users=args.users, messages_per_chat=args.messages)
+    for client in (db, async_db, bucket):
+        client.latency_ms = args.latency_ms
+
+    report = asyncio.run(run_suite(app, db.store, dataset, requests=args.requests,
+                                   concurrency=args.concurrency, only=args.scenario))
+    report["config"] = {"requests": args.requests, "concurrency": args.concurrency,
+                        "latency_ms": args.latency_ms}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print(format_report(report, baseline))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nBaseline salvo em {args.save_baseline}")
+
+    if baseline is not None:
+        if baseline.get("config") != report["config"]:
+            print(f"\nAviso: configuração diferente do baseline ({baseline.get('config')})")
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressões:")
+            for r in regressions:
+                print(f"  - {r}")
+            sys.exit(1)
+        print("\nSem regressões em relação ao baseline.")
+
+if __name__ == "__main__":
+    main()
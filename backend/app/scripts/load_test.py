@@ -0,0 +1,84 @@
+"""
+Teste de carga com estudantes virtuais (app.benchmarks.load), offline: o app roda no
+próprio processo sobre o Firestore em memória ou, com --emulator, sobre o emulador
+do Firebase (FIRESTORE_EMULATOR_HOST precisa estar definido; a massa de dados é
+gravada nele). Os anexos vão para o Storage configurado: use também
+FIREBASE_STORAGE_EMULATOR_HOST ou tire send_file do --mix.
+
+Uso (a partir de backend/):
+    python -m app.scripts.load_test [--users 50] [--ramp-up 10] [--duration 60]
+                                    [--poll-interval 3] [--think-time 5]
+                                    [--mix send_text=30,send_file=5,helpers=10,chat_list=15,open_chat=40]
+                                    [--latency-ms 0] [--emulator] [--output carga.json]
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+import logging
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Teste de carga com estudantes virtuais.")
+    parser.add_argument("--users", type=int, default=50, help="estudantes simultâneos ao fim da rampa")
+    parser.add_argument("--ramp-up", type=float, default=10.0, help="segundos até todos os estudantes entrarem")
+    parser.add_argument("--duration", type=float, default=60.0, help="duração total em segundos (com a rampa)")
+    parser.add_argument("--poll-interval", type=float, default=3.0, help="segundos entre consultas da conversa aberta")
+    parser.add_argument("--think-time", type=float, default=5.0, help="segundos médios entre ações do estudante")
+    parser.add_argument("--mix", help="pesos das ações, ex.: send_text=30,send_file=5,helpers=10")
+    parser.add_argument("--window", type=float, default=5.0, help="janela da série temporal (segundos)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="latência artificial por chamada ao Firestore/Storage (backend em memória)")
+    parser.add_argument("--emulator", action="store_true", help="usa o emulador do Firebase em vez da memória")
+    parser.add_argument("--dataset-users", type=int, default=500, help="usuários na massa de dados")
+    parser.add_argument("--messages", type=int, default=200, help="mensagens no chat principal da massa de dados")
+    parser.add_argument("--output", metavar="ARQUIVO", help="grava o relatório em JSON")
+    args = parser.parse_args()
+
+    if args.emulator:
+        if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+            parser.error("--emulator exige FIRESTORE_EMULATOR_HOST (ex.: localhost:8080)")
+        os.environ["FIRESTORE_BACKEND"] = "firebase"
+    else:
+        # nunca toca um projeto Firebase real
+        os.environ["FIRESTORE_BACKEND"] = "memory"
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+
+    from app.firebase.firestore_client import db, async_db, bucket
+    from app.benchmarks.dataset import seed_dataset
+    from app.benchmarks.load import run_load, parse_mix, format_load_report
+    from app.main import app
+
+    try:
+        mix = parse_mix(args.mix) if args.mix else None
+    except ValueError as e:
+        parser.error(str(e))
+
+    # o app configura o logging em INFO; durante a medição só interessam avisos
+    logging.getLogger().setLevel(logging.WARNING)
+    dataset = seed_dataset(db, users=args.dataset_users, messages_per_chat=args.messages)
+    store = getattr(db, "store", None)
+    if store is not None:
+        for client in (db, async_db, bucket):
+            client.latency_ms = args.latency_ms
+
+    print(f"{args.users} estudantes, rampa de {args.ramp_up:.0f}s, {args.duration:.0f}s no total...", file=sys.stderr)
+    try:
+        report = asyncio.run(run_load(app, store, dataset, users=args.users, ramp_up=args.ramp_up,
+                                      duration=args.duration, poll_interval=args.poll_interval,
+                                      think_time=args.think_time, mix=mix, window=args.window, seed=args.seed))
+    except ValueError as e:
+        parser.error(str(e))
+    report["config"]["latency_ms"] = args.latency_ms
+    report["config"]["backend"] = "emulator" if args.emulator else "memory"
+    print(format_load_report(report))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nRelatório salvo em {args.output}")
+
+if __name__ == "__main__":
+    main()
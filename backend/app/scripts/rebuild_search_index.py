@@ -0,0 +1,36 @@
+"""
+Reconstrução offline do índice de busca de mensagens (GET /chat/search).
+
+Uso (a partir de backend/):
+    python -m app.scripts.rebuild_search_index [--output ARQUIVO] [--no-upload]
+
+Lê todas as mensagens (inclusive as arquivadas) e grava o snapshot no Storage
+(MESSAGE_SEARCH_INDEX_OBJECT) e/ou num arquivo local. Os servidores carregam o snapshot
+no startup e buscam só as mensagens gravadas depois dele.
+"""
+import argparse
+import logging
+
+from app.database.sync_compat import run_sync
+from app.services.message_search import message_search, MESSAGE_SEARCH_INDEX_FILE, MESSAGE_SEARCH_INDEX_OBJECT
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconstrói o índice de busca de mensagens.")
+    parser.add_argument("--output", default=MESSAGE_SEARCH_INDEX_FILE or None,
+                        help="grava também neste arquivo (padrão: MESSAGE_SEARCH_INDEX_FILE)")
+    parser.add_argument("--no-upload", action="store_true", help="não grava no Storage")
+    args = parser.parse_args()
+    if args.no_upload and not args.output:
+        parser.error("--no-upload exige --output")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    stats = run_sync(message_search.rebuild())
+    logging.info("Índice reconstruído: %s", stats)
+    if args.output:
+        logging.info("Gravado em %s (%d bytes)", args.output, message_search.save_file(args.output))
+    if not args.no_upload:
+        size = message_search.save_object(MESSAGE_SEARCH_INDEX_OBJECT)
+        logging.info("Gravado no Storage em %s (%d bytes)", MESSAGE_SEARCH_INDEX_OBJECT, size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Arquivamento periódico das mensagens antigas dos chats (opcional).
+
+Com MESSAGE_ARCHIVE_INTERVAL_HOURS > 0 o lifespan roda `archive_old_messages` nesse
+intervalo (a primeira vez só depois de um intervalo, para reinícios não dispararem o
+job). Não há trava entre processos: ative em um único processo ou rode o CLI por um
+agendador (python -m app.scripts.archive_messages).
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from app.repository.chat_repository import archive_old_messages
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_ARCHIVE_INTERVAL_HOURS = float(os.getenv("MESSAGE_ARCHIVE_INTERVAL_HOURS", "0"))
+
+class MessageArchiver:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    async def _run(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            started = time.perf_counter()
+            try:
+                stats = await archive_old_messages()
+            except Exception:
+                logger.exception("Falha no arquivamento de mensagens")
+                continue
+            self.last_run = {**stats, "seconds": round(time.perf_counter() - started, 1), "at": time.time()}
+            logger.info("Arquivamento de mensagens: %s", self.last_run)
+
+    def start(self) -> None:
+        if self._task is not None or MESSAGE_ARCHIVE_INTERVAL_HOURS <= 0:
+            return
+        self._task = asyncio.get_running_loop().create_task(
+            self._run(MESSAGE_ARCHIVE_INTERVAL_HOURS * 3600), name="message-archiver")
+        logger.info("Arquivamento de mensagens a cada %.1f h", MESSAGE_ARCHIVE_INTERVAL_HOURS)
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        # interromper no meio é seguro: o índice só aponta para blocos já gravados
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+message_archiver = MessageArchiver()
@@ -1,14 +1,96 @@
-from typing import Optional
+import os
+import uuid
+import time
+import asyncio
+import logging
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
 from urllib.parse import unquote
-from app.repository.chat_repository import chat_id_for, upsert_chat_meta, append_message
-from app.firebase.firebase_storage import upload_file_from_bytes
+from fastapi.concurrency import run_in_threadpool
+from app.repository.chat_repository import (
+    chat_id_for, chat_exists, upsert_chat_meta, append_message, update_message_fields,
+    list_user_chats, list_chats_changed_since, list_messages, mark_chat_read,
+)
+from app.repository.user_repository import get_public_profiles, public_profile
+from app.repository import attachment_repository
+from app.services.user_service import note_activity
+from app.firebase.firebase_storage import (
+    upload_stream, hash_stream, check_upload_size, create_signed_upload, finalize_upload, download_bytes,
+)
+from app.realtime.chat_hub import chat_hub
+from app.services.message_search import message_search, MESSAGE_SEARCH_ENABLED
+from app.services.image_service import is_processable, process_image, store_renditions, MAX_IMAGE_BYTES
 
-def create_or_get_chat(current_uid: str, other_uid: str) -> str:
+logger = logging.getLogger(__name__)
+
+# anexos enviados pela API ficam endereçados pelo conteúdo (deduplicados)
+ATTACHMENTS_PREFIX = "attachments"
+
+# a marca d'água do sync fica pelo menos isso atrás do relógio: commits em andamento
+# (updated_at = horário do commit, visível só depois dele) não se perdem
+SYNC_WATERMARK_LAG_MS = int(os.getenv("SYNC_WATERMARK_LAG_MS", "2000"))
+
+# tarefas de pós-processamento em andamento (referência forte até terminarem)
+_background_tasks: set = set()
+
+async def _profiles_for(uids) -> Dict[str, Dict[str, Any]]:
+    return {p["uid"]: public_profile(p) for p in await get_public_profiles(uids)}
+
+async def create_or_get_chat(current_uid: str, other_uid: str) -> str:
     cid = chat_id_for(current_uid, other_uid)
-    # cria/atualiza metadados iniciais com snake_case + updated_at ms
-    upsert_chat_meta(cid, [current_uid, other_uid], last_message=None, last_sender=None)
+    if await chat_exists(cid):
+        return cid
+    # chat novo: metadados iniciais já com nome/avatar dos dois
+    profiles = await _profiles_for([current_uid, other_uid])
+    await upsert_chat_meta(cid, [current_uid, other_uid], last_message=None, last_sender=None,
+                           participant_profiles=profiles)
     return cid
 
+async def _fill_missing_profiles(chats: List[Dict[str, Any]]) -> None:
+    """Chats antigos (sem participant_profiles): completa com uma única leitura em lote."""
+    missing = {uid for c in chats for uid in c["participants"] if uid not in c["participant_profiles"]}
+    if not missing:
+        return
+    profiles = await _profiles_for(missing)
+    for c in chats:
+        for uid in c["participants"]:
+            if uid not in c["participant_profiles"] and uid in profiles:
+                c["participant_profiles"][uid] = profiles[uid]
+
+def chat_view(uid: str, chat: Dict[str, Any]) -> Dict[str, Any]:
+    """Metadados do chat como o usuário `uid` os vê (ChatMeta): só o contador de não lidas dele."""
+    return {
+        "id": chat["id"],
+        "participants": chat["participants"],
+        "last_message": chat.get("last_message"),
+        "last_sender": chat.get("last_sender"),
+        "updated_at": chat.get("updated_at", 0),
+        "unread_count": int((chat.get("unread") or {}).get(uid) or 0),
+        "participant_profiles": chat.get("participant_profiles") or {},
+    }
+
+async def list_chats_for_user(uid: str, limit: int = 100,
+                              cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Lista de chats pronta para a tela: não lidas e perfis dos participantes numa query só."""
+    chats, next_cursor = await list_user_chats(uid, limit=limit, cursor=cursor)
+    await _fill_missing_profiles(chats)
+    return [chat_view(uid, c) for c in chats], next_cursor
+
+def _check_participant(chat_id: str, uid: str) -> None:
+    if uid not in chat_id.split("_"):
+        raise PermissionError("Usuário não participa deste chat")
+
+def _check_sender(chat_id: str, sender_id: str, receiver_id: str) -> None:
+    """O remetente participa do chat e o destinatário é o outro participante."""
+    _check_participant(chat_id, sender_id)
+    if chat_id_for(sender_id, receiver_id) != chat_id:
+        raise PermissionError("Destinatário não participa deste chat")
+
+async def mark_read(chat_id: str, uid: str) -> None:
+    _check_participant(chat_id, uid)
+    await mark_chat_read(chat_id, uid)
+    # outras conexões do mesmo usuário (ex.: outro dispositivo) zeram o badge
+    chat_hub.publish([uid], {"type": "chat_read", "chat_id": chat_id})
+
 def _kind_from(content_type: Optional[str], filename: Optional[str]) -> str:
     ct = (content_type or '').lower()
     name = (filename or '').lower()
@@ -24,21 +106,152 @@ def _kind_from(content_type: Optional[str], filename: Optional[str]) -> str:
         return 'Mídia'
     return 'Arquivo'
 
-def send_message_service(chat_id: str, sender_id: str, receiver_id: str, text: Optional[str],
-                         file_bytes: Optional[bytes], filename: Optional[str], content_type: Optional[str]) -> str:
+def _clean_filename(filename: str) -> str:
+    return unquote(filename).replace('\\', '').replace('/', '')
+
+async def send_message_service(chat_id: str, sender_id: str, receiver_id: str, text: Optional[str],
+                         file_obj: Optional[BinaryIO], filename: Optional[str], content_type: Optional[str],
+                         file_size: Optional[int] = None) -> str:
+    _check_sender(chat_id, sender_id, receiver_id)
     file_url = None
     ftype = None
     fname = None
+    file_thumbs = None
+    image_data = None
 
-    if file_bytes and filename:
-        clean_name = unquote(filename).replace('\\', '').replace('/', '')
-        path = f"chats/{chat_id}/{clean_name}"
-        file_url = upload_file_from_bytes(path, file_bytes, content_type or "application/octet-stream")
+    if file_obj is not None and filename and file_size != 0:
+        if file_size is not None:
+            check_upload_size(file_size)  # rejeita antes de ler o arquivo
         ftype = (content_type or "application/octet-stream")
-        fname = clean_name
+        fname = _clean_filename(filename)
+        attachment = await _store_attachment(file_obj, ftype)
+        file_url, file_thumbs = attachment["url"], attachment.get("thumbs")
+        path, digest = attachment["object_path"], attachment["digest"]
+
+        # o spool é fechado ao fim da requisição: lê a imagem agora, processa depois
+        if not file_thumbs and is_processable(ftype) and attachment["size"] <= MAX_IMAGE_BYTES:
+            image_data = await run_in_threadpool(_read_spool, file_obj)
 
-    mid, _ = append_message(chat_id, sender_id, receiver_id, text, file_url, ftype, fname)
+    mid = await _record_message(chat_id, sender_id, receiver_id, text, file_url, ftype, fname, file_thumbs)
+    if image_data:
+        _spawn(_attach_thumbnails(chat_id, mid, [sender_id, receiver_id], path, image_data, digest=digest))
+    return mid
 
+async def _store_attachment(file_obj: BinaryIO, content_type: str) -> Dict[str, Any]:
+    """
+    Grava o anexo endereçado pelo conteúdo (attachments/{sha256}). Se o mesmo
+    conteúdo já foi enviado (por qualquer chat), não sobe de novo: só soma uma
+    referência no índice e reaproveita a URL (e as miniaturas, se houver).
+    """
+    digest, size = await run_in_threadpool(hash_stream, file_obj)
+    existing = await attachment_repository.get_attachment(digest)
+    if existing:
+        await attachment_repository.add_reference(digest)
+        return {**existing, "digest": digest}
+
+    path = f"{ATTACHMENTS_PREFIX}/{digest}"
+    # envia o spool do UploadFile em chunks, fora do event loop
+    url = await run_in_threadpool(upload_stream, path, file_obj, content_type, size)
+    attachment = {"object_path": path, "url": url, "size": size, "content_type": content_type}
+    await attachment_repository.register_attachment(digest, attachment)
+    return {**attachment, "digest": digest}
+
+async def create_chat_upload(chat_id: str, uid: str, filename: str, content_type: Optional[str],
+                             file_size: Optional[int] = None) -> Dict[str, Any]:
+    """Passo 1 do upload direto: URL assinada restrita a chats/{chat_id}/ (só para participantes)."""
+    _check_participant(chat_id, uid)
+    if file_size is not None:
+        check_upload_size(file_size)
+    path = f"chats/{chat_id}/{uuid.uuid4()}/{_clean_filename(filename)}"
+    return await run_in_threadpool(create_signed_upload, path, content_type)
+
+async def send_uploaded_file_message(chat_id: str, sender_id: str, receiver_id: str, text: Optional[str],
+                                     object_path: str, filename: Optional[str]) -> str:
+    """Passo 2 do upload direto: confere o objeto enviado e grava a mensagem."""
+    _check_sender(chat_id, sender_id, receiver_id)
+    if not object_path.startswith(f"chats/{chat_id}/"):
+        raise PermissionError("Arquivo não pertence a este chat")
+    uploaded = await run_in_threadpool(finalize_upload, object_path)
+    fname = _clean_filename(filename) if filename else object_path.rsplit("/", 1)[-1]
+    mid = await _record_message(chat_id, sender_id, receiver_id, text,
+                                uploaded["url"], uploaded["content_type"], fname)
+    if is_processable(uploaded["content_type"]) and uploaded["size"] <= MAX_IMAGE_BYTES:
+        _spawn(_attach_thumbnails(chat_id, mid, [sender_id, receiver_id], object_path))
+    return mid
+
+async def sync_user_chats(uid: str, since_ms: int, chat_limit: int = 50,
+                          messages_per_chat: int = 50) -> Dict[str, Any]:
+    """
+    Tudo o que mudou para o usuário desde `since_ms`: os chats com updated_at > since
+    (uma query indexada) e, para cada um, as mensagens novas desde então (até
+    `messages_per_chat`, buscadas em paralelo). `next_since` é a marca d'água da próxima chamada.
+
+    Um commit só fica visível depois do horário que ele grava em updated_at, então
+    `next_since` nunca passa de agora - SYNC_WATERMARK_LAG_MS: mensagens desse intervalo
+    podem vir de novo na chamada seguinte (o cliente deduplica pelo id).
+    """
+    chats = await list_chats_changed_since(uid, since_ms, limit=chat_limit)
+    await _fill_missing_profiles(chats)
+    pages = await asyncio.gather(*[
+        list_messages(c["id"], limit=messages_per_chat, after_ts=since_ms) for c in chats
+    ])
+
+    next_since = since_ms
+    entries = []
+    for chat, (messages, cursor) in zip(chats, pages):
+        next_since = max([next_since, chat.get("updated_at") or 0] + [m["timestamp"] for m in messages])
+        entries.append({
+            "chat": chat_view(uid, chat),
+            "messages": messages,
+            "messages_cursor": cursor if len(messages) == messages_per_chat else None,
+        })
+    next_since = max(since_ms, min(next_since, int(time.time() * 1000) - SYNC_WATERMARK_LAG_MS))
+    # página cheia presa no intervalo recente: a próxima chamada repetiria a mesma
+    has_more = len(chats) == chat_limit and next_since > since_ms
+    return {"chats": entries, "next_since": next_since, "has_more": has_more}
+
+async def search_messages(uid: str, q: str, limit: int = 20, cursor: Optional[str] = None,
+                          chat_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Busca no histórico dos chats do usuário (índice em memória, sem ler o Firestore)."""
+    if not MESSAGE_SEARCH_ENABLED:
+        raise RuntimeError("Busca de mensagens desativada")
+    return await message_search.search(uid, q, limit=limit, cursor=cursor, chat_id=chat_id)
+
+def _read_spool(file_obj: BinaryIO) -> bytes:
+    file_obj.seek(0)
+    return file_obj.read()
+
+def _spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def _attach_thumbnails(chat_id: str, message_id: str, participants: list, object_path: str,
+                             image_data: Optional[bytes] = None, digest: Optional[str] = None) -> None:
+    """
+    Gera as miniaturas da foto em segundo plano e grava `file_thumbs` na mensagem.
+    A mensagem já foi entregue com o original; os clientes recebem as miniaturas
+    depois, pelo evento "message_thumbs" do WebSocket.
+    """
+    try:
+        if image_data is None:
+            image_data = await run_in_threadpool(download_bytes, object_path, MAX_IMAGE_BYTES)
+        processed = await process_image(image_data)
+        if not processed or not processed["renditions"]:
+            return
+        thumbs = await store_renditions(object_path, processed["renditions"])
+        await update_message_fields(chat_id, message_id, {"file_thumbs": thumbs})
+        if digest:
+            # próximos envios do mesmo conteúdo já nascem com as miniaturas
+            await attachment_repository.set_thumbs(digest, thumbs)
+        chat_hub.publish(participants, {"type": "message_thumbs", "chat_id": chat_id,
+                                        "message_id": message_id, "file_thumbs": thumbs})
+    except Exception as e:
+        logger.warning("Falha ao gerar miniaturas de %s: %s", object_path, e)
+
+async def _record_message(chat_id: str, sender_id: str, receiver_id: str, text: Optional[str],
+                          file_url: Optional[str], ftype: Optional[str], fname: Optional[str],
+                          file_thumbs: Optional[Dict[str, str]] = None) -> str:
     if text and text.strip():
         preview = text.strip()[:120]
     elif file_url:
@@ -46,5 +259,27 @@ def send_message_service(chat_id: str, sender_id: str, receiver_id: str, text: O
     else:
         preview = 'Mensagem'
 
-    upsert_chat_meta(chat_id, [sender_id, receiver_id], preview, sender_id)
+    # mensagem + metadados do chat (não lidas, updated_at, messages_version) num único commit
+    mid, ts_ms, meta = await append_message(chat_id, sender_id, receiver_id, text, file_url, ftype, fname,
+                                            preview, file_thumbs)
+    # atividade recente conta no ranking de monitores
+    _spawn(note_activity(sender_id))
+
+    message = {
+        "id": mid,
+        "chat_id": chat_id,
+        "sender_id": sender_id,
+        "receiver_id": receiver_id,
+        "message": text,
+        "file_url": file_url,
+        "file_type": ftype,
+        "file_name": fname,
+        "file_thumbs": file_thumbs,
+        "timestamp": ts_ms,
+    }
+    if MESSAGE_SEARCH_ENABLED:
+        message_search.add(message)
+    # avisa as conexões abertas dos participantes (WebSocket /chat/ws)
+    chat_hub.publish_message(message)
+    chat_hub.publish_chat(meta)
     return mid
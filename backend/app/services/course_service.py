@@ -1,23 +1,76 @@
+import os
+import json
+import asyncio
+import hashlib
+from typing import Optional, Tuple
+
+from app.cache.shared_cache import shared_cache
 from app.models.models import CourseModel, DisciplineModel
 from app.repository import course_repository, discipline_repository
 
-def list_courses_with_disciplines() -> list[CourseModel]:
-    raw_courses = course_repository.get_all_courses_raw()
+# Snapshot em memória do catálogo completo (cursos + disciplinas).
+# O catálogo quase nunca muda: as escritas de course_service e discipline_service
+# invalidam o cache neste e nos outros workers; o TTL é só uma rede de segurança.
+CATALOGUE_CACHE_TTL_SECONDS = float(os.getenv("CATALOGUE_CACHE_TTL_SECONDS", "300"))
+
+_CATALOGUE_KEY = "all"
+catalogue_cache = shared_cache("catalogue", maxsize=1, ttl=CATALOGUE_CACHE_TTL_SECONDS)
+
+def invalidate_catalogue_cache() -> None:
+    catalogue_cache.invalidate()
+
+async def _load_catalogue() -> list[CourseModel]:
+    raw_courses, disciplines_by_course = await asyncio.gather(
+        course_repository.get_all_courses_raw(),
+        discipline_repository.get_disciplines_by_course(),
+    )
     result = []
     for c in raw_courses:
-        disciplines_raw = discipline_repository.get_disciplines_for_course(c["id"])
-        disciplines = [DisciplineModel(**d) for d in disciplines_raw]
+        disciplines = [DisciplineModel(**d) for d in disciplines_by_course.get(c["id"], [])]
         result.append(CourseModel(id=c["id"], name=c["name"], disciplines=disciplines))
     return result
 
-def create_new_course(course_id: str, name: str):
-    return course_repository.create_course(course_id, {"id": course_id, "name": name})
+def _catalogue_version(courses: list[CourseModel]) -> str:
+    # hash do conteúdo: a mesma versão em todos os workers (ETag de /courses)
+    raw = json.dumps([c.model_dump() for c in courses], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+async def get_catalogue() -> Tuple[list[CourseModel], str]:
+    """Catálogo completo e sua versão (hash do conteúdo), do cache quando possível."""
+    cached = catalogue_cache.get(_CATALOGUE_KEY)
+    if cached is not None:
+        courses, version = cached
+        return list(courses), version
+    generation = catalogue_cache.generation
+    courses = await _load_catalogue()
+    version = _catalogue_version(courses)
+    # só publica o snapshot se nenhuma escrita invalidou o cache durante a leitura
+    catalogue_cache.set(_CATALOGUE_KEY, (courses, version), generation=generation)
+    return list(courses), version
 
-def get_course_by_id(course_id: str):
-    return course_repository.get_course(course_id)
+def cached_catalogue_version() -> Optional[str]:
+    """Versão do catálogo em memória (None se ainda não carregado), sem ir ao Firestore."""
+    cached = catalogue_cache.get(_CATALOGUE_KEY)
+    return cached[1] if cached is not None else None
 
-def update_course_by_id(course_id: str, name: str):
-    return course_repository.update_course(course_id, {"name": name})
+async def list_courses_with_disciplines() -> list[CourseModel]:
+    courses, _ = await get_catalogue()
+    return courses
 
-def delete_course_by_id(course_id: str):
-    return course_repository.delete_course(course_id)
+async def create_new_course(course_id: str, name: str):
+    result = await course_repository.create_course(course_id, {"id": course_id, "name": name})
+    invalidate_catalogue_cache()
+    return result
+
+async def get_course_by_id(course_id: str):
+    return await course_repository.get_course(course_id)
+
+async def update_course_by_id(course_id: str, name: str):
+    result = await course_repository.update_course(course_id, {"name": name})
+    invalidate_catalogue_cache()
+    return result
+
+async def delete_course_by_id(course_id: str):
+    result = await course_repository.delete_course(course_id)
+    invalidate_catalogue_cache()
+    return result
@@ -1,16 +1,36 @@
+from typing import Any, Dict, List, Optional, Tuple
+
 from app.repository import discipline_repository
+from app.services.course_service import invalidate_catalogue_cache, get_catalogue
+
+async def add_discipline_to_course(course_id: str, discipline_id: str, name: str):
+    result = await discipline_repository.create_discipline(course_id, discipline_id, {"id": discipline_id, "name": name})
+    invalidate_catalogue_cache()
+    return result
 
-def add_discipline_to_course(course_id: str, discipline_id: str, name: str):
-    return discipline_repository.create_discipline(course_id, discipline_id, {"id": discipline_id, "name": name})
+async def get_discipline(course_id: str, discipline_id: str):
+    return await discipline_repository.get_discipline(course_id, discipline_id)
 
-def get_discipline(course_id: str, discipline_id: str):
-    return discipline_repository.get_discipline(course_id, discipline_id)
+async def get_all_disciplines(course_id: str):
+    return await discipline_repository.get_disciplines_for_course(course_id)
 
-def get_all_disciplines(course_id: str):
-    return discipline_repository.get_disciplines_for_course(course_id)
+async def get_course_disciplines(course_id: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Disciplinas do curso a partir do catálogo em memória, com a versão do catálogo.
+    Curso fora do catálogo (documento pai inexistente): lê o Firestore, sem versão.
+    """
+    courses, version = await get_catalogue()
+    for course in courses:
+        if course.id == course_id:
+            return [d.model_dump() for d in course.disciplines], version
+    return await get_all_disciplines(course_id), None
 
-def update_discipline(course_id: str, discipline_id: str, name: str):
-    return discipline_repository.update_discipline(course_id, discipline_id, {"name": name})
+async def update_discipline(course_id: str, discipline_id: str, name: str):
+    result = await discipline_repository.update_discipline(course_id, discipline_id, {"name": name})
+    invalidate_catalogue_cache()
+    return result
 
-def delete_discipline(course_id: str, discipline_id: str):
-    return discipline_repository.delete_discipline(course_id, discipline_id)
+async def delete_discipline(course_id: str, discipline_id: str):
+    result = await discipline_repository.delete_discipline(course_id, discipline_id)
+    invalidate_catalogue_cache()
+    return result
@@ -0,0 +1,299 @@
+"""
+Busca de monitores (GET /users/helpers) num índice invertido em memória:
+disciplina -> usuários que ajudam nela.
+
+- `helping_subjects` é texto livre: acentos, caixa, pontuação e erros de digitação
+  próximos são normalizados para os ids de disciplina do catálogo de cursos. O que
+  não existe no catálogo fica indexado pelo próprio texto normalizado;
+- o índice é carregado por um listener `on_snapshot` sobre os monitores (ou, sem
+  listener, por uma query com projeção e TTL) e o `update_me` do worker o atualiza na hora;
+- ranking: mesmo curso do solicitante, depois atividade recente (`last_active_at`),
+  depois nome; paginação por cursor opaco, que guarda o instante da primeira página
+  (as faixas de atividade das páginas seguintes são calculadas nele).
+"""
+import os
+import re
+import time
+import asyncio
+import difflib
+import logging
+import threading
+import unicodedata
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.cache.shared_cache import invalidation_bus
+from app.repository.chat_repository import encode_cursor, decode_cursor
+from app.repository.user_repository import list_helper_profiles, watch_helper_profiles
+from app.services.course_service import list_courses_with_disciplines
+
+logger = logging.getLogger(__name__)
+
+HELPER_INDEX_LISTENER = os.getenv("HELPER_INDEX_LISTENER", "1").lower() not in ("0", "false", "no")
+# sem listener, o índice é recarregado depois disso (mudanças feitas por outros workers)
+HELPER_INDEX_TTL_SECONDS = float(os.getenv("HELPER_INDEX_TTL_SECONDS", "300"))
+# espera pelo primeiro snapshot do listener antes de carregar com uma query
+HELPER_INDEX_READY_TIMEOUT_SECONDS = float(os.getenv("HELPER_INDEX_READY_TIMEOUT_SECONDS", "10"))
+# similaridade mínima (difflib) para aceitar um nome de disciplina com erro de digitação
+SUBJECT_MATCH_CUTOFF = float(os.getenv("SUBJECT_MATCH_CUTOFF", "0.85"))
+
+SAME_COURSE_WEIGHT = 10
+# faixas de atividade: ativo na última semana vale mais que no último mês
+ACTIVITY_TIERS = ((7 * 86400, 2), (30 * 86400, 1))
+
+# textos de busca já resolvidos por versão do catálogo (limite contra consultas aleatórias)
+_RESOLVED_CACHE_MAX = 10000
+
+def fold(text: Optional[str]) -> str:
+    """Minúsculas, sem acentos e sem pontuação, com espaços simples: 'Cálculo  I' -> 'calculo i'."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[\W_]+", " ", text.lower()).split())
+
+def _digits(text: str) -> List[str]:
+    return re.findall(r"\d+", text)
+
+def _to_ms(value: Any) -> int:
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    if isinstance(value, (int, float)):
+        return int(value)
+    return 0
+
+def _signature(courses: Iterable[Any]) -> Tuple:
+    return tuple((c.id, d.id, d.name) for c in courses for d in c.disciplines)
+
+class _Catalogue:
+    """Resolve nomes livres de disciplina para ids do catálogo (e os cursos de cada id)."""
+
+    def __init__(self, courses: Iterable[Any] = ()):
+        self.courses_of: Dict[str, Set[str]] = {}
+        self._by_name: Dict[str, Set[str]] = {}
+        courses = list(courses)
+        for course in courses:
+            for d in course.disciplines:
+                self.courses_of.setdefault(d.id, set()).add(course.id)
+                for name in (fold(d.id), fold(d.name)):
+                    if name:
+                        self._by_name.setdefault(name, set()).add(d.id)
+        self.signature = _signature(courses)
+        self._names = list(self._by_name)
+        self._resolved: Dict[str, FrozenSet[str]] = {}
+
+    def resolve(self, subject: Optional[str]) -> FrozenSet[str]:
+        key = fold(subject)
+        if not key:
+            return frozenset()
+        hit = self._resolved.get(key)
+        if hit is not None:
+            return hit
+        ids = self._by_name.get(key)
+        if not ids:
+            # erro de digitação: o nome mais parecido, desde que os números batam ("Cálculo 2" != "Cálculo 1")
+            close = difflib.get_close_matches(key, self._names, n=3, cutoff=SUBJECT_MATCH_CUTOFF)
+            close = [name for name in close if _digits(name) == _digits(key)]
+            ids = self._by_name[close[0]] if close else {"~" + key}
+        hit = frozenset(ids)
+        if len(self._resolved) < _RESOLVED_CACHE_MAX:
+            self._resolved[key] = hit
+        return hit
+
+    def courses_for(self, keys: Iterable[str]) -> FrozenSet[str]:
+        return frozenset(c for k in keys for c in self.courses_of.get(k, ()))
+
+class HelperIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._catalogue = _Catalogue()
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._subjects_of: Dict[str, FrozenSet[str]] = {}
+        self._courses_of: Dict[str, FrozenSet[str]] = {}
+        self._helpers: Dict[str, Set[str]] = {}
+        self._ready = threading.Event()
+        self._watch = None
+        self._loaded_at: Optional[float] = None
+        self._load_lock = asyncio.Lock()
+        # escritas locais feitas durante uma carga completa (reaplicadas sobre o resultado)
+        self._writes_during_load: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+
+    # ------------------------------------------------------------------ manutenção
+
+    def _unindex(self, uid: str) -> None:
+        for key in self._subjects_of.pop(uid, ()):
+            uids = self._helpers.get(key)
+            if uids is not None:
+                uids.discard(uid)
+                if not uids:
+                    del self._helpers[key]
+        self._courses_of.pop(uid, None)
+        self._profiles.pop(uid, None)
+
+    def _index(self, uid: str, data: Optional[Dict[str, Any]]) -> None:
+        self._unindex(uid)
+        subjects = [s for s in (data or {}).get("helping_subjects") or [] if isinstance(s, str)]
+        if not subjects:
+            return
+        keys = frozenset(k for s in subjects for k in self._catalogue.resolve(s))
+        self._profiles[uid] = {
+            "uid": uid,
+            "name": data.get("name"),
+            "email": data.get("email"),
+            "avatarUrl": data.get("avatarUrl"),
+            "avatar_thumbs": data.get("avatar_thumbs") or {},
+            "helping_subjects": subjects,
+            "last_active_ms": _to_ms(data.get("last_active_at")),
+            "name_key": fold(data.get("name")),
+        }
+        self._subjects_of[uid] = keys
+        self._courses_of[uid] = self._catalogue.courses_for(keys)
+        for key in keys:
+            self._helpers.setdefault(key, set()).add(uid)
+
+    def upsert(self, uid: str, data: Optional[Dict[str, Any]]) -> None:
+        """Atualiza um usuário no índice (`data` None ou sem disciplinas remove)."""
+        with self._lock:
+            self._index(uid, data)
+            if self._writes_during_load is not None:
+                self._writes_during_load[uid] = data
+
+    def _replace_all(self, profiles: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            pending, self._writes_during_load = self._writes_during_load or {}, None
+            for uid in list(self._profiles):
+                self._unindex(uid)
+            for data in profiles:
+                self._index(data["uid"], data)
+            for uid, data in pending.items():
+                self._index(uid, data)
+            self._loaded_at = time.monotonic()
+
+    def _use_catalogue(self, courses: List[Any]) -> None:
+        if _signature(courses) == self._catalogue.signature:
+            return
+        catalogue = _Catalogue(courses)
+        with self._lock:
+            # catálogo mudou: reindexa a partir dos perfis guardados, sem ler o Firestore
+            self._catalogue = catalogue
+            for uid, profile in list(self._profiles.items()):
+                self._index(uid, {**profile, "last_active_at": profile["last_active_ms"]})
+
+    # ------------------------------------------------------------------ listener
+
+    def start(self) -> None:
+        if self._watch is not None:
+            return
+        self._ready.clear()
+        self._watch = watch_helper_profiles(on_change=self._on_change, on_ready=self._ready.set)
+        logger.info("Listener do índice de monitores iniciado")
+
+    def stop(self) -> None:
+        watch, self._watch = self._watch, None
+        if watch is None:
+            return
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            logger.warning("Falha ao encerrar listener do índice de monitores: %s", e)
+        self._ready.clear()
+
+    def _on_remote_profile_change(self, _uids: Optional[List[str]]) -> None:
+        # sem listener, um perfil alterado em outro worker só chega recarregando o índice
+        if self._watch is None:
+            self._loaded_at = None
+
+    def _on_change(self, uid: str, data: Optional[Dict[str, Any]]) -> None:
+        try:
+            self.upsert(uid, data)
+        except Exception as e:
+            logger.warning("Falha ao indexar monitor %s: %s", uid, e)
+
+    async def ensure_ready(self) -> None:
+        self._use_catalogue(await list_courses_with_disciplines())
+        if self._watch is not None:
+            if not self._ready.is_set():
+                await run_in_threadpool(self._ready.wait, HELPER_INDEX_READY_TIMEOUT_SECONDS)
+            if self._ready.is_set():
+                return
+            logger.warning("Listener do índice de monitores sem snapshot inicial; carregando por query")
+        async with self._load_lock:
+            loaded_at = self._loaded_at
+            if loaded_at is not None and time.monotonic() - loaded_at < HELPER_INDEX_TTL_SECONDS:
+                return
+            with self._lock:
+                self._writes_during_load = {}
+            try:
+                profiles = await list_helper_profiles()
+            except Exception:
+                with self._lock:
+                    self._writes_during_load = None
+                raise
+            self._replace_all(profiles)
+
+    # ------------------------------------------------------------------ busca
+
+    def _sort_key(self, uid: str, requester_courses: FrozenSet[str], now_ms: int) -> Tuple[int, str, str]:
+        profile = self._profiles[uid]
+        score = SAME_COURSE_WEIGHT if requester_courses & self._courses_of[uid] else 0
+        idle_seconds = (now_ms - profile["last_active_ms"]) / 1000
+        for max_idle, points in ACTIVITY_TIERS:
+            if profile["last_active_ms"] and idle_seconds <= max_idle:
+                score += points
+                break
+        return -score, profile["name_key"], uid
+
+    def search(self, subject: str, requester_uid: str, limit: int = 50, cursor: Optional[str] = None,
+               course_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Monitores da disciplina (sem o próprio solicitante), do mais relevante para o menos,
+        e o cursor da próxima página (None na última).
+        """
+        after = None
+        now_ms = int(time.time() * 1000)
+        if cursor:
+            c = decode_cursor(cursor)
+            if (not isinstance(c.get("s"), int) or not isinstance(c.get("n"), str)
+                    or not isinstance(c.get("u"), str) or not isinstance(c.get("t"), int)):
+                raise ValueError("cursor inválido")
+            after = (c["s"], c["n"], c["u"])
+            # mesmo instante da primeira página: quem cruza uma faixa no meio não repete nem some
+            now_ms = c["t"]
+        with self._lock:
+            keys = self._catalogue.resolve(subject)
+            uids: Set[str] = set()
+            for key in keys:
+                uids |= self._helpers.get(key, set())
+            uids.discard(requester_uid)
+            requester_courses = self._courses_of.get(requester_uid, frozenset())
+            if course_id:
+                requester_courses = requester_courses | {course_id}
+            ranked = sorted((self._sort_key(uid, requester_courses, now_ms), uid) for uid in uids)
+            if after is not None:
+                ranked = [r for r in ranked if r[0] > after]
+            page = ranked[:limit]
+            items = []
+            for sort_key, uid in page:
+                profile = self._profiles[uid]
+                items.append({
+                    "uid": uid,
+                    "name": profile["name"],
+                    "email": profile["email"],
+                    "avatarUrl": profile["avatarUrl"],
+                    "avatar_thumbs": profile["avatar_thumbs"],
+                    "helping_subjects": profile["helping_subjects"],
+                    "same_course": bool(requester_courses & self._courses_of[uid]),
+                })
+
+        next_cursor = None
+        if len(ranked) > limit:
+            s, n, u = page[-1][0]
+            next_cursor = encode_cursor({"s": s, "n": n, "u": u, "t": now_ms})
+        return items, next_cursor
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"helpers": len(self._profiles), "subjects": len(self._helpers)}
+
+helper_index = HelperIndex()
+invalidation_bus.subscribe("public_profiles", helper_index._on_remote_profile_change)
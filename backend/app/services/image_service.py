@@ -0,0 +1,118 @@
+import io
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageOps
+
+from app.firebase.firebase_storage import upload_file_from_bytes
+
+logger = logging.getLogger(__name__)
+
+# lados máximos (px) das versões reduzidas gravadas ao lado do original
+RENDITION_SIZES: Tuple[int, ...] = tuple(
+    int(s) for s in os.getenv("IMAGE_RENDITION_SIZES", "64,256,1024").split(",") if s.strip()
+)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# imagens maiores que isso não são processadas (ficam só com o original)
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+# proteção contra "decompression bombs"
+Image.MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "40000000"))
+
+PROCESSABLE_TYPES = {"image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp"}
+
+# formato de saída do original limpo: (formato PIL, content type, extensão)
+_OUTPUT_FORMATS = {
+    "JPEG": ("JPEG", "image/jpeg", ".jpg"),
+    "PNG": ("PNG", "image/png", ".png"),
+    "WEBP": ("WEBP", "image/webp", ".webp"),
+}
+
+def is_processable(content_type: Optional[str]) -> bool:
+    return (content_type or "").lower() in PROCESSABLE_TYPES
+
+def _encode(img: Image.Image, fmt: str) -> bytes:
+    buf = io.BytesIO()
+    if fmt == "JPEG":
+        img.convert("RGB").save(buf, "JPEG", quality=85, optimize=True, progressive=True)
+    elif fmt == "WEBP":
+        img.save(buf, "WEBP", quality=80, method=4)
+    else:
+        img.save(buf, fmt, optimize=True)
+    return buf.getvalue()
+
+def render_image(data: bytes, sizes: Tuple[int, ...] = RENDITION_SIZES) -> Dict[str, Any]:
+    """
+    Decodifica a imagem, aplica a orientação do EXIF e descarta os metadados
+    (EXIF/XMP, ex.: GPS). Retorna o original limpo e as versões reduzidas em WebP.
+    CPU-bound: roda no process pool (ver `process_image`).
+    """
+    with Image.open(io.BytesIO(data)) as src:
+        fmt, content_type, ext = _OUTPUT_FORMATS.get(src.format, _OUTPUT_FORMATS["PNG"])
+        img = ImageOps.exif_transpose(src)
+        img.info.pop("exif", None)
+        img.info.pop("xmp", None)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+
+        renditions: Dict[int, bytes] = {}
+        for size in sorted(set(sizes)):
+            # não amplia: versões maiores que o original não são geradas
+            if size >= max(img.size) and renditions:
+                break
+            thumb = img.copy()
+            thumb.thumbnail((size, size), Image.Resampling.LANCZOS)
+            renditions[size] = _encode(thumb, "WEBP")
+
+        return {
+            "original": _encode(img, fmt),
+            "content_type": content_type,
+            "ext": ext,
+            "width": img.size[0],
+            "height": img.size[1],
+            "renditions": renditions,
+        }
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: não herdar threads do gRPC/Firestore do processo da API
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def process_image(data: bytes, sizes: Tuple[int, ...] = RENDITION_SIZES) -> Optional[Dict[str, Any]]:
+    """Processa a imagem no process pool; None se não for possível (formato, tamanho, erro)."""
+    if not data or len(data) > MAX_IMAGE_BYTES:
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_pool(), render_image, data, tuple(sizes))
+    except Exception as e:
+        logger.warning("Falha ao processar imagem: %s", e)
+        return None
+
+def rendition_path(object_path: str, size: int) -> str:
+    base, _, name = object_path.rpartition("/")
+    stem = name.rsplit(".", 1)[0]
+    return f"{base}/thumbs/{stem}_{size}.webp"
+
+async def store_renditions(object_path: str, renditions: Dict[int, bytes]) -> Dict[str, str]:
+    """Grava as versões reduzidas em {pasta}/thumbs/ e retorna {"64": url, ...}."""
+    sizes = list(renditions)
+    urls = await asyncio.gather(*[
+        run_in_threadpool(upload_file_from_bytes, rendition_path(object_path, size), renditions[size], "image/webp")
+        for size in sizes
+    ])
+    return {str(size): url for size, url in zip(sizes, urls)}
@@ -0,0 +1,425 @@
+"""
+Busca no histórico de mensagens (GET /chat/search) num índice invertido em memória.
+
+- texto e nome do arquivo de cada mensagem viram termos: minúsculas, sem acentos nem
+  pontuação (`fold`), sem stopwords e reduzidos a um radical por um stemmer leve de
+  português ("Cálculos" e "calcular" -> "calcul");
+- por chat, cada termo aponta para as posições das mensagens que o contêm (`array`),
+  e o vocabulário é único para o processo. A busca só olha os chats do usuário;
+- todos os termos da consulta precisam aparecer; o último vale como prefixo
+  ("calc" acha "Cálculo"), e `*` no fim de qualquer termo também. Resultado do mais
+  recente para o mais antigo, paginado por cursor;
+- atualização: `send_message_service` indexa na hora as mensagens do próprio processo
+  e uma query incremental na collection group `messages` (timestamp >= marca d'água)
+  traz as de outros workers, no máximo a cada MESSAGE_SEARCH_REFRESH_SECONDS;
+- persistência: snapshot JSON comprimido (gzip) num arquivo local
+  (MESSAGE_SEARCH_INDEX_FILE, gravado também no shutdown) ou no Storage
+  (MESSAGE_SEARCH_INDEX_OBJECT). A reconstrução completa, incluindo mensagens
+  arquivadas, é offline: python -m app.scripts.rebuild_search_index.
+"""
+import os
+import gzip
+import json
+import time
+import heapq
+import asyncio
+import bisect
+import logging
+import tempfile
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.firebase.firebase_storage import store_private_bytes, read_private_bytes
+from app.repository.chat_repository import (
+    encode_cursor, decode_cursor, iter_chat_ids, stream_chat_history, list_messages_committed_since,
+)
+from app.services.helper_search import fold
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_SEARCH_ENABLED = os.getenv("MESSAGE_SEARCH_ENABLED", "1").lower() not in ("0", "false", "no")
+MESSAGE_SEARCH_INDEX_FILE = os.getenv("MESSAGE_SEARCH_INDEX_FILE", "")
+MESSAGE_SEARCH_INDEX_OBJECT = os.getenv("MESSAGE_SEARCH_INDEX_OBJECT", "search/message-index.json.gz")
+# intervalo mínimo entre buscas de mensagens gravadas por outros workers
+MESSAGE_SEARCH_REFRESH_SECONDS = float(os.getenv("MESSAGE_SEARCH_REFRESH_SECONDS", "5"))
+# trecho do texto guardado por mensagem (é o que a busca devolve)
+MESSAGE_SEARCH_SNIPPET_CHARS = int(os.getenv("MESSAGE_SEARCH_SNIPPET_CHARS", "160"))
+# termos do vocabulário aceitos por prefixo (limite contra prefixos curtos demais)
+MESSAGE_SEARCH_MAX_PREFIX_TERMS = int(os.getenv("MESSAGE_SEARCH_MAX_PREFIX_TERMS", "64"))
+
+_CATCH_UP_PAGE = 1000
+_SNAPSHOT_VERSION = 1
+
+# sem acentos: comparadas depois do fold
+STOPWORDS = frozenset("""
+a ao aos aquela aquelas aquele aqueles aquilo as ate com como da das de dela delas dele deles
+depois do dos e ela elas ele eles em entre era essa essas esse esses esta estas este estes eu
+foi foram ha isso isto ja lhe lhes mais mas me mesmo meu meus minha minhas muito na nas nem no
+nos nossa nossas nosso nossos num numa o os ou para pela pelas pelo pelos por qual quando que
+quem se sem seu seus so sua suas tambem te tem teu teus tu tua tuas um uma umas uns voce voces
+""".split())
+
+# plural -> singular (primeira regra que casar), depois sufixos derivacionais
+_PLURAL_RULES = (("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"), ("ois", "ol"),
+                 ("ns", "m"), ("res", "r"), ("zes", "z"), ("les", "l"))
+_SUFFIXES = ("mente", "zinho", "zinha", "inho", "inha", "cao", "ar", "er", "ir")
+
+def stem(token: str) -> str:
+    """Stemmer leve de português (inspirado no RSLP) sobre texto já sem acentos."""
+    if len(token) < 4 or not token.isalpha():
+        return token
+    for suffix, replacement in _PLURAL_RULES:
+        if token.endswith(suffix):
+            token = token[:-len(suffix)] + replacement
+            break
+    else:
+        if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+            token = token[:-1]
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            break
+    # gênero/vogal temática: "lista"/"listo"/"liste" -> "list"
+    if len(token) >= 4 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Termos indexáveis do texto, na ordem (com repetições)."""
+    return [stem(t) for t in fold(text).split()
+            if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+def _parse_query(q: str) -> List[Tuple[str, bool]]:
+    """(termo, é prefixo) para cada palavra da consulta; a última é sempre prefixo."""
+    words = fold(q.replace("*", " * ")).split()
+    clauses: List[Tuple[str, bool]] = []
+    for word in words:
+        if word == "*":
+            if clauses:
+                clauses[-1] = (clauses[-1][0], True)
+        elif word not in STOPWORDS or len(words) == 1:
+            clauses.append((stem(word), False))
+    if clauses and words[-1] != "*":
+        # busca enquanto digita: "calc" acha "calcul" (radical de "Cálculo")
+        clauses[-1] = (clauses[-1][0], True)
+    return clauses
+
+def _deltas(positions: Iterable[int]) -> List[int]:
+    previous, deltas = 0, []
+    for position in positions:
+        deltas.append(position - previous)
+        previous = position
+    return deltas
+
+class _ChatIndex:
+    __slots__ = ("ids", "ts", "senders", "texts", "files", "postings", "positions")
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.ts = array("q")
+        self.senders: List[str] = []
+        self.texts: List[Optional[str]] = []
+        self.files: List[Optional[str]] = []
+        # id do termo -> posições (crescentes) das mensagens que o contêm
+        self.postings: Dict[int, array] = {}
+        self.positions: Dict[str, int] = {}
+
+class MessageSearchIndex:
+    def __init__(self):
+        self.clear()
+        self._refresh_lock = asyncio.Lock()
+        self._loaded = asyncio.Event()
+        self._load_task: Optional[asyncio.Task] = None
+        # mensagens locais recebidas enquanto o snapshot carrega (aplicadas depois dele)
+        self._adds_during_load: List[Dict[str, Any]] = []
+
+    # ------------------------------------------------------------------ manutenção
+
+    def _term_id(self, term: str) -> int:
+        term_id = self._terms.get(term)
+        if term_id is None:
+            term_id = self._terms[term] = len(self._vocab)
+            self._vocab.append(term)
+            # mantido ordenado a cada termo novo: a busca por prefixo nunca reordena tudo
+            bisect.insort(self._sorted_vocab, term)
+        return term_id
+
+    def _chat(self, chat_id: str) -> _ChatIndex:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _ChatIndex()
+            for uid in chat_id.split("_"):
+                self._user_chats.setdefault(uid, set()).add(chat_id)
+        return chat
+
+    def add(self, message: Dict[str, Any]) -> bool:
+        """Indexa uma mensagem (dict no formato de MessageDTO). False se já estava indexada."""
+        if self._load_task is not None and not self._loaded.is_set():
+            self._adds_during_load.append(message)
+            return True
+        return self._add(message)
+
+    def _add(self, message: Dict[str, Any]) -> bool:
+        chat = self._chat(message["chat_id"])
+        if message["id"] in chat.positions:
+            return False
+        position = len(chat.ids)
+        chat.positions[message["id"]] = position
+        chat.ids.append(message["id"])
+        chat.ts.append(int(message.get("timestamp") or 0))
+        chat.senders.append(message.get("sender_id") or "")
+        text = (message.get("message") or "").strip()
+        chat.texts.append(text[:MESSAGE_SEARCH_SNIPPET_CHARS] or None)
+        chat.files.append(message.get("file_name"))
+        for term in set(tokenize(text) + tokenize(message.get("file_name"))):
+            term_id = self._term_id(term)
+            postings = chat.postings.get(term_id)
+            if postings is None:
+                postings = chat.postings[term_id] = array("I")
+            postings.append(position)
+        return True
+
+    def clear(self) -> None:
+        self._terms: Dict[str, int] = {}
+        self._vocab: List[str] = []
+        self._sorted_vocab: List[str] = []
+        self._chats: Dict[str, _ChatIndex] = {}
+        self._user_chats: Dict[str, Set[str]] = {}
+        # maior timestamp (µs) vindo da collection group: a próxima busca incremental começa dele
+        self.watermark_us = 0
+        self._refreshed_at = 0.0
+
+    # ------------------------------------------------------------------ atualização
+
+    async def refresh(self, force: bool = False) -> int:
+        """Indexa as mensagens gravadas (por qualquer worker) desde a marca d'água."""
+        if not force and time.monotonic() - self._refreshed_at < MESSAGE_SEARCH_REFRESH_SECONDS:
+            return 0
+        async with self._refresh_lock:
+            if not force and time.monotonic() - self._refreshed_at < MESSAGE_SEARCH_REFRESH_SECONDS:
+                return 0
+            added, start_after = 0, None
+            since = self.watermark_us
+            while True:
+                items, start_after = await list_messages_committed_since(since, _CATCH_UP_PAGE, start_after)
+                for m in items:
+                    added += self._add(m)
+                    self.watermark_us = max(self.watermark_us, m["t"])
+                if len(items) < _CATCH_UP_PAGE:
+                    break
+            self._refreshed_at = time.monotonic()
+            return added
+
+    async def rebuild(self) -> Dict[str, int]:
+        """Reconstrução completa (offline): todos os chats, inclusive mensagens arquivadas."""
+        self.clear()
+        started_us = int(time.time() * 1_000_000)
+        chats = messages = 0
+        async for chat_id in iter_chat_ids():
+            chats += 1
+            async for m in stream_chat_history(chat_id):
+                messages += self._add(m)
+        # o que for gravado durante a reconstrução entra pela busca incremental
+        self.watermark_us = started_us
+        return {"chats": chats, "messages": messages, "terms": len(self._vocab)}
+
+    # ------------------------------------------------------------------ persistência
+
+    def dumps(self) -> bytes:
+        chats = {}
+        for chat_id, chat in self._chats.items():
+            terms = list(chat.postings)
+            chats[chat_id] = {
+                "ids": chat.ids, "ts": chat.ts.tolist(), "senders": chat.senders,
+                "texts": chat.texts, "files": chat.files, "terms": terms,
+                # posições crescentes: guardadas como diferenças (números pequenos)
+                "postings": [_deltas(chat.postings[t]) for t in terms],
+            }
+        snapshot = {"version": _SNAPSHOT_VERSION, "watermark_us": self.watermark_us,
+                    "vocab": self._vocab, "chats": chats}
+        return gzip.compress(json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    def loads(self, data: bytes) -> None:
+        snapshot = json.loads(gzip.decompress(data).decode("utf-8"))
+        if snapshot.get("version") != _SNAPSHOT_VERSION:
+            raise ValueError(f"versão de snapshot não suportada: {snapshot.get('version')}")
+        self.clear()
+        self._vocab = snapshot["vocab"]
+        self._terms = {term: i for i, term in enumerate(self._vocab)}
+        self._sorted_vocab = sorted(self._vocab)
+        for chat_id, c in snapshot["chats"].items():
+            chat = self._chat(chat_id)
+            chat.ids, chat.senders, chat.texts, chat.files = c["ids"], c["senders"], c["texts"], c["files"]
+            chat.ts = array("q", c["ts"])
+            chat.positions = {mid: i for i, mid in enumerate(chat.ids)}
+            for term_id, deltas in zip(c["terms"], c["postings"]):
+                postings, position = array("I"), 0
+                for delta in deltas:
+                    position += delta
+                    postings.append(position)
+                chat.postings[term_id] = postings
+        self.watermark_us = snapshot["watermark_us"]
+
+    def save_file(self, path: str) -> int:
+        data = self.dumps()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # temporário único por gravação: vários workers podem salvar ao mesmo tempo
+        tmp = tempfile.NamedTemporaryFile(dir=directory, prefix=os.path.basename(path) + ".",
+                                          suffix=".tmp", delete=False)
+        try:
+            with tmp:
+                tmp.write(data)
+            os.replace(tmp.name, path)
+        except OSError:
+            os.unlink(tmp.name)
+            raise
+        return len(data)
+
+    def save_object(self, object_path: str) -> int:
+        data = self.dumps()
+        store_private_bytes(object_path, data, "application/gzip")
+        return len(data)
+
+    def _load_snapshot(self) -> Optional[str]:
+        if MESSAGE_SEARCH_INDEX_FILE and os.path.exists(MESSAGE_SEARCH_INDEX_FILE):
+            with open(MESSAGE_SEARCH_INDEX_FILE, "rb") as f:
+                self.loads(f.read())
+            return MESSAGE_SEARCH_INDEX_FILE
+        if MESSAGE_SEARCH_INDEX_OBJECT:
+            try:
+                self.loads(read_private_bytes(MESSAGE_SEARCH_INDEX_OBJECT))
+                return MESSAGE_SEARCH_INDEX_OBJECT
+            except Exception as e:
+                logger.info("Snapshot do índice de busca indisponível (%s): %s", MESSAGE_SEARCH_INDEX_OBJECT, e)
+        return None
+
+    async def _load(self) -> None:
+        try:
+            source = await run_in_threadpool(self._load_snapshot)
+        except Exception as e:
+            logger.warning("Falha ao carregar o índice de busca: %s", e)
+            source = None
+        if source is None:
+            # sem snapshot, varrer o histórico aqui custaria uma leitura por mensagem
+            self.clear()
+            self.watermark_us = int(time.time() * 1_000_000)
+            logger.warning("Índice de busca vazio: rode python -m app.scripts.rebuild_search_index")
+        else:
+            logger.info("Índice de busca carregado de %s: %s", source, self.stats())
+        pending, self._adds_during_load = self._adds_during_load, []
+        for message in pending:
+            self._add(message)
+        self._loaded.set()
+        try:
+            await self.refresh(force=True)
+        except Exception as e:
+            logger.warning("Falha ao atualizar o índice de busca: %s", e)
+
+    def start(self) -> None:
+        """Carrega o snapshot e o que mudou desde ele em segundo plano (lifespan)."""
+        if self._load_task is None:
+            self._load_task = asyncio.get_running_loop().create_task(self._load(), name="message-search-load")
+
+    async def stop(self) -> None:
+        task, self._load_task = self._load_task, None
+        if task is None:
+            return
+        if not task.done():
+            task.cancel()
+            return
+        if MESSAGE_SEARCH_INDEX_FILE:
+            try:
+                size = await run_in_threadpool(self.save_file, MESSAGE_SEARCH_INDEX_FILE)
+                logger.info("Índice de busca salvo em %s (%d bytes)", MESSAGE_SEARCH_INDEX_FILE, size)
+            except Exception as e:
+                logger.warning("Falha ao salvar o índice de busca: %s", e)
+
+    # ------------------------------------------------------------------ busca
+
+    def _expand(self, term: str, prefix: bool) -> List[int]:
+        if not prefix:
+            term_id = self._terms.get(term)
+            return [] if term_id is None else [term_id]
+        vocab = self._sorted_vocab
+        expanded = []
+        for i in range(bisect.bisect_left(vocab, term), len(vocab)):
+            if not vocab[i].startswith(term) or len(expanded) >= MESSAGE_SEARCH_MAX_PREFIX_TERMS:
+                break
+            expanded.append(self._terms[vocab[i]])
+        return expanded
+
+    @staticmethod
+    def _matching(chat: _ChatIndex, clauses: List[List[int]]) -> Iterable[int]:
+        matched: Optional[Set[int]] = None
+        for term_ids in clauses:
+            positions: Set[int] = set()
+            for term_id in term_ids:
+                positions.update(chat.postings.get(term_id, ()))
+            matched = positions if matched is None else matched & positions
+            if not matched:
+                return ()
+        return matched or ()
+
+    async def search(self, uid: str, q: str, limit: int = 20, cursor: Optional[str] = None,
+                     chat_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Mensagens dos chats de `uid` que batem com `q`, da mais recente para a mais antiga."""
+        after = None
+        if cursor:
+            c = decode_cursor(cursor)
+            if not isinstance(c.get("t"), int) or not isinstance(c.get("c"), str) or not isinstance(c.get("id"), str):
+                raise ValueError("cursor inválido")
+            after = (c["t"], c["c"], c["id"])
+        if chat_id is not None and uid not in chat_id.split("_"):
+            raise PermissionError("Usuário não participa deste chat")
+
+        if self._load_task is None:
+            self.start()
+        await self._loaded.wait()
+        await self.refresh()
+
+        clauses = [self._expand(term, prefix) for term, prefix in _parse_query(q)]
+        if not clauses or not all(clauses):
+            return [], None
+        # termos mais raros primeiro: a interseção encolhe mais cedo
+        clauses.sort(key=len)
+
+        candidates = []
+        for cid in ([chat_id] if chat_id else self._user_chats.get(uid, ())):
+            chat = self._chats.get(cid)
+            if chat is None:
+                continue
+            for position in self._matching(chat, clauses):
+                key = (chat.ts[position], cid, chat.ids[position])
+                if after is None or key < after:
+                    candidates.append((key, position))
+        top = heapq.nlargest(limit + 1, candidates)
+
+        items = []
+        for (ts, cid, mid), position in top[:limit]:
+            chat = self._chats[cid]
+            items.append({
+                "chat_id": cid,
+                "message_id": mid,
+                "sender_id": chat.senders[position],
+                "timestamp": ts,
+                "message": chat.texts[position],
+                "file_name": chat.files[position],
+            })
+        next_cursor = None
+        if len(top) > limit:
+            ts, cid, mid = top[limit - 1][0]
+            next_cursor = encode_cursor({"t": ts, "c": cid, "id": mid})
+        return items, next_cursor
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "chats": len(self._chats),
+            "messages": sum(len(c.ids) for c in self._chats.values()),
+            "terms": len(self._vocab),
+            "postings": sum(len(p) for c in self._chats.values() for p in c.postings.values()),
+        }
+
+message_search = MessageSearchIndex()
@@ -1,20 +1,42 @@
 # app/services/user_service.py
+import os
 import base64
 import uuid
 import re
+import logging
+import mimetypes
 from typing import Any, Dict, List, Optional, Tuple
 
+from cachetools import TTLCache
+from fastapi.concurrency import run_in_threadpool
 from google.cloud import firestore
-from app.firebase.firestore_client import storage
+from app.firebase.firebase_storage import create_signed_upload, finalize_upload, upload_file_from_bytes, download_bytes
+from app.services.image_service import process_image, store_renditions
 from app.repository.user_repository import (
     get_user_by_uid,
+    get_user_with_version,
+    user_version_cache,
     create_user,
     update_user,
-    list_helpers_by_subject,
+    invalidate_public_profile,
+    public_profile,
 )
+from app.repository.chat_repository import fan_out_participant_profile
+from app.services.helper_search import helper_index
+
+logger = logging.getLogger(__name__)
 
 INSTITUTIONAL_EMAIL_REGEX = r".+@.+\.edu\.br$"
 
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# campos do perfil copiados em chats/{id}.participant_profiles
+PROFILE_FANOUT_FIELDS = {"name", "avatarUrl", "avatar_thumbs"}
+
+# last_active_at (ranking de monitores) é gravado no máximo uma vez por intervalo por worker
+ACTIVITY_TOUCH_INTERVAL_SECONDS = float(os.getenv("ACTIVITY_TOUCH_INTERVAL_SECONDS", "3600"))
+_activity_touched: TTLCache = TTLCache(maxsize=10000, ttl=ACTIVITY_TOUCH_INTERVAL_SECONDS)
+
 def validate_institutional_email(email: str) -> bool:
     return bool(re.match(INSTITUTIONAL_EMAIL_REGEX, email or ""))
 
@@ -28,56 +50,119 @@ def build_new_user(uid: str, email: str, name: str) -> Dict[str, Any]:
         "created_at": firestore.SERVER_TIMESTAMP,
     }
 
-def create_profile(uid: str, email: str, name: str) -> Dict[str, Any]:
+async def create_profile(uid: str, email: str, name: str) -> Dict[str, Any]:
     if not validate_institutional_email(email):
         raise ValueError("Cadastro permitido apenas com e-mail institucional (.edu.br)")
-    existing = get_user_by_uid(uid)
+    existing = await get_user_by_uid(uid)
     if existing:
         raise FileExistsError("Perfil de usuário já existe")
     payload = build_new_user(uid, email, name)
-    create_user(uid, payload)
+    await create_user(uid, payload)
+    invalidate_public_profile(uid)
     return {"message": "Perfil de usuário criado com sucesso", "uid": uid}
 
-def get_me(uid: str) -> Dict[str, Any]:
-    user = get_user_by_uid(uid)
+async def get_me(uid: str) -> Dict[str, Any]:
+    user, _ = await get_me_with_version(uid)
+    return user
+
+async def get_me_with_version(uid: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    user, version = await get_user_with_version(uid)
     if not user:
         raise LookupError("Perfil de usuário não encontrado")
-    return user
+    return user, version
+
+def cached_me_version(uid: str) -> Optional[str]:
+    """Versão do perfil já conhecida por este worker (None se não estiver em memória)."""
+    return user_version_cache.get(uid)
 
-def upload_avatar_from_base64(uid: str, data_url: str) -> str:
+async def _store_avatar(uid: str, image_data: bytes, mime_type: str,
+                        object_path: Optional[str] = None) -> Tuple[str, Dict[str, str]]:
+    """
+    Processa a imagem (remove EXIF, gera 64/256/1024px) e grava original limpo + versões.
+    Retorna (url do original, {tamanho: url}). Se a imagem não puder ser processada,
+    grava os bytes como vieram, com a extensão do MIME real.
+    """
+    processed = await process_image(image_data)
+    if processed:
+        image_data, mime_type, ext = processed["original"], processed["content_type"], processed["ext"]
+    else:
+        ext = mimetypes.guess_extension(mime_type) or ".img"
+    path = object_path or f"profile_pictures/{uid}/{uuid.uuid4()}{ext}"
+    url = await run_in_threadpool(upload_file_from_bytes, path, image_data, mime_type)
+    thumbs = await store_renditions(path, processed["renditions"]) if processed else {}
+    return url, thumbs
+
+async def upload_avatar_from_base64(uid: str, data_url: str) -> Tuple[str, Dict[str, str]]:
     """
     Recebe um data URL (ex.: 'data:image/jpeg;base64,...'), envia ao Firebase Storage
-    e retorna a URL pública.
+    e retorna a URL do avatar e das miniaturas.
     """
     header, encoded = data_url.split(",", 1)
     mime_type = header.split(":", 1)[1].split(";", 1)[0]
     image_data = base64.b64decode(encoded)
+    return await _store_avatar(uid, image_data, mime_type)
+
+async def create_avatar_upload(uid: str, content_type: str) -> Dict[str, Any]:
+    """Upload direto do avatar, passo 1: URL assinada restrita a profile_pictures/{uid}/."""
+    if not (content_type or "").startswith("image/"):
+        raise ValueError("O avatar deve ser uma imagem")
+    ext = mimetypes.guess_extension(content_type) or ".img"
+    path = f"profile_pictures/{uid}/{uuid.uuid4()}{ext}"
+    return await run_in_threadpool(create_signed_upload, path, content_type, AVATAR_MAX_BYTES)
 
-    bucket = storage.bucket()
-    file_name = f"profile_pictures/{uid}/{uuid.uuid4()}.jpg"
-    blob = bucket.blob(file_name)
-    blob.upload_from_string(image_data, content_type=mime_type)
-    blob.make_public()
-    return blob.public_url
+async def finalize_avatar_upload(uid: str, object_path: str) -> Dict[str, Any]:
+    """Upload direto do avatar, passo 2: confere o objeto e grava avatarUrl no perfil."""
+    if not object_path.startswith(f"profile_pictures/{uid}/"):
+        raise PermissionError("Arquivo não pertence a este usuário")
+    uploaded = await run_in_threadpool(finalize_upload, object_path, AVATAR_MAX_BYTES)
+    if not uploaded["content_type"].startswith("image/"):
+        raise ValueError("O avatar deve ser uma imagem")
+    # regrava o original sem EXIF no mesmo caminho e gera as miniaturas
+    image_data = await run_in_threadpool(download_bytes, object_path, AVATAR_MAX_BYTES)
+    url, thumbs = await _store_avatar(uid, image_data, uploaded["content_type"], object_path=object_path)
+    await update_user(uid, {"avatarUrl": url, "avatar_thumbs": thumbs})
+    invalidate_public_profile(uid)
+    user = await get_me(uid)
+    helper_index.upsert(uid, user)
+    await fan_out_participant_profile(uid, public_profile(user))
+    return user
 
-def update_me(uid: str, update_payload: Dict[str, Any]) -> Dict[str, Any]:
+async def update_me(uid: str, update_payload: Dict[str, Any]) -> Dict[str, Any]:
     payload = {k: v for k, v in (update_payload or {}).items() if v is not None}
 
     # avatar base64 -> Storage
     avatar_field = payload.pop("avatarImageBase64", None)
     if avatar_field:
-        url = upload_avatar_from_base64(uid, avatar_field)
+        url, thumbs = await upload_avatar_from_base64(uid, avatar_field)
         payload["avatarUrl"] = url
+        payload["avatar_thumbs"] = thumbs
 
     if not payload:
         raise ValueError("Nenhum dado fornecido para atualização")
 
-    update_user(uid, payload)
-    return get_me(uid)
+    await update_user(uid, payload)
+    invalidate_public_profile(uid)
+    user = await get_me(uid)
+    # o índice de monitores deste worker não espera o listener
+    helper_index.upsert(uid, user)
+    # nome/avatar mudaram: atualiza a cópia guardada nos chats do usuário
+    if PROFILE_FANOUT_FIELDS & payload.keys():
+        await fan_out_participant_profile(uid, public_profile(user))
+    return user
+
+async def note_activity(uid: str) -> None:
+    """Marca o usuário como ativo agora (no máximo uma escrita por intervalo)."""
+    if uid in _activity_touched:
+        return
+    _activity_touched[uid] = True
+    try:
+        await update_user(uid, {"last_active_at": firestore.SERVER_TIMESTAMP})
+    except Exception as e:
+        logger.warning("Falha ao registrar atividade de %s: %s", uid, e)
 
 # app/services/user_service.py
-def get_helpers(subject: str, requester_uid: str) -> List[Dict[str, Any]]:
-    helpers = list_helpers_by_subject(subject)
-    # 🔒 remove o próprio usuário
-    return [h for h in helpers if str(h.get("uid")) != str(requester_uid)]
-
+async def get_helpers(subject: str, requester_uid: str, limit: int = 50, cursor: Optional[str] = None,
+                      course_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    await helper_index.ensure_ready()
+    # 🔒 o próprio usuário nunca aparece
+    return helper_index.search(subject, requester_uid, limit=limit, cursor=cursor, course_id=course_id)
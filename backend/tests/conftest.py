@@ -0,0 +1,34 @@
+"""
+Os testes rodam sobre o Firestore/Storage em memória (app/firebase/memory_backend.py):
+FIRESTORE_BACKEND precisa estar definido antes do primeiro import de `app`.
+
+Uso (a partir de backend/):
+    python -m pytest -q
+"""
+import os
+import uuid
+
+os.environ["FIRESTORE_BACKEND"] = "memory"
+os.environ.setdefault("MESSAGE_SEARCH_INDEX_FILE", "")
+
+import pytest
+
+from app.firebase.firestore_client import db
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture(autouse=True)
+def memory_store():
+    """Firestore em memória vazio a cada teste."""
+    db.store.clear()
+    db.store.reset_stats()
+    yield db.store
+    db.store.clear()
+
+@pytest.fixture
+def chat_id():
+    """Chat novo por teste: os caches do processo (versões, índice do arquivo) não vazam entre testes."""
+    suffix = uuid.uuid4().hex[:8]
+    return f"alice{suffix}_bob{suffix}"
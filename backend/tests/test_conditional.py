@@ -0,0 +1,115 @@
+import httpx
+import pytest
+from fastapi import HTTPException, Response
+from google.cloud import firestore
+from starlette.requests import Request
+
+from app.api.conditional import CACHE_CONTROL, ConditionalGet, etag_matches, make_etag
+from app.benchmarks.suite import BENCH_USER_HEADER, install_auth_override
+from app.cache.shared_cache import InvalidationBus
+from app.firebase.firestore_client import async_db
+from app.main import app
+
+def _conditional(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    response = Response()
+    return ConditionalGet(Request({"type": "http", "headers": headers}), response), response
+
+def test_make_etag_is_weak_and_stable():
+    etag = make_etag("messages", "a_b", 20, 3)
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert etag == make_etag("messages", "a_b", 20, 3)
+    assert etag != make_etag("messages", "a_b", 20, 4)
+
+def test_etag_matches():
+    etag = make_etag("x")
+    strong = etag.removeprefix("W/")
+    assert etag_matches(etag, etag)
+    assert etag_matches(strong, etag)
+    assert etag_matches(f'"outro", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('W/"outro"', etag)
+
+def test_check_sets_headers_when_client_has_other_version():
+    conditional, response = _conditional('W/"velho"')
+    conditional.check("recurso", 1)
+    assert response.headers["ETag"] == make_etag("recurso", 1)
+    assert response.headers["Cache-Control"] == CACHE_CONTROL
+
+def test_check_and_not_modified_raise_304_for_current_version():
+    etag = make_etag("recurso", 1)
+    for method in ("check", "not_modified"):
+        conditional, _ = _conditional(etag)
+        with pytest.raises(HTTPException) as exc:
+            getattr(conditional, method)("recurso", 1)
+        assert exc.value.status_code == 304
+        assert exc.value.headers["ETag"] == etag
+
+def test_not_modified_without_header_does_nothing():
+    conditional, response = _conditional()
+    conditional.not_modified("recurso", 1)
+    assert "ETag" not in response.headers
+
+@pytest.fixture
+async def client():
+    install_auth_override(app)
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+            yield c
+    finally:
+        app.dependency_overrides.clear()
+
+async def _send(client, chat_id, text):
+    sender, receiver = chat_id.split("_")
+    response = await client.post(f"/chat/send/{chat_id}", data={"receiver_id": receiver, "text": text},
+                                 headers={BENCH_USER_HEADER: sender})
+    assert response.status_code == 200, response.text
+
+async def _messages(client, chat_id, etag=None):
+    headers = {BENCH_USER_HEADER: chat_id.split("_")[0]}
+    if etag:
+        headers["If-None-Match"] = etag
+    return await client.get(f"/chat/messages/{chat_id}", headers=headers)
+
+@pytest.mark.anyio
+async def test_messages_etag_changes_after_send(client, chat_id):
+    await _send(client, chat_id, "primeira")
+    first = await _messages(client, chat_id)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = await _messages(client, chat_id, etag)
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+
+    await _send(client, chat_id, "segunda")
+    after_send = await _messages(client, chat_id, etag)
+    assert after_send.status_code == 200
+    assert after_send.headers["ETag"] != etag
+    assert [m["message"] for m in after_send.json()] == ["primeira", "segunda"]
+
+@pytest.mark.anyio
+async def test_local_bus_revalidates_against_firestore(client, chat_id, memory_store):
+    await _send(client, chat_id, "oi")
+    etag = (await _messages(client, chat_id)).headers["ETag"]
+
+    memory_store.reset_stats()
+    assert (await _messages(client, chat_id, etag)).status_code == 304
+    assert memory_store.stats()["reads"] == 1
+
+    # escrita de outro worker: sem barramento compartilhado o cache local não sabe dela
+    await async_db.collection("chats").document(chat_id).set(
+        {"messages_version": firestore.Increment(1)}, merge=True)
+    assert (await _messages(client, chat_id, etag)).status_code == 200
+
+@pytest.mark.anyio
+async def test_shared_bus_answers_304_from_cache(client, chat_id, memory_store, monkeypatch):
+    monkeypatch.setattr(InvalidationBus, "shared", property(lambda self: True))
+    await _send(client, chat_id, "oi")
+    etag = (await _messages(client, chat_id)).headers["ETag"]
+
+    memory_store.reset_stats()
+    assert (await _messages(client, chat_id, etag)).status_code == 304
+    assert memory_store.stats()["reads"] == 0
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.firebase.firestore_client import async_db
+from app.repository import message_archive
+from app.repository.chat_repository import archive_chat_messages, list_messages
+
+OLD, RECENT = 23, 5
+
+async def _seed(chat_id):
+    """23 mensagens de 200 dias atrás (arquiváveis) e 5 recentes, um minuto entre cada."""
+    sender, receiver = chat_id.split("_")
+    col = async_db.collection("chats").document(chat_id).collection("messages")
+    old_start = datetime.now(timezone.utc) - timedelta(days=200)
+    recent_start = datetime.now(timezone.utc) - timedelta(hours=1)
+    ids = []
+    for i in range(OLD + RECENT):
+        start, offset = (old_start, i) if i < OLD else (recent_start, i - OLD)
+        mid = f"m{i:03d}"
+        await col.document(mid).set({"sender_id": sender, "receiver_id": receiver, "message": f"msg {i}",
+                                     "timestamp": start + timedelta(minutes=offset)})
+        ids.append(mid)
+    return ids
+
+async def _page_backwards(chat_id, limit):
+    seen, cursor = [], None
+    while True:
+        items, cursor = await list_messages(chat_id, limit, cursor=cursor)
+        seen = [m["id"] for m in items] + seen
+        if cursor is None:
+            return seen
+
+async def _page_forwards(chat_id, limit):
+    seen, cursor = [], None
+    items, cursor = await list_messages(chat_id, limit, after_ts=0)
+    while items:
+        seen += [m["id"] for m in items]
+        items, cursor = await list_messages(chat_id, limit, cursor=cursor)
+    return seen
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("limit", [3, 4, 7])
+async def test_older_pages_cross_into_archive(chat_id, limit):
+    ids = await _seed(chat_id)
+    stats = await archive_chat_messages(chat_id, chunk_size=5)
+    assert stats["chunks"] == 4 and stats["archived"] == 20
+    assert await _page_backwards(chat_id, limit) == ids
+
+@pytest.mark.anyio
+async def test_pages_after_archived_messages_are_deleted(chat_id, monkeypatch):
+    ids = await _seed(chat_id)
+    await archive_chat_messages(chat_id, chunk_size=5)
+    monkeypatch.setattr(message_archive, "MESSAGE_ARCHIVE_DELETE_GRACE_SECONDS", 0)
+    stats = await archive_chat_messages(chat_id, chunk_size=5)
+    assert stats["deleted"] == 20
+    live = [d.id async for d in async_db.collection("chats").document(chat_id).collection("messages").stream()]
+    assert len(live) == OLD + RECENT - 20
+
+    assert await _page_backwards(chat_id, 4) == ids
+    assert await _page_forwards(chat_id, 4) == ids
+
+@pytest.mark.anyio
+async def test_newer_pages_start_in_archive(chat_id):
+    ids = await _seed(chat_id)
+    await archive_chat_messages(chat_id, chunk_size=5)
+    assert await _page_forwards(chat_id, 6) == ids
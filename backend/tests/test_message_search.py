@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from app.services import message_search
+from app.services.message_search import MessageSearchIndex, tokenize
+
+def _message(chat_id, mid, ts, text, file_name=None):
+    return {"chat_id": chat_id, "id": mid, "timestamp": ts, "sender_id": chat_id.split("_")[0],
+            "message": text, "file_name": file_name}
+
+@pytest.fixture
+async def index():
+    idx = MessageSearchIndex()
+    idx.start()
+    await idx._loaded.wait()
+    yield idx
+    await idx.stop()
+
+def test_tokenize_folds_accents_stopwords_and_stems():
+    assert tokenize("Os Cálculos de ontem") == ["calcul", "ontem"]
+    assert tokenize("calcular") == ["calcul"]
+
+@pytest.mark.anyio
+async def test_add_and_query(index):
+    index.add(_message("a_b", "m1", 1, "Lista de cálculo para sexta"))
+    index.add(_message("a_b", "m2", 2, "resumo de física", file_name="resumo.pdf"))
+    index.add(_message("a_c", "m3", 3, "Cálculos da prova"))
+    index.add(_message("b_c", "m4", 4, "cálculo de outra conversa"))
+
+    items, cursor = await index.search("a", "calculo")
+    assert [i["message_id"] for i in items] == ["m3", "m1"]
+    assert cursor is None
+    # o último termo vale como prefixo; todos os termos precisam aparecer
+    assert [i["message_id"] for i in (await index.search("a", "lista calc"))[0]] == ["m1"]
+    assert [i["message_id"] for i in (await index.search("a", "resumo.pdf"))[0]] == ["m2"]
+    assert (await index.search("a", "lista prova"))[0] == []
+    # restrito a um chat
+    assert [i["message_id"] for i in (await index.search("a", "calculo", chat_id="a_b"))[0]] == ["m1"]
+
+@pytest.mark.anyio
+async def test_add_ignores_duplicates(index):
+    assert index.add(_message("a_b", "m1", 1, "prova"))
+    assert not index.add(_message("a_b", "m1", 1, "prova"))
+    assert index.stats()["messages"] == 1
+
+@pytest.mark.anyio
+async def test_search_pages_with_cursor(index):
+    for i in range(5):
+        index.add(_message("a_b", f"m{i}", i, f"monitoria {i}"))
+    seen, cursor = [], None
+    while True:
+        items, cursor = await index.search("a", "monitoria", limit=2, cursor=cursor)
+        seen += [i["message_id"] for i in items]
+        if cursor is None:
+            break
+    assert seen == ["m4", "m3", "m2", "m1", "m0"]
+
+@pytest.mark.anyio
+async def test_search_rejects_other_users_chat_and_bad_cursor(index):
+    with pytest.raises(PermissionError):
+        await index.search("a", "oi", chat_id="b_c")
+    with pytest.raises(ValueError):
+        await index.search("a", "oi", cursor="nao-e-cursor")
+
+@pytest.mark.anyio
+async def test_new_terms_keep_prefix_vocabulary_sorted(index):
+    index.add(_message("a_b", "m1", 1, "zebra"))
+    assert [i["message_id"] for i in (await index.search("a", "zeb"))[0]] == ["m1"]
+    index.add(_message("a_b", "m2", 2, "abacate zangado"))
+    assert index._sorted_vocab == sorted(index._vocab)
+    assert [i["message_id"] for i in (await index.search("a", "z"))[0]] == ["m2", "m1"]
+
+@pytest.mark.anyio
+async def test_snapshot_round_trip(index, tmp_path, monkeypatch):
+    index.add(_message("a_b", "m1", 1, "Cálculo 2"))
+    index.add(_message("a_b", "m2", 2, "álgebra linear"))
+    path = tmp_path / "snap" / "index.json.gz"
+    index.save_file(str(path))
+    index.save_file(str(path))
+    # o temporário de cada gravação é renomeado por cima do arquivo final
+    assert os.listdir(path.parent) == ["index.json.gz"]
+
+    monkeypatch.setattr(message_search, "MESSAGE_SEARCH_INDEX_FILE", str(path))
+    restored = MessageSearchIndex()
+    restored.start()
+    await restored._loaded.wait()
+    assert restored.stats() == index.stats()
+    assert restored._sorted_vocab == sorted(restored._vocab)
+    assert [i["message_id"] for i in (await restored.search("a", "algebra"))[0]] == ["m2"]
+    await restored.stop()
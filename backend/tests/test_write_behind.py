@@ -0,0 +1,92 @@
+import pytest
+
+from app.database import write_behind
+from app.database.write_behind import WriteBehindQueue, _merge
+from app.firebase.firestore_client import async_db
+from app.repository.chat_repository import chat_meta_writes, fan_out_participant_profile
+
+def test_merge_combines_maps_field_by_field():
+    merged = _merge({"participant_profiles": {"a": {"name": "Ana"}}, "x": 1},
+                    {"participant_profiles": {"b": {"name": "Bia"}}, "y": 2})
+    assert merged == {"participant_profiles": {"a": {"name": "Ana"}, "b": {"name": "Bia"}}, "x": 1, "y": 2}
+
+def test_merge_later_value_wins():
+    assert _merge({"m": {"a": 1}, "x": {"k": 1}}, {"m": {"a": 2}, "x": 3}) == {"m": {"a": 2}, "x": 3}
+
+def test_merge_does_not_mutate_inputs():
+    base, update = {"m": {"a": 1}}, {"m": {"b": 2}}
+    _merge(base, update)
+    assert base == {"m": {"a": 1}} and update == {"m": {"b": 2}}
+
+async def _chat(chat_id):
+    ref = async_db.collection("chats").document(chat_id)
+    await ref.set({"participants": chat_id.split("_")})
+    return ref
+
+@pytest.mark.anyio
+async def test_profile_fan_out_collapses_into_one_write_per_chat(memory_store):
+    refs = [await _chat("ana_bia"), await _chat("ana_caio")]
+    chat_meta_writes.start()
+    try:
+        assert await fan_out_participant_profile("ana", {"name": "Ana"}) == 2
+        assert await fan_out_participant_profile("ana", {"name": "Ana Paula"}) == 2
+        assert "participant_profiles" not in (await refs[0].get()).to_dict()
+
+        memory_store.reset_stats()
+        assert await chat_meta_writes.flush() == 2
+        assert memory_store.stats()["writes"] == 2
+        for ref in refs:
+            assert (await ref.get()).to_dict()["participant_profiles"] == {"ana": {"name": "Ana Paula"}}
+    finally:
+        await chat_meta_writes.stop()
+
+class _FailFirstCommit:
+    """async_db cujo primeiro WriteBatch falha no commit."""
+
+    def __init__(self, client):
+        self._client = client
+        self.failed = False
+
+    def batch(self):
+        batch = self._client.batch()
+        if not self.failed:
+            self.failed = True
+
+            async def commit():
+                raise RuntimeError("indisponível")
+            batch.commit = commit
+        return batch
+
+@pytest.mark.anyio
+async def test_failed_batch_is_requeued(monkeypatch):
+    ref = await _chat("ana_bia")
+    monkeypatch.setattr(write_behind, "async_db", _FailFirstCommit(async_db))
+    queue = WriteBehindQueue("test", flush_interval=3600)
+    queue.start()
+    try:
+        await queue.enqueue(ref, {"participant_profiles": {"ana": {"name": "Ana"}}})
+        assert await queue.flush() == 0
+        assert queue.stats()["failures"] == 1 and queue.stats()["pending"] == 1
+        # o que chega depois da falha é mais novo e vence
+        await queue.enqueue(ref, {"participant_profiles": {"ana": {"name": "Ana Paula"}, "bia": {"name": "Bia"}}})
+        assert await queue.flush() == 1
+        assert (await ref.get()).to_dict()["participant_profiles"] == {
+            "ana": {"name": "Ana Paula"}, "bia": {"name": "Bia"}}
+    finally:
+        await queue.stop()
+
+@pytest.mark.anyio
+async def test_stop_drains_queue():
+    ref = await _chat("ana_bia")
+    queue = WriteBehindQueue("test", flush_interval=3600)
+    queue.start()
+    await queue.enqueue(ref, {"participant_profiles": {"ana": {"name": "Ana"}}})
+    await queue.stop()
+    assert queue.stats()["pending"] == 0
+    assert (await ref.get()).to_dict()["participant_profiles"] == {"ana": {"name": "Ana"}}
+
+@pytest.mark.anyio
+async def test_enqueue_writes_immediately_when_not_running():
+    ref = await _chat("ana_bia")
+    await WriteBehindQueue("test").enqueue(ref, {"participant_profiles": {"ana": {"name": "Ana"}}})
+    assert (await ref.get()).to_dict()["participant_profiles"] == {"ana": {"name": "Ana"}}